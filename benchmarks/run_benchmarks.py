@@ -0,0 +1,342 @@
+"""
+Microbenchmarks for the hot paths of the exporter: parsing expiration metadata, creating and updating monitors, exposition and configuration validation.
+
+Run from the root of the repository with `poetry run python -m benchmarks.run_benchmarks`, see benchmarks/README.md.
+"""
+import argparse
+import gc
+import json
+import logging
+import platform
+import statistics
+import subprocess  # nosec B404
+import sys
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from cerberus import Validator
+from prometheus_client import CollectorRegistry, Gauge, generate_latest
+
+from vault_monitor.expiration_monitor.secret_expiration_monitor import SecretExpirationMonitor
+from vault_monitor.expiration_monitor.vault_time import ExpirationMetadata, parse_timestamp
+from vault_monitor.scripts.start_exporter import EXPORTER_MODULES, get_config_schema
+
+RESULTS_VERSION = 1
+
+# Sizes (number of items processed per run) for every benchmark, per scale
+SCALES: Dict[str, Dict[str, List[int]]] = {
+    "quick": {"parse": [10_000], "monitors": [1_000, 10_000], "exposition": [1_000, 10_000], "config": [100]},
+    "default": {"parse": [100_000], "monitors": [10_000, 100_000], "exposition": [1_000, 10_000, 100_000], "config": [100, 1_000]},
+    "full": {"parse": [1_000_000], "monitors": [10_000, 100_000, 1_000_000], "exposition": [1_000, 10_000, 100_000, 1_000_000], "config": [100, 1_000, 10_000]},
+}
+
+REALISTIC_METADATA = {"last_renewal_timestamp": "2022-05-02T09:49:41.415869Z", "expiration_timestamp": "2022-08-08T09:49:41.415869Z", "owner": "team"}
+MALFORMED_METADATA = [
+    {"last_renewal_timestamp": "not a timestamp", "expiration_timestamp": "2022-08-08"},
+    {"owner": "team"},
+    {},
+    {"last_renewal_timestamp": "2022-05-02T09:49:41.415869+02:00", "expiration_timestamp": "2022-08-08T09:49:41Z"},
+]
+
+
+class StubResponse:
+    """
+    Stands in for a requests response to a metadata read.
+    """
+
+    status_code = 200
+
+    def __init__(self, payload: Dict) -> None:
+        self.payload = payload
+
+    def raise_for_status(self) -> None:
+        pass
+
+    def json(self) -> Dict:
+        return self.payload
+
+
+class StubSession:
+    """
+    Stands in for the session of the Vault client, returning the same metadata for every secret.
+    """
+
+    def __init__(self, custom_metadata: Dict) -> None:
+        self.response = StubResponse({"data": {"custom_metadata": custom_metadata}})
+
+    def get(self, *args: Any, **kwargs: Any) -> StubResponse:
+        return self.response
+
+    def get_adapter(self, url: str) -> None:
+        # No connection pool is configured, so the default timeouts apply
+        return None
+
+
+class StubAdapter:  # pylint: disable=too-few-public-methods
+    namespace = "namespace"
+
+
+class StubClient:  # pylint: disable=too-few-public-methods
+    """
+    Stands in for hvac.Client, without any network access.
+    """
+
+    url = "https://vault.benchmark"
+    token = "token"  # nosec B105
+
+    def __init__(self) -> None:
+        self.adapter = StubAdapter()
+        self.session = StubSession(REALISTIC_METADATA)
+
+
+def time_runs(function: Callable[[], Any], repeat: int, setup: Optional[Callable[[], Any]] = None) -> List[float]:
+    """
+    Returns the duration of repeat runs of function, calling setup (untimed) before each run.
+    """
+    durations = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        gc.collect()
+        start = perf_counter()
+        function()
+        durations.append(perf_counter() - start)
+    return durations
+
+
+def bench_parse_realistic(size: int, repeat: int) -> Tuple[List[float], Dict]:
+    payloads = [dict(REALISTIC_METADATA) for _ in range(size)]
+
+    def run() -> None:
+        for payload in payloads:
+            ExpirationMetadata.from_metadata(payload, "last_renewal_timestamp", "expiration_timestamp")
+
+    return time_runs(run, repeat), {}
+
+
+def bench_parse_unique(size: int, repeat: int) -> Tuple[List[float], Dict]:
+    # Every secret has its own timestamps, so none of them are served from the parse cache
+    start = datetime(2022, 5, 2, tzinfo=timezone.utc)
+    payloads = [
+        {
+            "last_renewal_timestamp": (start + timedelta(seconds=index, microseconds=index % 1_000_000)).isoformat().replace("+00:00", "Z"),
+            "expiration_timestamp": (start + timedelta(days=90, seconds=index)).isoformat().replace("+00:00", "Z"),
+        }
+        for index in range(size)
+    ]
+
+    def run() -> None:
+        for payload in payloads:
+            ExpirationMetadata.from_metadata(payload, "last_renewal_timestamp", "expiration_timestamp")
+
+    return time_runs(run, repeat, setup=parse_timestamp.cache_clear), {}
+
+
+def bench_parse_malformed(size: int, repeat: int) -> Tuple[List[float], Dict]:
+    payloads = [dict(MALFORMED_METADATA[index % len(MALFORMED_METADATA)]) for index in range(size)]
+
+    def run() -> None:
+        for payload in payloads:
+            ExpirationMetadata.from_metadata(payload, "last_renewal_timestamp", "expiration_timestamp")
+
+    return time_runs(run, repeat), {}
+
+
+def clear_monitor_gauges() -> None:
+    for name in ["secret_last_renewal_timestamp_gauge", "secret_expiration_timestamp_gauge", "last_successful_update_timestamp_gauge"]:
+        gauge = getattr(SecretExpirationMonitor, name, None)
+        if gauge is not None:
+            gauge.clear()
+
+
+def create_secret_monitors(size: int, vault_client: Any) -> List[SecretExpirationMonitor]:
+    return [
+        SecretExpirationMonitor(
+            mount_point="secret", monitored_path=f"team_{index % 100}/secret_{index}", vault_client=vault_client, service=f"service_{index % 100}", prometheus_labels={"environment": "prod"}
+        )
+        for index in range(size)
+    ]
+
+
+def bench_monitor_construction(size: int, repeat: int) -> Tuple[List[float], Dict]:
+    vault_client = StubClient()
+    return time_runs(lambda: create_secret_monitors(size, vault_client), repeat, setup=clear_monitor_gauges), {}
+
+
+def bench_update_metrics(size: int, repeat: int) -> Tuple[List[float], Dict]:
+    clear_monitor_gauges()
+    monitors = create_secret_monitors(size, StubClient())
+
+    def run() -> None:
+        for monitor in monitors:
+            monitor.update_metrics()
+
+    return time_runs(run, repeat), {}
+
+
+def bench_monitor_memory(size: int, repeat: int) -> Tuple[List[float], Dict]:
+    """
+    Memory used per monitor once updated, including its series in the gauges and its last expiration information (timed under tracemalloc, so only the memory is meaningful).
+    """
+    vault_client = StubClient()
+    bytes_per_monitor = []
+
+    def run() -> None:
+        clear_monitor_gauges()
+        gc.collect()
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            monitors = create_secret_monitors(size, vault_client)
+            for monitor in monitors:
+                monitor.update_metrics()
+            gc.collect()
+            bytes_per_monitor.append((tracemalloc.get_traced_memory()[0] - before) / size)
+        finally:
+            tracemalloc.stop()
+
+    durations = time_runs(run, repeat)
+    return durations, {"bytes_per_monitor": min(bytes_per_monitor)}
+
+
+def bench_generate_latest(size: int, repeat: int) -> Tuple[List[float], Dict]:
+    registry = CollectorRegistry()
+    gauge = Gauge("vault_secret_expiration_timestamp", "Timestamp for when a secret should expire.", ["monitored_path", "mount_point", "service", "environment"], registry=registry)
+    for index in range(size):
+        gauge.labels(f"team_{index % 100}/secret_{index}", "secret", f"service_{index % 100}", "prod").set(1659952181.415869 + index)
+
+    durations = time_runs(lambda: generate_latest(registry), repeat)
+    return durations, {"output_bytes": len(generate_latest(registry))}
+
+
+def get_large_config(services: int) -> Dict:
+    return {
+        "vault": {"address": "https://vault.benchmark", "authentication": {"token": {}}},
+        "expiration_monitoring": {
+            "prometheus_labels": {"environment": "prod"},
+            "services": [
+                {
+                    "name": f"service_{index}",
+                    "secrets": [{"mount_point": "secret", "secret_path": f"service_{index}/secret_{secret}"} for secret in range(5)]
+                    + [{"mount_point": "secret", "secret_path": f"service_{index}/tree", "recursive": True}],
+                    "entities": [{"mount_point": "approle", "entity_id": f"{index}", "entity_name": f"entity_{index}"}],
+                }
+                for index in range(services)
+            ],
+        },
+    }
+
+
+def bench_config_validation(size: int, repeat: int) -> Tuple[List[float], Dict]:
+    config = get_large_config(size)
+
+    def run() -> None:
+        validator = Validator(get_config_schema(modules=EXPORTER_MODULES))
+        validator.allow_unknown = False
+        if not validator.validate(config):
+            raise ValueError(validator.errors)
+
+    return time_runs(run, repeat), {}
+
+
+# Name of every benchmark, the group of sizes it uses and the function running it
+BENCHMARKS: List[Tuple[str, str, Callable[[int, int], Tuple[List[float], Dict]]]] = [
+    ("from_metadata_realistic", "parse", bench_parse_realistic),
+    ("from_metadata_unique", "parse", bench_parse_unique),
+    ("from_metadata_malformed", "parse", bench_parse_malformed),
+    ("monitor_construction", "monitors", bench_monitor_construction),
+    ("update_metrics", "monitors", bench_update_metrics),
+    ("monitor_memory", "monitors", bench_monitor_memory),
+    ("generate_latest", "exposition", bench_generate_latest),
+    ("config_validation", "config", bench_config_validation),
+]
+
+
+def get_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, check=True, text=True).stdout.strip()  # nosec B603 B607
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(scale: str, repeat: int, selected: Optional[List[str]] = None) -> Dict:
+    """
+    Runs the benchmarks (all of them, or those with a name starting with one of selected) and returns the results.
+    """
+    results: Dict[str, Dict] = {}
+    for name, size_group, benchmark in BENCHMARKS:
+        if selected and not any(name.startswith(prefix) for prefix in selected):
+            continue
+        for size in SCALES[scale][size_group]:
+            durations, extra = benchmark(size, repeat)
+            key = f"{name}[{size}]"
+            results[key] = {"size": size, "min": min(durations), "median": statistics.median(durations), "per_item_us": min(durations) / size * 1e6, **extra}
+            print(f"{key:<40} min {results[key]['min']:10.4f}s  median {results[key]['median']:10.4f}s  {results[key]['per_item_us']:10.3f}us/item", file=sys.stderr)
+
+    return {
+        "version": RESULTS_VERSION,
+        "metadata": {
+            "commit": get_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "scale": scale,
+            "repeat": repeat,
+            "date": datetime.now(timezone.utc).isoformat(),
+        },
+        "results": results,
+    }
+
+
+def compare_results(baseline: Dict, current: Dict, threshold: float) -> List[str]:
+    """
+    Prints how every benchmark present in both results changed, returning the benchmarks which got slower by more than threshold (e.g. 0.2 for 20%).
+    """
+    regressions = []
+    for key, result in current["results"].items():
+        if key not in baseline["results"]:
+            continue
+        ratio = result["min"] / baseline["results"][key]["min"]
+        flag = ""
+        if ratio > 1 + threshold:
+            regressions.append(key)
+            flag = "  REGRESSION"
+        print(f"{key:<40} {baseline['results'][key]['min']:10.4f}s -> {result['min']:10.4f}s  ({ratio - 1:+.1%}){flag}")
+    return regressions
+
+
+def handle_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run the exporter microbenchmarks.")
+    parser.add_argument("--scale", choices=list(SCALES), default="default", help="Sizes to run the benchmarks with, full includes 1M monitors and takes a while.")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of timed runs per benchmark, the fastest is used for comparisons.")
+    parser.add_argument("--benchmark", action="append", default=None, help="Only run benchmarks with a name starting with this value (can be repeated).")
+    parser.add_argument("--output", type=str, default=None, help="File to write the results to as JSON.")
+    parser.add_argument("--compare", type=str, default=None, help="Results file (e.g. from the previous commit) to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Slowdown relative to --compare which counts as a regression, 0.2 for 20%%.")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = handle_args()
+    # Malformed metadata is logged as an error for every secret, which would dominate the measurement
+    logging.disable(logging.CRITICAL)
+
+    results = run_benchmarks(args.scale, args.repeat, args.benchmark)
+
+    if args.output:
+        with open(args.output, "w", encoding="UTF-8") as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="UTF-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get("version") != RESULTS_VERSION:
+            sys.exit(f"Can't compare against results version {baseline.get('version')}, expected {RESULTS_VERSION}.")
+        regressions = compare_results(baseline, results, args.threshold)
+        if regressions:
+            sys.exit(f"{len(regressions)} benchmarks regressed by more than {args.threshold:.0%}: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
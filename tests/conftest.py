@@ -0,0 +1,45 @@
+import pytest
+
+from vault_monitor.expiration_monitor.vault_time import ExpirationMetadata
+
+
+class FakeClock:
+    """
+    Monotonic clock which only moves when slept on or when the test moves it
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def get_monitor(mocker, request):
+    """
+    Factory for stand-in monitors with the provided attributes, with expiration info if expiration_timestamp is provided
+
+    Test modules can set MONITOR_DEFAULTS to the arguments shared by most of their monitors
+    """
+    defaults = getattr(request.module, "MONITOR_DEFAULTS", {})
+
+    def get_monitor(key=None, **arguments):
+        arguments = {**defaults, **arguments}
+        expiration_timestamp = arguments.pop("expiration_timestamp", None)
+        last_renewal_timestamp = arguments.pop("last_renewal_timestamp", 0.0)
+        monitor = mocker.Mock(key=key, **arguments)
+        monitor.expiration_info = None if expiration_timestamp is None else ExpirationMetadata(last_renewal_timestamp, expiration_timestamp, "last_renewal_timestamp", "expiration_timestamp")
+        return monitor
+
+    return get_monitor
@@ -0,0 +1,64 @@
+import pytest
+
+from vault_monitor.expiration_monitor.adaptive_polling import AdaptivePoller
+
+DAY = 86400
+
+
+@pytest.mark.parametrize(
+    "expires_in, interval",
+    [
+        (None, 30),  # Never refreshed successfully
+        (-DAY, 30),  # Already expired
+        (10, 30),  # Close to expiry, bounded by min_interval
+        (DAY, 864),  # 1% of a day
+        (730 * DAY, 3600),  # Expires in two years, bounded by max_interval
+    ],
+)
+def test_get_interval(get_monitor, expires_in, interval, clock):
+    poller = AdaptivePoller(min_interval=30, max_interval=3600, expiry_fraction=0.01, clock=clock)
+    monitor = get_monitor("key", expiration_timestamp=None if expires_in is None else clock.now + expires_in)
+
+    assert poller.get_interval(monitor, clock.now) == interval
+
+
+def test_monitors_are_due_based_on_expiry(get_monitor, clock):
+    """
+    New monitors are due immediately, afterwards monitors close to expiry are refreshed more often
+    """
+    poller = AdaptivePoller(min_interval=30, max_interval=3600, clock=clock)
+    soon = get_monitor("soon", expiration_timestamp=clock.now + 60)
+    later = get_monitor("later", expiration_timestamp=clock.now + 365 * DAY)
+    monitors = [soon, later]
+
+    due = poller.get_due_monitors(monitors)
+    assert due == [soon, later]
+    poller.reschedule(due)
+
+    clock.now += 30
+    due = poller.get_due_monitors(monitors)
+    assert due == [soon]
+    poller.reschedule(due)
+
+    clock.now += 3570
+    assert poller.get_due_monitors(monitors) == [soon, later]
+
+
+def test_removed_monitors_are_forgotten(get_monitor, clock):
+    poller = AdaptivePoller(min_interval=30, max_interval=3600, clock=clock)
+    first = get_monitor("first")
+    second = get_monitor("second")
+    poller.reschedule(poller.get_due_monitors([first, second]))
+
+    clock.now += 30
+    due = poller.get_due_monitors([second])
+    assert due == [second]
+    poller.reschedule(due)
+
+    # A monitor which comes back is treated as new
+    assert poller.get_due_monitors([first, second]) == [first]
+
+
+def test_invalid_bounds():
+    with pytest.raises(ValueError):
+        AdaptivePoller(min_interval=60, max_interval=30)
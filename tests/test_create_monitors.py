@@ -0,0 +1,304 @@
+import threading
+import time
+
+import pytest
+from pytest_mock import mocker
+
+from vault_monitor.common.sharding import ShardSelector
+from vault_monitor.expiration_monitor import create_monitors, expiration_monitor
+from vault_monitor.expiration_monitor.secret_expiration_monitor import SecretExpirationMonitor
+from vault_monitor.expiration_monitor.entity_expiration_monitor import EntityExpirationMonitor
+
+
+@pytest.fixture(autouse=True)
+def mock_gauge(mocker):
+    """
+    Replaces the gauges with mocks and cleans them out after every run
+    """
+    yield mocker.patch.object(expiration_monitor, "Gauge", autospec=True)
+    for monitor_class in [SecretExpirationMonitor, EntityExpirationMonitor]:
+        for gauge_name in ["secret_last_renewal_timestamp_gauge", "secret_expiration_timestamp_gauge", "last_successful_update_timestamp_gauge"]:
+            if gauge_name in monitor_class.__dict__:
+                delattr(monitor_class, gauge_name)
+
+
+def get_config():
+    return {
+        "services": [
+            {
+                "name": "service",
+                "secrets": [
+                    {"mount_point": "secret", "secret_path": "static/secret"},
+                    {"mount_point": "secret", "secret_path": "tree", "recursive": True},
+                ],
+                "entities": [{"mount_point": "approle", "entity_id": "1234", "entity_name": "entity"}],
+            }
+        ]
+    }
+
+
+def get_vault_client(mocker, tree):
+    """
+    Returns a mock client which lists the provided tree, a dict of directory path to keys
+    """
+    vault_client = mocker.Mock()
+    vault_client.secrets.kv.v2.list_secrets.side_effect = lambda mount_point, path: {"data": {"keys": tree[path]}}
+    return vault_client
+
+
+def test_create_monitors(mocker):
+    vault_client = get_vault_client(mocker, {"tree": ["a", "sub/"], "tree/sub": ["b"]})
+
+    monitors = create_monitors.create_monitors(get_config(), vault_client)
+
+    assert [monitor.key for monitor in monitors] == [
+        ("SecretExpirationMonitor", "service", "secret", "static/secret"),
+        ("SecretExpirationMonitor", "service", "secret", "tree/a"),
+        ("SecretExpirationMonitor", "service", "secret", "tree/sub/b"),
+        ("EntityExpirationMonitor", "service", "approle", "1234"),
+    ]
+
+
+def test_create_monitors_reuses_existing(mocker):
+    """
+    Re-running discovery must keep the existing monitor instances and only create monitors for new secrets
+    """
+    tree = {"tree": ["a", "sub/"], "tree/sub": ["b"]}
+    vault_client = get_vault_client(mocker, tree)
+    first_monitors = create_monitors.create_monitors(get_config(), vault_client)
+
+    # One secret is removed and another one is added
+    tree["tree/sub"] = ["c"]
+    second_monitors = create_monitors.create_monitors(get_config(), vault_client, {monitor.key: monitor for monitor in first_monitors})
+
+    first_by_key = {monitor.key: monitor for monitor in first_monitors}
+    second_by_key = {monitor.key: monitor for monitor in second_monitors}
+
+    assert ("SecretExpirationMonitor", "service", "secret", "tree/sub/b") not in second_by_key
+    assert ("SecretExpirationMonitor", "service", "secret", "tree/sub/c") in second_by_key
+    for key in [
+        ("SecretExpirationMonitor", "service", "secret", "static/secret"),
+        ("SecretExpirationMonitor", "service", "secret", "tree/a"),
+        ("EntityExpirationMonitor", "service", "approle", "1234"),
+    ]:
+        assert second_by_key[key] is first_by_key[key]
+
+
+TREE = {
+    "": ["top", "a/", "b/"],
+    "a": ["one", "nested/"],
+    "a/nested": ["two", "three"],
+    "b": ["four"],
+}
+
+
+@pytest.mark.parametrize("max_concurrency", [1, 4])
+def test_recurse_secrets(mocker, max_concurrency):
+    """
+    The walk must find every secret with the same path format regardless of concurrency
+    """
+    vault_client = get_vault_client(mocker, TREE)
+
+    secrets = create_monitors.recurse_secrets("secret", "", vault_client, max_concurrency=max_concurrency)
+
+    assert sorted(secrets) == sorted(["/top", "a/one", "a/nested/two", "a/nested/three", "b/four"])
+    assert vault_client.secrets.kv.v2.list_secrets.call_count == 4
+
+
+def test_recurse_secrets_deep_tree(mocker):
+    """
+    Trees deeper than the recursion limit must still be walked
+    """
+    depth = 2000
+    tree = {}
+    path = "root"
+    for _ in range(depth):
+        tree[path] = ["secret", "deeper/"]
+        path = f"{path}/deeper"
+    tree[path] = ["secret"]
+
+    secrets = create_monitors.recurse_secrets("secret", "root", get_vault_client(mocker, tree), max_concurrency=2)
+
+    assert len(secrets) == depth + 1
+
+
+def test_recurse_secrets_failure(mocker):
+    vault_client = get_vault_client(mocker, {"": ["a/"]})
+
+    with pytest.raises(KeyError):
+        create_monitors.recurse_secrets("secret", "", vault_client, max_concurrency=2)
+
+
+def test_create_monitors_sharded(mocker):
+    """
+    Shards must split the monitors (including discovered ones) without overlap
+    """
+    tree = {"tree": [f"secret_{index}" for index in range(50)]}
+    config = get_config()
+
+    keys = []
+    for shard_index in range(3):
+        shard = ShardSelector(shard_index=shard_index, shard_count=3)
+        keys.append({monitor.key for monitor in create_monitors.create_monitors(config, get_vault_client(mocker, tree), shard=shard)})
+
+    all_keys = {monitor.key for monitor in create_monitors.create_monitors(config, get_vault_client(mocker, tree))}
+    assert set.union(*keys) == all_keys
+    assert sum(len(shard_keys) for shard_keys in keys) == len(all_keys)
+
+
+def test_iter_secrets_is_lazy(mocker):
+    """
+    Secrets must be yielded as soon as they are listed, and stopping early must not walk the rest of the tree
+    """
+    vault_client = get_vault_client(mocker, {"tree": ["a", "sub/"], "tree/sub": ["b"]})
+
+    secrets = create_monitors.iter_secrets("secret", "tree", vault_client)
+    assert next(secrets) == "tree/a"
+    secrets.close()
+
+    assert vault_client.secrets.kv.v2.list_secrets.call_count <= 2
+
+
+def test_iter_secrets_bounded_concurrency(mocker):
+    """
+    No more than max_concurrency LIST calls may be in flight, however wide the tree is
+    """
+    tree = {"tree": [f"dir_{index}/" for index in range(20)]}
+    tree.update({f"tree/dir_{index}": ["secret"] for index in range(20)})
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def list_secrets(mount_point, path):
+        nonlocal in_flight, max_in_flight
+        with lock:
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+        time.sleep(0.001)
+        with lock:
+            in_flight -= 1
+        return {"data": {"keys": tree[path]}}
+
+    vault_client = mocker.Mock()
+    vault_client.secrets.kv.v2.list_secrets.side_effect = list_secrets
+
+    secrets = list(create_monitors.iter_secrets("secret", "tree", vault_client, max_concurrency=3))
+
+    assert sorted(secrets) == sorted(f"tree/dir_{index}/secret" for index in range(20))
+    assert max_in_flight <= 3
+
+
+def test_iter_monitors_is_lazy(mocker):
+    """
+    Monitors for a recursive path must be created while the tree is still being walked
+    """
+    vault_client = get_vault_client(mocker, {"tree": ["a", "sub/"], "tree/sub": ["b"]})
+
+    monitors = create_monitors.iter_monitors(get_config(), vault_client)
+    assert next(monitors).key == ("SecretExpirationMonitor", "service", "secret", "static/secret")
+    assert next(monitors).key == ("SecretExpirationMonitor", "service", "secret", "tree/a")
+    assert vault_client.secrets.kv.v2.list_secrets.call_count == 1
+    monitors.close()
+
+
+def test_create_monitors_aggregate(mocker):
+    """
+    Aggregated monitors drop their own series unless export_series is set, secrets override the service
+    """
+    vault_client = get_vault_client(mocker, {"tree": ["a"]})
+    config = get_config()
+    config["services"][0]["aggregate"] = True
+    config["services"][0]["secrets"][0]["export_series"] = True
+    config["services"][0]["secrets"][1]["aggregate"] = False
+
+    monitors = create_monitors.create_monitors(config, vault_client)
+
+    assert [(monitor.monitored_path, monitor.aggregate, monitor.export_series) for monitor in monitors] == [
+        ("static/secret", True, True),
+        ("tree/a", False, True),
+        ("1234", True, False),
+    ]
+
+
+def test_create_monitors_path_label(mocker):
+    vault_client = get_vault_client(mocker, {"tree": ["a"]})
+    config = get_config()
+    config["monitored_path_label"] = {"mode": "hash"}
+
+    monitors = create_monitors.create_monitors(config, vault_client)
+
+    assert monitors[0].monitored_path == "static/secret"
+    assert monitors[0].prometheus_labels["monitored_path"] == "15c7f8347c4e35a8"
+    # Entity ids are kept as they are
+    assert monitors[-1].prometheus_labels["monitored_path"] == "1234"
+
+
+def test_create_series_limiter():
+    config = get_config()
+    config["series_limit"] = 100
+    config["services"][0]["series_limit"] = 10
+
+    series_limiter = create_monitors.create_series_limiter(config)
+
+    assert series_limiter.global_limit == 100
+    assert series_limiter.service_limits == {"service": 10}
+
+
+def test_create_monitors_from_cached_paths(mocker):
+    """
+    Recursive paths are taken from the cached paths instead of listing them in Vault
+    """
+    vault_client = get_vault_client(mocker, {})
+
+    monitors = create_monitors.create_monitors(get_config(), vault_client, cached_secret_paths={("service", "secret"): ["tree/a", "other/b"]})
+
+    assert [monitor.monitored_path for monitor in monitors] == ["static/secret", "tree/a", "1234"]
+    vault_client.secrets.kv.v2.list_secrets.assert_not_called()
+
+
+def test_create_monitors_namespaces(mocker):
+    """
+    The services are applied to every namespace (matching namespace_pattern), listing secrets with the namespace header and labelling the series with the namespace
+    """
+    namespaces = {"": ["team-a/", "team-b/"]}
+    trees = {"team-a": {"tree": ["a"]}, "team-b": {"tree": ["b"]}}
+    vault_client = mocker.Mock()
+    vault_client.url = "https://vault:8200"
+    vault_client.adapter.namespace = None
+
+    def request(method, url, headers, timeout):
+        namespace = headers["X-Vault-Namespace"]
+        response = mocker.Mock()
+        if url.endswith("/sys/namespaces"):
+            response.status_code = 200 if namespace in namespaces else 404
+            response.json.return_value = {"data": {"keys": namespaces.get(namespace)}}
+        else:
+            response.json.return_value = {"data": {"keys": trees[namespace][url.split("/metadata/")[1]]}}
+        return response
+
+    vault_client.session.request.side_effect = request
+    config = get_config()
+    config["namespaces"] = {}
+    config["services"][0]["namespace_pattern"] = "team-.*"
+
+    monitors = create_monitors.create_monitors(config, vault_client)
+
+    assert sorted(monitor.key for monitor in monitors) == [
+        ("EntityExpirationMonitor", "service", "team-a/approle", "1234"),
+        ("EntityExpirationMonitor", "service", "team-b/approle", "1234"),
+        ("SecretExpirationMonitor", "service", "team-a/secret", "static/secret"),
+        ("SecretExpirationMonitor", "service", "team-a/secret", "tree/a"),
+        ("SecretExpirationMonitor", "service", "team-b/secret", "static/secret"),
+        ("SecretExpirationMonitor", "service", "team-b/secret", "tree/b"),
+    ]
+    assert {monitor.get_label_value("namespace") for monitor in monitors} == {"team-a", "team-b"}
+    assert all(monitor.mount_point in ["secret", "approle"] for monitor in monitors)
+
+
+def test_create_monitors_namespace_label_conflict(mocker):
+    config = get_config()
+    config["namespaces"] = {}
+    config["prometheus_labels"] = {"namespace": "mine"}
+
+    with pytest.raises(ValueError):
+        create_monitors.create_monitors(config, mocker.Mock())
@@ -15,6 +15,7 @@ def tear_down():
     yield
     delattr(entity_expiration_monitor.EntityExpirationMonitor, "secret_last_renewal_timestamp_gauge")
     delattr(entity_expiration_monitor.EntityExpirationMonitor, "secret_expiration_timestamp_gauge")
+    delattr(entity_expiration_monitor.EntityExpirationMonitor, "last_successful_update_timestamp_gauge")
 
 
 def test_basic_creation(mocker):
@@ -79,9 +80,24 @@ def test_get_expiraiton_info(mocker):
 
     mock_response = mocker.Mock()
     mock_response.json.return_value = {"data": {"metadata": {"last_renewal_timestamp": "2022-08-08T09:49:41.415869Z", "expiration_timestamp": "2022-08-08T09:49:41.415869Z"}}}
-    mock_requests = mocker.patch.object(entity_expiration_monitor, "requests", autospec=True)
-    mock_requests.get.return_value = mock_response
+    mock_vault_client.session.get.return_value = mock_response
 
     test_expiration_metadata = test_object.get_expiration_info()
 
+    assert mock_vault_client.session.get.call_args.args[0] == f"{mock_vault_client.url}/v1/identity/entity/id/monitored_path"
+
     assert test_expiration_metadata.get_serialized_expiration_metadata() == {"last_renewal_timestamp": "2022-08-08T09:49:41.415869Z", "expiration_timestamp": "2022-08-08T09:49:41.415869Z"}
+
+
+def test_provided_labels_are_not_modified(mocker):
+    """
+    The labels shared by the monitors of a service don't get the entity name added to them
+    """
+    mocker.patch.object(expiration_monitor, "Gauge", autospec=True)
+    service_labels = {"key": "value"}
+
+    entity_expiration_monitor.EntityExpirationMonitor(
+        mount_point="mount_point", monitored_path="monitored_path", name="name", vault_client=mocker.Mock(), service="service", prometheus_labels=service_labels
+    )
+
+    assert service_labels == {"key": "value"}
@@ -1,4 +1,5 @@
 import pytest
+import requests
 from mock import call
 from pytest_mock import mocker
 
@@ -12,6 +13,7 @@ def tear_down():
     #
     delattr(secret_expiration_monitor.SecretExpirationMonitor, "secret_expiration_timestamp_gauge")
     delattr(secret_expiration_monitor.SecretExpirationMonitor, "secret_last_renewal_timestamp_gauge")
+    delattr(secret_expiration_monitor.SecretExpirationMonitor, "last_successful_update_timestamp_gauge")
 
 
 def test_basic_creation(mocker):
@@ -37,6 +39,15 @@ def test_basic_creation(mocker):
     mock_gauge.assert_has_calls(gauge_calls)
 
 
+def test_get_label_value(mocker):
+    mocker.patch.object(expiration_monitor, "Gauge", autospec=True)
+    test_object = secret_expiration_monitor.SecretExpirationMonitor("mount_point", "monitored_path", mocker.Mock(), "service", prometheus_labels={"vault_target": "eu"})
+
+    assert test_object.get_label_value("vault_target") == "eu"
+    assert test_object.get_label_value("service") == "service"
+    assert test_object.get_label_value("missing") is None
+
+
 def test_custom_values_creation(mocker):
     """
     Set custom values for prometheus labels and metadata and ensure they are reflected in the class
@@ -65,3 +76,176 @@ def test_custom_values_creation(mocker):
     ]
 
     mock_gauge.assert_has_calls(gauge_calls)
+
+
+def get_response(mocker, status_code, custom_metadata=None):
+    mock_response = mocker.Mock()
+    mock_response.status_code = status_code
+    mock_response.json.return_value = {"data": {"custom_metadata": custom_metadata}}
+    if status_code >= 400:
+        mock_response.raise_for_status.side_effect = requests.HTTPError(response=mock_response)
+    return mock_response
+
+
+def test_update_metrics(mocker):
+    """
+    Updating sets both gauges for the monitor's labels
+    """
+    mock_vault_client = mocker.Mock()
+    mocker.patch.object(expiration_monitor, "Gauge", side_effect=lambda *args: mocker.Mock())
+    test_object = secret_expiration_monitor.SecretExpirationMonitor(mount_point="mount_point", monitored_path="monitored_path", vault_client=mock_vault_client, service="service")
+    mock_vault_client.session.get.return_value = get_response(mocker, 200, {"last_renewal_timestamp": "2022-05-02T09:49:41.415869Z", "expiration_timestamp": "2022-08-08T09:49:41.415869Z"})
+
+    test_object.update_metrics()
+
+    test_object.secret_last_renewal_timestamp_gauge.labels.assert_called_with(**test_object.prometheus_labels)
+    test_object.secret_expiration_timestamp_gauge.labels.assert_called_with(**test_object.prometheus_labels)
+    test_object.secret_expiration_timestamp_gauge.labels.return_value.set.assert_called_once()
+
+
+def test_update_metrics_removes_deleted_secret(mocker):
+    """
+    A secret returning 404 has its series removed instead of raising
+    """
+    mock_vault_client = mocker.Mock()
+    mocker.patch.object(expiration_monitor, "Gauge", side_effect=lambda *args: mocker.Mock())
+    test_object = secret_expiration_monitor.SecretExpirationMonitor(mount_point="mount_point", monitored_path="monitored_path", vault_client=mock_vault_client, service="service")
+    mock_vault_client.session.get.return_value = get_response(mocker, 404)
+
+    test_object.update_metrics()
+
+    test_object.secret_last_renewal_timestamp_gauge.remove.assert_called_once_with("monitored_path", "mount_point", "service")
+    test_object.secret_expiration_timestamp_gauge.remove.assert_called_once_with("monitored_path", "mount_point", "service")
+    test_object.secret_expiration_timestamp_gauge.labels.return_value.set.assert_not_called()
+
+
+def test_update_metrics_raises_other_errors(mocker):
+    mock_vault_client = mocker.Mock()
+    mocker.patch.object(expiration_monitor, "Gauge", side_effect=lambda *args: mocker.Mock())
+    test_object = secret_expiration_monitor.SecretExpirationMonitor(mount_point="mount_point", monitored_path="monitored_path", vault_client=mock_vault_client, service="service")
+    mock_vault_client.session.get.return_value = get_response(mocker, 403)
+
+    with pytest.raises(requests.HTTPError):
+        test_object.update_metrics()
+
+    test_object.secret_expiration_timestamp_gauge.remove.assert_not_called()
+
+
+def test_remove_metrics_never_set(mocker):
+    """
+    Removing series which were never set must not raise
+    """
+    mocker.patch.object(expiration_monitor, "Gauge", side_effect=lambda *args: mocker.Mock())
+    test_object = secret_expiration_monitor.SecretExpirationMonitor(mount_point="mount_point", monitored_path="monitored_path", vault_client=mocker.Mock(), service="service")
+    test_object.secret_last_renewal_timestamp_gauge.remove.side_effect = KeyError
+    test_object.secret_expiration_timestamp_gauge.remove.side_effect = KeyError
+
+    test_object.remove_metrics()
+
+
+def test_update_metrics_failure_keeps_last_values(mocker):
+    """
+    A failed update leaves the gauges (including the last successful update timestamp) untouched
+    """
+    mock_vault_client = mocker.Mock()
+    mocker.patch.object(expiration_monitor, "Gauge", side_effect=lambda *args: mocker.Mock())
+    test_object = secret_expiration_monitor.SecretExpirationMonitor(mount_point="mount_point", monitored_path="monitored_path", vault_client=mock_vault_client, service="service")
+    mock_vault_client.session.get.return_value = get_response(mocker, 200, {"last_renewal_timestamp": "2022-05-02T09:49:41.415869Z", "expiration_timestamp": "2022-08-08T09:49:41.415869Z"})
+    test_object.update_metrics()
+    test_object.last_successful_update_timestamp_gauge.labels.return_value.set_to_current_time.assert_called_once()
+
+    mock_vault_client.session.get.return_value = get_response(mocker, 503)
+    with pytest.raises(requests.HTTPError):
+        test_object.update_metrics()
+
+    test_object.last_successful_update_timestamp_gauge.labels.return_value.set_to_current_time.assert_called_once()
+    test_object.secret_expiration_timestamp_gauge.labels.return_value.set.assert_called_once()
+    test_object.secret_expiration_timestamp_gauge.remove.assert_not_called()
+
+
+def test_monitor_is_compact(mocker):
+    """
+    Monitors have no per instance __dict__, and share their label keys and fieldnames
+    """
+    mocker.patch.object(expiration_monitor, "Gauge", side_effect=lambda *args: mocker.Mock())
+    first = secret_expiration_monitor.SecretExpirationMonitor(mount_point="mount_point", monitored_path="first", vault_client=mocker.Mock(), service="service", prometheus_labels={"key": "value"})
+    second = secret_expiration_monitor.SecretExpirationMonitor(mount_point="mount_point", monitored_path="second", vault_client=mocker.Mock(), service="service", prometheus_labels={"key": "value"})
+
+    assert not hasattr(first, "__dict__")
+    assert first._label_keys is second._label_keys
+    assert first._fieldnames is second._fieldnames
+
+
+def test_update_metrics_binds_series_once(mocker):
+    """
+    The series for the monitor's labels are looked up on the first update only, and again after they were removed
+    """
+    mock_vault_client = mocker.Mock()
+    mocker.patch.object(expiration_monitor, "Gauge", side_effect=lambda *args: mocker.Mock())
+    test_object = secret_expiration_monitor.SecretExpirationMonitor(mount_point="mount_point", monitored_path="monitored_path", vault_client=mock_vault_client, service="service")
+    mock_vault_client.session.get.return_value = get_response(mocker, 200, {"last_renewal_timestamp": "2022-05-02T09:49:41.415869Z", "expiration_timestamp": "2022-08-08T09:49:41.415869Z"})
+    test_object.secret_expiration_timestamp_gauge.labels.assert_not_called()
+
+    test_object.update_metrics()
+    test_object.update_metrics()
+    assert test_object.secret_expiration_timestamp_gauge.labels.call_count == 1
+    assert test_object.secret_expiration_timestamp_gauge.labels.return_value.set.call_count == 2
+
+    test_object.remove_metrics()
+    test_object.update_metrics()
+    assert test_object.secret_expiration_timestamp_gauge.labels.call_count == 2
+
+
+def test_update_metrics_without_series(mocker):
+    """
+    A monitor which doesn't export its series still keeps the expiration information for the summary metrics
+    """
+    mock_vault_client = mocker.Mock()
+    mocker.patch.object(expiration_monitor, "Gauge", side_effect=lambda *args: mocker.Mock())
+    test_object = secret_expiration_monitor.SecretExpirationMonitor(
+        mount_point="mount_point", monitored_path="monitored_path", vault_client=mock_vault_client, service="service", options=expiration_monitor.MonitorOptions(export_series=False, aggregate=True)
+    )
+    mock_vault_client.session.get.return_value = get_response(mocker, 200, {"last_renewal_timestamp": "2022-05-02T09:49:41Z", "expiration_timestamp": "2022-08-08T09:49:41Z"})
+
+    test_object.update_metrics()
+
+    test_object.secret_expiration_timestamp_gauge.labels.assert_not_called()
+    assert test_object.expiration_info.get_expiration_timestamp() == 1659952181
+
+
+def test_suppress_and_restore_series(mocker):
+    """
+    Suppressed monitors remove their series and keep updating without exposing them, until they are restored
+    """
+    mock_vault_client = mocker.Mock()
+    mocker.patch.object(expiration_monitor, "Gauge", side_effect=lambda *args: mocker.Mock())
+    test_object = secret_expiration_monitor.SecretExpirationMonitor(mount_point="mount_point", monitored_path="monitored_path", vault_client=mock_vault_client, service="service")
+    mock_vault_client.session.get.return_value = get_response(mocker, 200, {"last_renewal_timestamp": "2022-05-02T09:49:41Z", "expiration_timestamp": "2022-08-08T09:49:41Z"})
+
+    test_object.suppress_series()
+    test_object.suppress_series()
+    test_object.update_metrics()
+
+    test_object.secret_expiration_timestamp_gauge.remove.assert_called_once_with("monitored_path", "mount_point", "service")
+    test_object.secret_expiration_timestamp_gauge.labels.assert_not_called()
+    assert test_object.expiration_info is not None
+
+    test_object.restore_series()
+    test_object.update_metrics()
+
+    test_object.secret_expiration_timestamp_gauge.labels.return_value.set.assert_called_once()
+
+
+def test_restore_expiration_info(mocker):
+    """
+    Restored values are exposed right away, without claiming a successful update
+    """
+    mocker.patch.object(expiration_monitor, "Gauge", side_effect=lambda *args: mocker.Mock())
+    test_object = secret_expiration_monitor.SecretExpirationMonitor(mount_point="mount_point", monitored_path="monitored_path", vault_client=mocker.Mock(), service="service")
+
+    test_object.restore_expiration_info(100.0, 200.0)
+    test_object.restore_expiration_info(300.0, 400.0)
+
+    assert test_object.expiration_info.get_expiration_timestamp() == 200.0
+    test_object.secret_expiration_timestamp_gauge.labels.return_value.set.assert_called_once_with(200.0)
+    test_object.last_successful_update_timestamp_gauge.labels.assert_not_called()
@@ -0,0 +1,60 @@
+import io
+
+import pytest
+
+from vault_monitor.expiration_monitor import manifest
+
+EXPECTED = [
+    ({"mount_point": "secret", "secret_path": "some/secret", "days": 30}, None),
+    ({"mount_point": "secret", "secret_path": "other/secret", "weeks": 1, "expiration_timestamp_fieldname": "expires"}, None),
+]
+
+MANIFESTS = {
+    "yaml": """
+- mount_point: secret
+  secret_path: some/secret
+  days: 30
+- mount_point: secret
+  secret_path: other/secret
+  weeks: 1
+  expiration_timestamp_fieldname: expires
+""",
+    "csv": """mount_point,secret_path,weeks,days,expiration_timestamp_fieldname
+secret,some/secret,,30,
+secret,other/secret,1,,expires
+""",
+    "ndjson": """{"mount_point": "secret", "secret_path": "some/secret", "days": 30}
+
+{"mount_point": "secret", "secret_path": "other/secret", "weeks": 1, "expiration_timestamp_fieldname": "expires"}
+""",
+}
+
+
+@pytest.mark.parametrize("manifest_format", manifest.MANIFEST_FORMATS)
+def test_read_manifest(manifest_format):
+    assert list(manifest.read_manifest(io.StringIO(MANIFESTS[manifest_format]), manifest_format)) == EXPECTED
+
+
+def test_read_manifest_invalid_entries():
+    entries = list(manifest.read_manifest(io.StringIO('{"mount_point": "secret"}\n{"mount_point": "secret", "secret_path": "a", "days": -1}\n[]\n'), "ndjson"))
+
+    assert [entry for entry, _ in entries] == [{"mount_point": "secret"}, {"mount_point": "secret", "secret_path": "a", "days": -1}, {}]
+    assert all(error for _, error in entries)
+    assert "secret_path" in entries[0][1]
+    assert "days" in entries[1][1]
+
+
+@pytest.mark.parametrize("filename, manifest_format", [("secrets.yml", "yaml"), ("secrets.YAML", "yaml"), ("secrets.csv", "csv"), ("secrets.jsonl", "ndjson"), ("<stdin>", None)])
+def test_get_manifest_format(filename, manifest_format):
+    assert manifest.get_manifest_format(filename) == manifest_format
+
+
+def test_read_manifest_malformed_line():
+    """
+    A line which isn't JSON is reported as an invalid entry, and the entries after it are still read
+    """
+    entries = list(manifest.read_manifest(io.StringIO('{"mount_point": "secret", "secret_path": "a"}\nnot json\n{"mount_point": "secret", "secret_path": "b"}\n'), "ndjson"))
+
+    assert [entry for entry, _ in entries] == [{"mount_point": "secret", "secret_path": "a"}, {}, {"mount_point": "secret", "secret_path": "b"}]
+    assert entries[0][1] is None and entries[2][1] is None
+    assert entries[1][1].startswith("Malformed entry:")
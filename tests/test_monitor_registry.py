@@ -0,0 +1,176 @@
+from prometheus_client import CollectorRegistry, REGISTRY
+from pytest_mock import mocker
+
+from vault_monitor.common.exporter_metrics import ActiveMonitorsCollector
+from vault_monitor.common.monitor_registry import MonitorRegistry
+from vault_monitor.common.discovery import PeriodicDiscovery
+
+
+def test_sync_adds_and_removes(get_monitor):
+    registry = MonitorRegistry()
+    first, second, third = get_monitor("first"), get_monitor("second"), get_monitor("third")
+
+    assert registry.sync([first, second]) == ([first, second], [])
+    assert registry.sync([second, third]) == ([third], [first])
+    assert registry.get_monitors() == [second, third]
+    assert len(registry) == 2
+
+
+def test_sync_keeps_registered_instance(get_monitor):
+    """
+    A monitor with an already registered key must not replace the registered instance
+    """
+    registry = MonitorRegistry()
+    original = get_monitor("key")
+    registry.sync([original])
+
+    assert registry.sync([get_monitor("key")]) == ([], [])
+    assert registry.get_monitors_by_key() == {"key": original}
+
+
+def test_discovery_syncs_registry(get_monitor, mocker):
+    registry = MonitorRegistry()
+    old_monitor = get_monitor("old")
+    registry.sync([old_monitor])
+    new_monitor = get_monitor("new")
+    discover = mocker.Mock(return_value=[new_monitor])
+
+    PeriodicDiscovery(discover, registry, interval=60).run_discovery()
+
+    discover.assert_called_once()
+    assert list(discover.call_args.args[0].keys()) == ["old"]
+    assert registry.get_monitors() == [new_monitor]
+    # Series of monitors which dropped out of discovery are removed
+    old_monitor.remove_metrics.assert_called_once_with()
+    new_monitor.remove_metrics.assert_not_called()
+
+
+def test_failed_discovery_keeps_monitors(get_monitor, mocker):
+    registry = MonitorRegistry()
+    monitor = get_monitor("key")
+    registry.sync([monitor])
+
+    PeriodicDiscovery(mocker.Mock(side_effect=RuntimeError("Vault unavailable")), registry, interval=60).run_discovery()
+
+    assert registry.get_monitors() == [monitor]
+
+
+def test_discovery_metrics(get_monitor, mocker):
+    registry = MonitorRegistry()
+    discover = mocker.Mock(return_value=[get_monitor("first"), get_monitor("second")])
+
+    PeriodicDiscovery(discover, registry, interval=60).run_discovery()
+
+    assert REGISTRY.get_sample_value("vault_exporter_discovered_monitors", {"vault_target": ""}) == 2
+    assert REGISTRY.get_sample_value("vault_exporter_discovery_duration_seconds", {"vault_target": ""}) >= 0
+
+
+def test_active_monitors_collector(get_monitor):
+    registry = MonitorRegistry()
+    monitors = [get_monitor(key) for key in ["first", "second", "third"]]
+    for monitor, service in zip(monitors, ["service_a", "service_b", "service_a"]):
+        monitor.service = service
+    registry.sync(monitors)
+    collector_registry = CollectorRegistry()
+    collector_registry.register(ActiveMonitorsCollector(lambda: {"eu": registry.get_monitors(), "us": monitors[:1]}))
+
+    assert collector_registry.get_sample_value("vault_exporter_active_monitors", {"vault_target": "eu", "service": "service_a"}) == 2
+    assert collector_registry.get_sample_value("vault_exporter_active_monitors", {"vault_target": "eu", "service": "service_b"}) == 1
+    assert collector_registry.get_sample_value("vault_exporter_active_monitors", {"vault_target": "us", "service": "service_a"}) == 1
+
+    # Services without monitors disappear rather than reporting a stale count
+    registry.sync(monitors[:1])
+    assert collector_registry.get_sample_value("vault_exporter_active_monitors", {"vault_target": "eu", "service": "service_b"}) is None
+
+
+def test_active_monitors_collector_registration(mocker):
+    """
+    Registering the collector doesn't need the monitors, e.g. before the targets have authenticated
+    """
+    get_monitors = mocker.Mock(side_effect=RuntimeError("not authenticated yet"))
+
+    CollectorRegistry().register(ActiveMonitorsCollector(get_monitors))
+
+    get_monitors.assert_not_called()
+
+
+def test_add_keeps_registered_monitors(get_monitor):
+    registry = MonitorRegistry()
+    first = get_monitor("first")
+    registry.sync([first])
+    second = get_monitor("second")
+
+    assert registry.add([get_monitor("first"), second]) == [second]
+    assert registry.get_monitors() == [first, second]
+
+
+def test_initial_discovery_publishes_partial_results(get_monitor, mocker):
+    """
+    Monitors must be registered while the initial discovery is still running, and the exporter only reported ready once it is done
+    """
+    registry = MonitorRegistry()
+    monitors = [get_monitor(key) for key in ["first", "second"]]
+    registered_during_discovery = []
+
+    def discover(existing):
+        yield monitors[0]
+        registered_during_discovery.extend(registry.get_monitors())
+        assert not discovery.ready.is_set()
+        yield monitors[1]
+
+    on_added = mocker.Mock()
+    discovery = PeriodicDiscovery(discover, registry, interval=60, on_added=on_added)
+
+    assert discovery.run_initial_discovery()
+
+    assert registered_during_discovery == [monitors[0]]
+    assert registry.get_monitors() == monitors
+    assert on_added.call_args_list[0].args == ([monitors[0]],)
+    assert discovery.ready.is_set()
+
+
+def test_initial_discovery_retries(get_monitor, mocker):
+    registry = MonitorRegistry()
+    monitor = get_monitor("key")
+    discover = mocker.Mock(side_effect=[RuntimeError("Vault unavailable"), [monitor]])
+    discovery = PeriodicDiscovery(discover, registry, interval=60, retry_interval=0)
+
+    assert discovery.run_initial_discovery()
+
+    assert discover.call_count == 2
+    assert registry.get_monitors() == [monitor]
+    assert discovery.ready.is_set()
+
+
+def test_initial_discovery_retries_setup(get_monitor, mocker):
+    """
+    Discovery only starts once setup (e.g. authentication) succeeds, and setup isn't run again afterwards
+    """
+    registry = MonitorRegistry()
+    monitor = get_monitor("key")
+    setup = mocker.Mock(side_effect=[RuntimeError("Vault unavailable"), None])
+    discover = mocker.Mock(side_effect=[RuntimeError("Vault unavailable"), [monitor]])
+    discovery = PeriodicDiscovery(discover, registry, interval=60, retry_interval=0, vault_target="eu", setup=setup)
+
+    assert discovery.run_initial_discovery()
+
+    assert setup.call_count == 2
+    assert discover.call_count == 2
+    assert registry.get_monitors() == [monitor]
+    assert discovery.ready.is_set()
+
+
+def test_get_monitors_by_event_key(get_monitor):
+    registry = MonitorRegistry()
+    first, second, third = get_monitor("first"), get_monitor("second"), get_monitor("third")
+    first.event_key = second.event_key = ("team", "secret", "some/secret")
+    third.event_key = None
+    registry.sync([first, second, third])
+
+    assert registry.get_monitors_by_event_key(("team", "secret", "some/secret")) == [first, second]
+    assert registry.get_monitors_by_event_key(None) == []
+
+    registry.sync([second, third])
+    assert registry.get_monitors_by_event_key(("team", "secret", "some/secret")) == [second]
+    registry.sync([third])
+    assert registry.get_monitors_by_event_key(("team", "secret", "some/secret")) == []
@@ -0,0 +1,106 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from vault_monitor.common import rate_limit
+from vault_monitor.common.rate_limit import RateLimiter, TokenBucket
+
+
+def test_token_bucket_burst_then_rate(clock):
+    bucket = TokenBucket(rate=10, burst=5, clock=clock, sleep_function=clock.sleep)
+
+    for _ in range(5):
+        assert bucket.acquire() == 0
+    assert bucket.acquire() == pytest.approx(0.1)
+    assert bucket.acquire() == pytest.approx(0.1)
+
+    # Idle time refills the bucket, up to the burst size
+    clock.now += 100
+    for _ in range(5):
+        assert bucket.acquire() == 0
+    assert bucket.acquire() > 0
+
+
+def test_token_bucket_reserves_in_order(clock):
+    """
+    Requests arriving at the same time are spread out by the rate rather than all waking up together
+    """
+    waits = []
+    bucket = TokenBucket(rate=2, burst=1, clock=clock, sleep_function=waits.append)
+
+    assert [bucket.acquire() for _ in range(4)] == pytest.approx([0, 0.5, 1.0, 1.5])
+
+
+def test_unlimited_bucket_pause(clock):
+    bucket = TokenBucket(clock=clock, sleep_function=clock.sleep)
+
+    assert all(bucket.acquire() == 0 for _ in range(1000))
+
+    bucket.pause(5)
+    assert bucket.acquire() == 5
+    assert bucket.acquire() == 0
+
+
+def test_invalid_rate():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
+
+
+def test_rate_limiter_mounts(clock):
+    """
+    Mount point limits apply on top of the global limit, and pauses only affect the mount point
+    """
+    limiter = RateLimiter(mount_limits={"team": {"requests_per_second": 1}, "team/secret/": {"requests_per_second": 2, "burst": 1}}, clock=clock, sleep_function=clock.sleep)
+
+    limiter.acquire("https://vault/v1/team/secret/metadata/a")
+    limiter.acquire("https://vault/v1/team/secret/metadata/b")
+    assert clock.sleeps == pytest.approx([0.5])
+
+    limiter.acquire("https://vault/v1/team/metadata/a")
+    limiter.acquire("https://vault/v1/team/metadata/b")
+    assert clock.sleeps[1:] == pytest.approx([1.0])
+
+    limiter.pause("https://vault/v1/other/metadata/a", 3)
+    limiter.acquire("https://vault/v1/identity/entity/id/1234")
+    assert clock.sleeps[2:] == pytest.approx([3])
+
+    limiter.pause("https://vault/v1/team/secret/metadata/a", 3)
+    limiter.acquire("https://vault/v1/identity/entity/id/1234")
+    assert len(clock.sleeps) == 3
+
+
+def test_rate_limiter_namespaces(clock):
+    """
+    Mount point limits apply separately in every namespace, unless they are prefixed with a namespace
+    """
+    limiter = RateLimiter(mount_limits={"secret": {"requests_per_second": 1}, "team-a/secret": {"requests_per_second": 2, "burst": 1}}, clock=clock, sleep_function=clock.sleep)
+
+    limiter.acquire("https://vault/v1/secret/metadata/a")
+    limiter.acquire("https://vault/v1/secret/metadata/a", namespace="team-b/")
+    assert clock.sleeps == []
+
+    limiter.acquire("https://vault/v1/secret/metadata/a", namespace="team-a")
+    limiter.acquire("https://vault/v1/secret/metadata/b", namespace="team-a")
+    assert clock.sleeps == pytest.approx([0.5])
+
+    limiter.pause("https://vault/v1/secret/metadata/a", 3, namespace="team-b")
+    limiter.acquire("https://vault/v1/secret/metadata/b", namespace="team-c")
+    assert len(clock.sleeps) == 1
+    limiter.acquire("https://vault/v1/secret/metadata/b", namespace="team-b")
+    assert clock.sleeps[1:] == pytest.approx([3])
+
+
+@pytest.mark.parametrize(
+    "header, delay",
+    [
+        (None, rate_limit.DEFAULT_RETRY_AFTER),
+        ("2", 2),
+        ("0.5", 0.5),
+        ("-1", 0),
+        ("3600", rate_limit.MAX_RETRY_AFTER),
+        ("Wed, 21 Oct 2015 07:28:10 GMT", 10),
+        ("garbage", rate_limit.DEFAULT_RETRY_AFTER),
+    ],
+)
+def test_get_retry_after(header, delay):
+    assert rate_limit.get_retry_after(header, now=datetime(2015, 10, 21, 7, 28, tzinfo=timezone.utc)) == delay
@@ -0,0 +1,54 @@
+import pytest
+
+from vault_monitor.common.retry import CircuitBreaker, RetryPolicy
+
+
+@pytest.mark.parametrize("retry, maximum", [(0, 0.5), (1, 1), (3, 4), (10, 30)])
+def test_backoff_is_bounded(retry, maximum):
+    policy = RetryPolicy(backoff_factor=0.5, backoff_max=30)
+
+    backoffs = [policy.get_backoff(retry) for _ in range(100)]
+
+    assert all(0 <= backoff <= maximum for backoff in backoffs)
+    # Jitter spreads the retries out
+    assert len(set(backoffs)) > 1
+
+
+def test_circuit_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60, clock=clock)
+
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.allow_request()
+    assert not breaker.is_open
+
+    breaker.record_failure()
+    assert breaker.is_open
+    assert not breaker.allow_request()
+
+
+def test_circuit_breaker_trial_request(clock):
+    """
+    After reset_timeout a single trial request is let through, which decides whether the circuit closes
+    """
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60, clock=clock)
+    breaker.record_failure()
+
+    clock.now += 60
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+    # A failed trial keeps the circuit open for another reset_timeout
+    breaker.record_failure()
+    clock.now += 30
+    assert not breaker.allow_request()
+    clock.now += 30
+    assert breaker.allow_request()
+
+    breaker.record_success()
+    assert not breaker.is_open
+    assert breaker.allow_request()
+    assert breaker.allow_request()
@@ -0,0 +1,93 @@
+import pytest
+from pytest_mock import mocker
+
+from vault_monitor.common import scheduler
+from vault_monitor.common.scheduler import FixedRateScheduler
+
+
+def run_tasks(clock, test_scheduler, durations):
+    starts = []
+
+    def task():
+        starts.append(clock.now)
+        clock.now += durations[len(starts) - 1]
+
+    test_scheduler.run(task, cycles=len(durations))
+    return starts
+
+
+def test_fixed_rate_does_not_drift(clock):
+    """
+    The period must be the interval, not the interval plus the duration of the task
+    """
+    test_scheduler = FixedRateScheduler(30, clock=clock, sleep_function=clock.sleep)
+
+    starts = run_tasks(clock, test_scheduler, [10, 20, 5, 29])
+
+    assert starts == [1000, 1030, 1060, 1090]
+
+
+def test_overrun_immediate(mocker, clock):
+    mock_overruns = mocker.patch.object(scheduler, "CYCLE_OVERRUNS_COUNTER")
+    test_scheduler = FixedRateScheduler(30, overrun_policy="immediate", clock=clock, sleep_function=clock.sleep)
+
+    starts = run_tasks(clock, test_scheduler, [45, 5, 5])
+
+    # The second cycle starts as soon as the first one finishes, then the schedule continues from there
+    assert starts == [1000, 1045, 1075]
+    mock_overruns.inc.assert_called_once_with()
+
+
+def test_overrun_skip(mocker, clock):
+    mock_overruns = mocker.patch.object(scheduler, "CYCLE_OVERRUNS_COUNTER")
+    mock_skipped = mocker.patch.object(scheduler, "CYCLES_SKIPPED_COUNTER")
+    test_scheduler = FixedRateScheduler(30, overrun_policy="skip", clock=clock, sleep_function=clock.sleep)
+
+    starts = run_tasks(clock, test_scheduler, [75, 5, 5])
+
+    # The starts at 1030 and 1060 were missed, so the next one is at 1090
+    assert starts == [1000, 1090, 1120]
+    mock_overruns.inc.assert_called_once_with()
+    mock_skipped.inc.assert_called_once_with(2)
+
+
+def test_lag_is_reported(mocker, clock):
+    mock_lag = mocker.patch.object(scheduler, "CYCLE_LAG_GAUGE")
+    test_scheduler = FixedRateScheduler(30, overrun_policy="immediate", clock=clock, sleep_function=clock.sleep)
+
+    run_tasks(clock, test_scheduler, [40, 5, 5])
+
+    # The second cycle was due at 1030 but started at 1040, the third is back on its (new) schedule
+    assert mock_lag.set.call_args_list == [mocker.call(0.0), mocker.call(10.0), mocker.call(0.0)]
+
+
+def test_jitter_delays_start(mocker, clock):
+    mocker.patch.object(scheduler.random, "uniform", return_value=2.5)
+    test_scheduler = FixedRateScheduler(30, jitter=5, clock=clock, sleep_function=clock.sleep)
+
+    starts = run_tasks(clock, test_scheduler, [1, 1])
+
+    # Jitter offsets each start, but doesn't accumulate into the schedule
+    assert starts == [1002.5, 1032.5]
+
+
+@pytest.mark.parametrize("interval, overrun_policy", [(0, "immediate"), (30, "catch_up")])
+def test_invalid_configuration(interval, overrun_policy):
+    with pytest.raises(ValueError):
+        FixedRateScheduler(interval, overrun_policy=overrun_policy)
+
+
+@pytest.mark.parametrize(
+    "overrun_policy, now, expected",
+    [
+        ("immediate", 1020, (1030, 1030)),
+        ("immediate", 1045, (1030, 1045)),
+        ("skip", 1045, (1060, 1060)),
+        ("skip", 1060, (1060, 1060)),
+    ],
+)
+def test_get_next_start(mocker, overrun_policy, now, expected):
+    mocker.patch.object(scheduler, "CYCLE_OVERRUNS_COUNTER")
+    mocker.patch.object(scheduler, "CYCLES_SKIPPED_COUNTER")
+
+    assert FixedRateScheduler(30, overrun_policy=overrun_policy).get_next_start(1030, now) == expected
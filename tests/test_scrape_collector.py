@@ -0,0 +1,90 @@
+import threading
+import time
+
+from prometheus_client import CollectorRegistry, Gauge, generate_latest
+from pytest_mock import mocker
+
+from vault_monitor.common import scrape_collector
+from vault_monitor.common.scrape_collector import RefreshOnScrapeCollector
+
+
+def get_registry():
+    registry = CollectorRegistry()
+    gauge = Gauge("test_gauge", "Gauge for testing.", registry=registry)
+    return registry, gauge
+
+
+def test_scrape_refreshes_and_exposes_registry():
+    """
+    A scrape must refresh the values before they are exposed
+    """
+    registry, gauge = get_registry()
+    collector = RefreshOnScrapeCollector(lambda: gauge.set(42), ttl=60, registry=registry)
+
+    assert b"test_gauge 42.0" in generate_latest(collector)
+
+
+def test_scrape_uses_cache_within_ttl(mocker):
+    registry, _ = get_registry()
+    refresh = mocker.Mock()
+    collector = RefreshOnScrapeCollector(refresh, ttl=60, registry=registry)
+
+    generate_latest(collector)
+    generate_latest(collector)
+
+    refresh.assert_called_once_with()
+
+
+def test_scrape_refreshes_after_ttl(mocker):
+    registry, _ = get_registry()
+    refresh = mocker.Mock()
+    mock_monotonic = mocker.patch.object(scrape_collector, "monotonic", return_value=100.0)
+    collector = RefreshOnScrapeCollector(refresh, ttl=30, registry=registry)
+
+    generate_latest(collector)
+    mock_monotonic.return_value = 131.0
+    generate_latest(collector)
+
+    assert refresh.call_count == 2
+
+
+def test_concurrent_scrapes_share_refresh():
+    """
+    Scrapes arriving during an in-flight refresh must wait for it instead of starting their own
+    """
+    registry, _ = get_registry()
+    refresh_calls = []
+
+    def slow_refresh():
+        refresh_calls.append(1)
+        time.sleep(0.2)
+
+    collector = RefreshOnScrapeCollector(slow_refresh, ttl=60, registry=registry)
+    threads = [threading.Thread(target=generate_latest, args=(collector,)) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(refresh_calls) == 1
+
+
+def test_failed_refresh_still_serves(mocker):
+    registry, gauge = get_registry()
+    gauge.set(7)
+    collector = RefreshOnScrapeCollector(mocker.Mock(side_effect=RuntimeError("Vault unavailable")), ttl=60, registry=registry)
+
+    assert b"test_gauge 7.0" in generate_latest(collector)
+
+
+def test_restricted_scrape(mocker):
+    registry, gauge = get_registry()
+    Gauge("other_gauge", "Another gauge.", registry=registry)
+    refresh = mocker.Mock()
+    collector = RefreshOnScrapeCollector(refresh, ttl=60, registry=registry)
+
+    output = generate_latest(collector.restricted_registry(["test_gauge"]))
+
+    refresh.assert_called_once_with()
+    assert b"test_gauge" in output
+    assert b"other_gauge" not in output
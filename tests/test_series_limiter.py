@@ -0,0 +1,72 @@
+import pytest
+from prometheus_client import REGISTRY
+
+from vault_monitor.expiration_monitor.series_limiter import SeriesLimiter, get_path_label
+
+
+def get_kept(monitors):
+    return [monitor.key for monitor in monitors if monitor.restore_series.called]
+
+
+def test_no_limits(get_monitor):
+    monitors = [get_monitor(index, service="service", expiration_timestamp=index) for index in range(3)]
+
+    assert SeriesLimiter().apply(monitors) == 0
+    assert get_kept(monitors) == [0, 1, 2]
+
+
+def test_service_limit_keeps_soonest_expiring(get_monitor):
+    monitors = [
+        get_monitor("late", service="service", expiration_timestamp=300),
+        get_monitor("soon", service="service", expiration_timestamp=100),
+        get_monitor("unknown", service="service", expiration_timestamp=None),
+        get_monitor("other", service="other", expiration_timestamp=500),
+    ]
+
+    assert SeriesLimiter(service_limits={"service": 1}).apply(monitors) == 2
+
+    assert get_kept(monitors) == ["soon", "other"]
+    monitors[0].suppress_series.assert_called_once_with()
+    monitors[2].suppress_series.assert_called_once_with()
+    assert REGISTRY.get_sample_value("vault_exporter_series_limit_exceeded", {"vault_target": "", "scope": "service"}) == 1
+    assert REGISTRY.get_sample_value("vault_exporter_series_limit_exceeded", {"vault_target": "", "scope": "global"}) == 0
+    assert REGISTRY.get_sample_value("vault_exporter_suppressed_monitors", {"vault_target": "", "service": "service"}) == 2
+    assert REGISTRY.get_sample_value("vault_exporter_suppressed_monitors", {"vault_target": "", "service": "other"}) == 0
+
+
+def test_global_limit(get_monitor):
+    monitors = [
+        get_monitor("late", service="service", expiration_timestamp=300),
+        get_monitor("soon", service="service", expiration_timestamp=100),
+        get_monitor("other", service="other", expiration_timestamp=200),
+    ]
+
+    assert SeriesLimiter(global_limit=2).apply(monitors) == 1
+
+    assert get_kept(monitors) == ["soon", "other"]
+    assert REGISTRY.get_sample_value("vault_exporter_series_limit_exceeded", {"vault_target": "", "scope": "global"}) == 1
+
+
+def test_limits_ignore_monitors_without_series(get_monitor):
+    monitors = [get_monitor("aggregated", service="service", expiration_timestamp=100, export_series=False), get_monitor("exported", service="service", expiration_timestamp=300)]
+
+    assert SeriesLimiter(global_limit=1).apply(monitors) == 0
+
+    monitors[0].suppress_series.assert_not_called()
+    monitors[0].restore_series.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "mode, path, expected",
+    [
+        ("full", "some/very/long/path", "some/very/long/path"),
+        ("truncate", "short/path", "short/path"),
+        ("truncate", "some/very/long/path/to/a/secret", "some/very/lo~b30dbe4a"),
+        ("hash", "short/path", "094ad345689fcedf"),
+    ],
+)
+def test_get_path_label(mode, path, expected):
+    label = get_path_label(path, mode, max_length=21)
+
+    assert label == expected
+    assert len(label) <= 21
@@ -0,0 +1,155 @@
+import argparse
+import io
+import json
+import threading
+
+import pytest
+import requests
+from pytest_mock import mocker
+
+from vault_monitor.expiration_monitor import set_expiration
+
+
+def get_response(mocker, status_code, json=None):
+    response = mocker.Mock(status_code=status_code)
+    response.json.return_value = json
+    if status_code >= 400:
+        response.raise_for_status.side_effect = requests.HTTPError(f"{status_code} error")
+    return response
+
+
+def call_set_expiration(session, use_patch=True):
+    return set_expiration.set_expiration("secret", "some/secret", 0, 1, 0, 0, 0, "https://vault", "namespace", "token", session=session, use_patch=use_patch)
+
+
+def test_set_expiration_patch(mocker):
+    session = mocker.Mock()
+    session.patch.return_value = get_response(mocker, 204)
+
+    assert call_set_expiration(session) is True
+    session.patch.assert_called_once()
+    assert session.patch.call_args.args == ("https://vault/v1/secret/metadata/some/secret",)
+    assert set(session.patch.call_args.kwargs["json"]["custom_metadata"]) == {"last_renewal_timestamp", "expiration_timestamp"}
+    session.get.assert_not_called()
+
+
+def test_set_expiration_fallback(mocker):
+    """
+    Without PATCH support, the metadata is read, updated and written back
+    """
+    session = mocker.Mock()
+    session.patch.return_value = get_response(mocker, 405)
+    metadata = {"created_time": "", "current_version": 1, "oldest_version": 0, "updated_time": "", "versions": {}, "custom_metadata": {"owner": "team"}, "max_versions": 0}
+    session.get.return_value = get_response(mocker, 200, {"data": metadata})
+    session.put.return_value = get_response(mocker, 204)
+
+    with pytest.warns(DeprecationWarning):
+        assert call_set_expiration(session) is False
+
+    put_json = session.put.call_args.kwargs["json"]
+    assert set(put_json) == {"custom_metadata", "max_versions"}
+    assert set(put_json["custom_metadata"]) == {"owner", "last_renewal_timestamp", "expiration_timestamp"}
+
+
+def test_set_expiration_without_patch(mocker):
+    session = mocker.Mock()
+    session.get.return_value = get_response(mocker, 200, {"data": {"created_time": "", "current_version": 1, "oldest_version": 0, "updated_time": "", "versions": {}, "custom_metadata": None}})
+    session.put.return_value = get_response(mocker, 204)
+
+    assert call_set_expiration(session, use_patch=False) is False
+    session.patch.assert_not_called()
+    session.put.assert_called_once()
+
+
+def test_set_expiration_error(mocker):
+    session = mocker.Mock()
+    session.patch.return_value = get_response(mocker, 403)
+
+    with pytest.raises(requests.HTTPError):
+        call_set_expiration(session)
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_set_expiration_bulk(mocker, workers):
+    """
+    PATCH support is probed once, with the result used for every following secret, and failures are collected
+    """
+    calls = []
+    lock = threading.Lock()
+
+    def update_secret(secret_path, use_patch):
+        with lock:
+            calls.append((secret_path, use_patch))
+        if secret_path in ["/a", "/e"]:
+            raise requests.HTTPError("403 error")
+        return False
+
+    updated, errors = set_expiration.set_expiration_bulk((f"/{name}" for name in "abcdefg"), update_secret, workers=workers)
+
+    assert updated == 5
+    assert sorted(errors) == [("/a", "403 error"), ("/e", "403 error")]
+    # The first secret failed, so the second one is still used to probe for PATCH support
+    assert calls[:2] == [("/a", True), ("/b", True)]
+    assert sorted(calls[2:]) == [(f"/{name}", False) for name in "cdefg"]
+
+
+def test_set_expiration_bulk_streams(mocker):
+    """
+    Updates must start before the discovery of secret paths has finished
+    """
+    events = []
+
+    def secret_paths():
+        for name in "abc":
+            events.append(f"listed {name}")
+            yield name
+
+    def update_secret(secret_path, use_patch):
+        events.append(f"updated {secret_path}")
+        return True
+
+    set_expiration.set_expiration_bulk(secret_paths(), update_secret, workers=1)
+
+    assert events.index("updated a") < events.index("listed b")
+
+
+def test_set_expiration_from_manifest(mocker):
+    """
+    Every entry gets a result, with missing values taken from the defaults
+    """
+    mock_set_expiration = mocker.patch.object(set_expiration, "set_expiration", side_effect=[True, requests.HTTPError("403 error")])
+    manifest = io.StringIO('{"mount_point": "secret", "secret_path": "a", "days": 30}\n{"secret_path": "b"}\n{"mount_point": "secret", "secret_path": "c"}\n')
+    results = io.StringIO()
+    defaults = argparse.Namespace(weeks=1, days=0, hours=0, minutes=0, seconds=0, last_renewed_timestamp_fieldname="renewed", expiration_timestamp_fieldname="expires")
+
+    updated, failed = set_expiration.set_expiration_from_manifest(manifest, "ndjson", results, mocker.Mock(), defaults)
+
+    assert (updated, failed) == (1, 2)
+    assert [json.loads(line) for line in results.getvalue().splitlines()] == [
+        {"entry": 1, "mount_point": "secret", "secret_path": "a", "status": "updated"},
+        {"entry": 2, "mount_point": None, "secret_path": "b", "status": "failed", "error": "Invalid entry: {'mount_point': ['required field']}"},
+        {"entry": 3, "mount_point": "secret", "secret_path": "c", "status": "failed", "error": "403 error"},
+    ]
+    assert mock_set_expiration.call_args_list[0].args[2:7] == (1, 30, 0, 0, 0)
+    assert mock_set_expiration.call_args_list[1].args[10:12] == ("renewed", "expires")
+    # PATCH support is only probed on the first entry
+    assert mock_set_expiration.call_args_list[1].kwargs["use_patch"] is True
+
+
+def test_set_expiration_from_manifest_malformed_line(mocker):
+    """
+    A malformed NDJSON line fails its own entry without aborting the rest of the manifest
+    """
+    mocker.patch.object(set_expiration, "set_expiration", return_value=True)
+    manifest = io.StringIO('{"mount_point": "secret", "secret_path": "a"}\nnot json\n{"mount_point": "secret", "secret_path": "c"}\n')
+    results = io.StringIO()
+    defaults = argparse.Namespace(weeks=1, days=0, hours=0, minutes=0, seconds=0, last_renewed_timestamp_fieldname="renewed", expiration_timestamp_fieldname="expires")
+
+    updated, failed = set_expiration.set_expiration_from_manifest(manifest, "ndjson", results, mocker.Mock(), defaults, workers=2)
+
+    assert (updated, failed) == (2, 1)
+    results_by_entry = {result["entry"]: result for result in map(json.loads, results.getvalue().splitlines())}
+    assert sorted(results_by_entry) == [1, 2, 3]
+    assert results_by_entry[2]["status"] == "failed"
+    assert results_by_entry[2]["error"].startswith("Invalid entry: Malformed entry:")
+    assert results_by_entry[3]["status"] == "updated"
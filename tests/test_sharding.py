@@ -0,0 +1,35 @@
+import pytest
+
+from vault_monitor.common.sharding import ShardSelector
+
+
+def test_single_shard_owns_everything():
+    shard = ShardSelector()
+    assert all(shard.owns("secret", f"path/{index}") for index in range(100))
+
+
+def test_shards_are_disjoint_and_complete():
+    """
+    Every object must be owned by exactly one of the shards
+    """
+    shards = [ShardSelector(shard_index=index, shard_count=3) for index in range(3)]
+    paths = [f"path/{index}" for index in range(3000)]
+
+    owners = [[shard.owns("secret", path) for shard in shards].count(True) for path in paths]
+    assert owners == [1] * len(paths)
+
+    # The split should be reasonably even
+    for shard in shards:
+        assert 800 < sum(shard.owns("secret", path) for path in paths) < 1200
+
+
+def test_ownership_is_stable():
+    assert ShardSelector(1, 4).owns("secret", "some/secret") == ShardSelector(1, 4).owns("secret", "some/secret")
+    # The parts are separated, so shifting characters between them changes the identity
+    assert [ShardSelector(index, 64).owns("secret", "a/b") for index in range(64)] != [ShardSelector(index, 64).owns("secret/a", "b") for index in range(64)]
+
+
+@pytest.mark.parametrize("shard_index, shard_count", [(0, 0), (2, 2), (-1, 2)])
+def test_invalid_shards(shard_index, shard_count):
+    with pytest.raises(ValueError):
+        ShardSelector(shard_index, shard_count)
@@ -0,0 +1,66 @@
+import gzip
+import json
+
+from vault_monitor.expiration_monitor.snapshot import ExpirationSnapshot, SnapshotWriter
+
+
+def get_monitors(get_monitor):
+    return [
+        get_monitor(("SecretExpirationMonitor", "service", "secret", "tree/a"), expiration_timestamp=200.5, last_renewal_timestamp=100.0),
+        get_monitor(("SecretExpirationMonitor", "service", "secret", "tree/b")),
+        get_monitor(("EntityExpirationMonitor", "service", "approle", "1234"), expiration_timestamp=300.0, last_renewal_timestamp=100.0),
+    ]
+
+
+def test_write_and_load(get_monitor, tmp_path):
+    path = str(tmp_path / "snapshot.json.gz")
+
+    ExpirationSnapshot.from_monitors(get_monitors(get_monitor)).write(path)
+    snapshot = ExpirationSnapshot.load(path)
+
+    assert snapshot.entries == {
+        ("SecretExpirationMonitor", "service", "secret", "tree/a"): (100.0, 200.5),
+        ("SecretExpirationMonitor", "service", "secret", "tree/b"): None,
+        ("EntityExpirationMonitor", "service", "approle", "1234"): (100.0, 300.0),
+    }
+    assert snapshot.get_secret_paths() == {("service", "secret"): ["tree/a", "tree/b"]}
+    # Only the snapshot itself is left behind
+    assert [file.name for file in tmp_path.iterdir()] == ["snapshot.json.gz"]
+
+
+def test_write_replaces_existing(get_monitor, tmp_path):
+    path = str(tmp_path / "snapshot.json.gz")
+    ExpirationSnapshot.from_monitors(get_monitors(get_monitor)).write(path)
+
+    ExpirationSnapshot.from_monitors(get_monitors(get_monitor)[:1]).write(path)
+
+    assert len(ExpirationSnapshot.load(path).entries) == 1
+
+
+def test_load_missing_or_unusable(tmp_path):
+    assert ExpirationSnapshot.load(str(tmp_path / "missing.json.gz")) is None
+
+    corrupt_path = tmp_path / "corrupt.json.gz"
+    corrupt_path.write_bytes(b"not gzip")
+    assert ExpirationSnapshot.load(str(corrupt_path)) is None
+
+    old_version_path = tmp_path / "old.json.gz"
+    with gzip.open(old_version_path, "wt") as snapshot_file:
+        json.dump({"version": 0, "monitors": []}, snapshot_file)
+    assert ExpirationSnapshot.load(str(old_version_path)) is None
+
+
+def test_restore(get_monitor):
+    snapshot = ExpirationSnapshot.from_monitors(get_monitors(get_monitor))
+    monitors = get_monitors(get_monitor)
+
+    assert snapshot.restore(monitors) == 2
+
+    monitors[0].restore_expiration_info.assert_called_once_with(100.0, 200.5)
+    monitors[1].restore_expiration_info.assert_not_called()
+
+
+def test_writer_failure_is_logged(get_monitor, tmp_path):
+    writer = SnapshotWriter(str(tmp_path / "missing_directory" / "snapshot.json.gz"), lambda: get_monitors(get_monitor))
+
+    writer.write_snapshot()
@@ -0,0 +1,171 @@
+import io
+import time
+
+import pytest
+import yaml
+from prometheus_client import REGISTRY, CollectorRegistry
+from pytest_mock import mocker
+
+from vault_monitor.common.monitor_registry import MonitorRegistry
+from vault_monitor.expiration_monitor import expiration_monitor
+from vault_monitor.expiration_monitor.secret_expiration_monitor import SecretExpirationMonitor
+from vault_monitor.expiration_monitor.entity_expiration_monitor import EntityExpirationMonitor
+from vault_monitor.scripts import start_exporter
+
+MONITORING_CONFIG = {"services": [{"name": "service", "secrets": [{"mount_point": "secret", "secret_path": "some/secret"}]}]}
+
+
+@pytest.fixture(autouse=True)
+def mock_gauge(mocker):
+    """
+    Replaces the gauges with mocks and cleans them out after every run
+    """
+    yield mocker.patch.object(expiration_monitor, "Gauge", autospec=True)
+    for monitor_class in [SecretExpirationMonitor, EntityExpirationMonitor]:
+        for gauge_name in ["secret_last_renewal_timestamp_gauge", "secret_expiration_timestamp_gauge", "last_successful_update_timestamp_gauge"]:
+            if gauge_name in monitor_class.__dict__:
+                delattr(monitor_class, gauge_name)
+
+
+@pytest.fixture
+def targets(mocker, request):
+    """
+    Replaces VaultTarget, returning the mock targets created by configure_and_launch by name, the targets named in the parameter fail to authenticate
+    """
+    created = {}
+    unavailable = getattr(request, "param", [])
+
+    def create_target(vault_config, name=None, max_concurrency=1):
+        target = mocker.Mock(registry=MonitorRegistry(), vault_config=vault_config)
+        target.name = name
+        target.get_cycle_stats.return_value = (0, 0)
+        if name in unavailable:
+            target.authenticate.side_effect = ConnectionError("Vault unavailable")
+        target.authenticate.return_value.session.get.return_value.json.return_value = {"data": {"custom_metadata": {}}}
+        created[name] = target
+        return target
+
+    mocker.patch.object(start_exporter, "VaultTarget", side_effect=create_target)
+    # Each run registers its own collectors
+    mocker.patch.object(start_exporter, "REGISTRY", CollectorRegistry())
+    return created
+
+
+def wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline, "Timed out waiting for the exporter"
+        time.sleep(0.01)
+
+
+def launch(mocker, targets, config, run_cycle):
+    """
+    Runs configure_and_launch until the scheduler is started, recording the readiness and which targets were authenticated when the HTTP server starts
+    """
+    at_server_start = {}
+
+    def start_http_server(port, registry=None):
+        at_server_start["ready"] = REGISTRY.get_sample_value("vault_exporter_ready")
+        at_server_start["authenticated"] = [name for name, target in targets.items() if target.authenticate.called]
+
+    mocker.patch.object(start_exporter, "start_http_server", side_effect=start_http_server)
+    scheduler = mocker.patch.object(start_exporter, "FixedRateScheduler")
+    scheduler.return_value.run.side_effect = run_cycle
+    start_exporter.configure_and_launch(io.StringIO(yaml.safe_dump(config)))
+    assert scheduler.call_args.args == (config.get("vault_events", {}).get("sweep_interval", config["refresh_interval"]),)
+    return at_server_start
+
+
+def test_configure_and_launch(mocker, targets):
+    """
+    The server starts before any target is authenticated or discovered, and each cycle refreshes the monitors and renews the tokens
+    """
+    config = {"refresh_interval": 30, "vault": {"address": "https://vault:8200", "authentication": {"token": {}}}, "expiration_monitoring": MONITORING_CONFIG}
+
+    def run_cycle(task):
+        wait_for(lambda: REGISTRY.get_sample_value("vault_exporter_ready") == 1)
+        task()
+
+    at_server_start = launch(mocker, targets, config, run_cycle)
+
+    target = targets[None]
+    assert at_server_start == {"ready": 0, "authenticated": []}
+    assert [monitor.monitored_path for monitor in target.registry.get_monitors()] == ["some/secret"]
+    target.renew_token.assert_called_once_with(45)
+
+
+@pytest.mark.parametrize("targets", [["eu"]], indirect=True)
+def test_configure_and_launch_unavailable_target(mocker, targets):
+    """
+    A target which fails to authenticate doesn't stop the others from being monitored, but keeps the exporter from reporting ready
+    """
+    config = {
+        "refresh_interval": 30,
+        "vault_targets": [{"name": name, "vault": {"address": f"https://{name}.vault:8200", "authentication": {"token": {}}}, "expiration_monitoring": MONITORING_CONFIG} for name in ["eu", "us"]],
+    }
+
+    def run_cycle(task):
+        wait_for(lambda: len(targets["us"].registry) == 1 and targets["eu"].authenticate.called)
+        task()
+
+    at_server_start = launch(mocker, targets, config, run_cycle)
+
+    assert at_server_start["ready"] == 0
+    assert REGISTRY.get_sample_value("vault_exporter_ready") == 0
+    assert len(targets["eu"].registry) == 0
+    assert [monitor.get_label_value("vault_target") for monitor in targets["us"].registry.get_monitors()] == ["us"]
+    # Renewal skips unauthenticated targets itself, see VaultTarget.renew_token
+    targets["us"].renew_token.assert_called_once_with(45)
+
+
+def test_configure_and_launch_vault_events(mocker, targets):
+    """
+    With vault_events, the cycle only runs every sweep_interval, so tokens are renewed by their own thread every refresh_interval
+    """
+    token_renewer = mocker.patch.object(start_exporter, "TokenRenewer")
+    event_listener = mocker.patch.object(start_exporter, "SecretEventListener")
+    config = {"refresh_interval": 30, "vault": {"authentication": {"token": {}}}, "vault_events": {"sweep_interval": 3600}, "expiration_monitoring": MONITORING_CONFIG}
+
+    def run_cycle(task):
+        wait_for(lambda: REGISTRY.get_sample_value("vault_exporter_ready") == 1)
+        task()
+
+    launch(mocker, targets, config, run_cycle)
+
+    target = targets[None]
+    token_renewer.assert_called_once_with([target], 30)
+    token_renewer.return_value.start.assert_called_once_with()
+    target.renew_token.assert_not_called()
+    assert event_listener.call_args.args[:2] == (target.authenticate.return_value, target.registry)
+
+
+def test_configure_and_launch_scrape_with_snapshot(mocker, targets):
+    """
+    In scrape mode the monitors are only updated on scrape, and the snapshot is restored once the target is authenticated
+    """
+    snapshot = mocker.patch.object(start_exporter.ExpirationSnapshot, "load").return_value
+    snapshot.get_secret_paths.return_value = {}
+    snapshot_writer = mocker.patch.object(start_exporter, "SnapshotWriter")
+    refresh_on_scrape = mocker.patch.object(start_exporter, "RefreshOnScrapeCollector")
+    config = {
+        "refresh_interval": 30,
+        "collection_mode": "scrape",
+        "vault": {"authentication": {"token": {}}},
+        "expiration_monitoring": {**MONITORING_CONFIG, "snapshot": {"path": "/tmp/snapshot.json.gz"}},
+    }
+
+    def run_cycle(task):
+        wait_for(lambda: REGISTRY.get_sample_value("vault_exporter_ready") == 1)
+        task()
+
+    launch(mocker, targets, config, run_cycle)
+
+    target = targets[None]
+    restored_monitors = snapshot.restore.call_args.args[0]
+    assert [monitor.monitored_path for monitor in restored_monitors] == ["some/secret"]
+    # Discovery reuses the monitor restored from the snapshot
+    assert target.registry.get_monitors() == restored_monitors
+    snapshot_writer.return_value.start.assert_called_once_with()
+    assert refresh_on_scrape.call_args.kwargs["ttl"] == 30
+    target.authenticate.return_value.session.get.assert_not_called()
+    target.renew_token.assert_called_once_with(45)
@@ -0,0 +1,118 @@
+from prometheus_client import CollectorRegistry, generate_latest
+
+from vault_monitor.expiration_monitor.summary_collector import ExpirationSummaryCollector
+
+NOW = 1000000.0
+MONITOR_DEFAULTS = {
+    "last_renewal_timestamp": NOW - 100,
+    "namespace": None,
+    "series_suppressed": False,
+    "aggregate": True,
+    "summary_metric_prefix": "vault_secret_summary",
+    "overflow_metric_prefix": "vault_secret_overflow",
+}
+
+
+def get_samples(collector):
+    registry = CollectorRegistry()
+    registry.register(collector)
+    return {(sample.name, tuple(sorted(sample.labels.items()))): sample.value for metric in registry.collect() for sample in metric.samples}
+
+
+def test_summary(get_monitor):
+    monitors = [
+        get_monitor(service="service", mount_point="secret", expiration_timestamp=NOW - 10, last_renewal_timestamp=NOW - 500),
+        get_monitor(service="service", mount_point="secret", expiration_timestamp=NOW + 50),
+        get_monitor(service="service", mount_point="secret", expiration_timestamp=NOW + 5000),
+        get_monitor(service="other", mount_point="secret", expiration_timestamp=NOW + 20),
+    ]
+
+    samples = get_samples(ExpirationSummaryCollector(lambda: monitors, buckets=[100, 0], clock=lambda: NOW))
+
+    labels = (("mount_point", "secret"), ("service", "service"))
+    assert samples[("vault_secret_summary_time_until_expiry_seconds_bucket", (("le", "0.0"),) + labels)] == 1
+    assert samples[("vault_secret_summary_time_until_expiry_seconds_bucket", (("le", "100.0"),) + labels)] == 2
+    assert samples[("vault_secret_summary_time_until_expiry_seconds_bucket", (("le", "+Inf"),) + labels)] == 3
+    assert samples[("vault_secret_summary_time_until_expiry_seconds_count", labels)] == 3
+    assert samples[("vault_secret_summary_time_until_expiry_seconds_sum", labels)] == 5040
+    assert samples[("vault_secret_summary_expired", labels)] == 1
+    assert samples[("vault_secret_summary_min_expiration_timestamp", labels)] == NOW - 10
+    assert samples[("vault_secret_summary_max_age_seconds", labels)] == 500
+    assert samples[("vault_secret_summary_expired", (("mount_point", "secret"), ("service", "other")))] == 0
+
+
+def test_summary_skips_monitors(get_monitor):
+    """
+    Only monitors with aggregate set and expiration information are included
+    """
+    not_aggregated = get_monitor(service="service", mount_point="secret", expiration_timestamp=NOW - 10, aggregate=False)
+    not_updated = get_monitor(service="service", mount_point="secret", expiration_timestamp=NOW - 10)
+    not_updated.expiration_info = None
+    entity = get_monitor(service="service", mount_point="approle", expiration_timestamp=NOW - 10, summary_metric_prefix="vault_entity_summary")
+
+    samples = get_samples(ExpirationSummaryCollector(lambda: [not_aggregated, not_updated, entity], clock=lambda: NOW))
+
+    assert all(name.startswith("vault_entity_summary") for name, _ in samples)
+    assert samples[("vault_entity_summary_expired", (("mount_point", "approle"), ("service", "service")))] == 1
+
+
+def test_summary_exposition(get_monitor):
+    monitors = [get_monitor(service="service", mount_point="secret", expiration_timestamp=NOW + 50)]
+    registry = CollectorRegistry()
+    registry.register(ExpirationSummaryCollector(lambda: monitors, clock=lambda: NOW))
+
+    output = generate_latest(registry).decode()
+
+    assert "# TYPE vault_secret_summary_time_until_expiry_seconds histogram" in output
+    assert 'vault_secret_summary_time_until_expiry_seconds_bucket{le="86400.0",mount_point="secret",service="service"} 1.0' in output
+
+
+def test_summary_overflow(get_monitor):
+    """
+    Monitors suppressed by the series limits are aggregated separately, unless they are aggregated already
+    """
+    monitors = [
+        get_monitor(service="service", mount_point="secret", expiration_timestamp=NOW - 10, aggregate=False, series_suppressed=True),
+        get_monitor(service="service", mount_point="secret", expiration_timestamp=NOW + 10, aggregate=True, series_suppressed=True),
+        get_monitor(service="service", mount_point="secret", expiration_timestamp=NOW + 10, aggregate=False, series_suppressed=False),
+    ]
+
+    samples = get_samples(ExpirationSummaryCollector(lambda: monitors, clock=lambda: NOW))
+
+    labels = (("mount_point", "secret"), ("service", "service"))
+    assert samples[("vault_secret_overflow_expired", labels)] == 1
+    assert samples[("vault_secret_overflow_time_until_expiry_seconds_count", labels)] == 1
+    assert samples[("vault_secret_summary_time_until_expiry_seconds_count", labels)] == 1
+
+
+def test_summary_by_target(get_monitor):
+    """
+    With a target label, the monitors of different targets with the same service and mount point are summarised separately
+    """
+    monitors = [
+        get_monitor(service="service", mount_point="secret", expiration_timestamp=NOW + 10),
+        get_monitor(service="service", mount_point="secret", expiration_timestamp=NOW - 10),
+        get_monitor(service="service", mount_point="secret", expiration_timestamp=NOW - 20),
+    ]
+    for monitor, target in zip(monitors, ["eu", "us", "us"]):
+        monitor.get_label_value.side_effect = {"vault_target": target}.get
+
+    samples = get_samples(ExpirationSummaryCollector(lambda: monitors, clock=lambda: NOW, target_label="vault_target"))
+
+    assert samples[("vault_secret_summary_expired", (("mount_point", "secret"), ("service", "service"), ("vault_target", "eu")))] == 0
+    assert samples[("vault_secret_summary_expired", (("mount_point", "secret"), ("service", "service"), ("vault_target", "us")))] == 2
+
+
+def test_summary_by_namespace(get_monitor):
+    """
+    The monitors of the same service and mount point in different namespaces are summarised separately
+    """
+    monitors = [
+        get_monitor(service="service", mount_point="secret", expiration_timestamp=NOW + 10),
+        get_monitor(service="service", mount_point="secret", expiration_timestamp=NOW - 10, namespace="team-a"),
+    ]
+
+    samples = get_samples(ExpirationSummaryCollector(lambda: monitors, clock=lambda: NOW))
+
+    assert samples[("vault_secret_summary_expired", (("mount_point", "secret"), ("service", "service")))] == 0
+    assert samples[("vault_secret_summary_expired", (("mount_point", "team-a/secret"), ("service", "service")))] == 1
@@ -0,0 +1,33 @@
+from pytest_mock import mocker
+
+from vault_monitor.common import token_renewal
+from vault_monitor.common.token_renewal import TokenRenewer, renew_tokens
+
+
+def test_renew_tokens(mocker):
+    """
+    A failing target doesn't keep the tokens of the other targets from being renewed
+    """
+    failures_counter = mocker.patch.object(token_renewal, "TOKEN_RENEWAL_FAILURES_COUNTER")
+    failing_target, target = mocker.Mock(), mocker.Mock()
+    failing_target.name = "eu"
+    failing_target.renew_token.side_effect = Exception("403")
+
+    renew_tokens([failing_target, target], 90)
+
+    target.renew_token.assert_called_once_with(90)
+    failures_counter.labels.assert_called_once_with(vault_target="eu")
+    failures_counter.labels.return_value.inc.assert_called_once()
+
+
+def test_token_renewer(mocker):
+    """
+    Tokens are renewed on start and then every interval, regardless of the refresh cycle
+    """
+    target = mocker.Mock()
+    renewer = TokenRenewer([target], 60)
+    mocker.patch.object(renewer._stop_event, "wait", side_effect=[False, True])
+
+    renewer.run()
+
+    assert target.renew_token.call_args_list == [mocker.call(90), mocker.call(90)]
@@ -0,0 +1,83 @@
+import threading
+import time
+
+import pytest
+from prometheus_client import REGISTRY
+from pytest_mock import mocker
+
+from vault_monitor.common.update_engine import UpdateEngine
+
+
+@pytest.mark.parametrize("max_concurrency", [1, 4])
+def test_run_cycle_updates_all_monitors(mocker, max_concurrency):
+    """
+    Ensure every monitor is updated once per cycle, both serially and concurrently
+    """
+    monitors = [mocker.Mock() for _ in range(10)]
+
+    engine = UpdateEngine(max_concurrency=max_concurrency)
+    failures = engine.run_cycle(monitors)
+    engine.shutdown()
+
+    assert failures == 0
+    for monitor in monitors:
+        monitor.update_metrics.assert_called_once_with()
+
+
+@pytest.mark.parametrize("max_concurrency", [1, 4])
+def test_failing_monitor_does_not_abort_cycle(mocker, max_concurrency):
+    """
+    A monitor raising during update must be counted as a failure without stopping the other monitors
+    """
+    monitors = [mocker.Mock() for _ in range(5)]
+    monitors[1].update_metrics.side_effect = RuntimeError("Vault is unhappy")
+    failures_before = REGISTRY.get_sample_value("vault_exporter_monitor_update_failures_total", {"monitor_type": "Mock"}) or 0
+
+    engine = UpdateEngine(max_concurrency=max_concurrency)
+    failures = engine.run_cycle(monitors)
+    engine.shutdown()
+
+    assert failures == 1
+    assert REGISTRY.get_sample_value("vault_exporter_monitor_update_failures_total", {"monitor_type": "Mock"}) == failures_before + 1
+    for monitor in monitors:
+        monitor.update_metrics.assert_called_once_with()
+
+
+def test_updates_run_in_parallel(mocker):
+    """
+    With enough concurrency, all monitors must be able to be in-flight at the same time
+    """
+    barrier = threading.Barrier(3, timeout=5)
+    monitors = [mocker.Mock() for _ in range(3)]
+    for monitor in monitors:
+        monitor.update_metrics.side_effect = barrier.wait
+
+    engine = UpdateEngine(max_concurrency=3)
+    assert engine.run_cycle(monitors) == 0
+    engine.shutdown()
+
+
+def test_invalid_concurrency():
+    with pytest.raises(ValueError):
+        UpdateEngine(max_concurrency=0)
+
+
+@pytest.mark.parametrize("max_concurrency", [1, 3])
+def test_submit_does_not_wait(mocker, max_concurrency):
+    """
+    Submitted updates run in the background, so the caller isn't held up by them
+    """
+    release = threading.Event()
+    monitors = [mocker.Mock() for _ in range(3)]
+    for monitor in monitors:
+        monitor.update_metrics.side_effect = lambda: release.wait(5)
+
+    engine = UpdateEngine(max_concurrency=max_concurrency)
+    start = time.monotonic()
+    engine.submit(monitors)
+    assert time.monotonic() - start < 1
+    release.set()
+    engine.shutdown()
+
+    for monitor in monitors:
+        monitor.update_metrics.assert_called_once_with()
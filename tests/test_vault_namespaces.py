@@ -0,0 +1,58 @@
+import pytest
+from pytest_mock import mocker
+
+from vault_monitor.common import vault_namespaces
+
+NAMESPACES = {
+    "": ["team-a/", "team-b/"],
+    "team-a": ["dev/", "prod/"],
+    "team-a/dev": [],
+}
+
+
+def get_vault_client(mocker, namespaces):
+    """
+    Returns a mock client whose session lists the provided namespaces, a dict of namespace path to child namespaces
+    """
+    vault_client = mocker.Mock()
+    vault_client.url = "https://vault:8200"
+    vault_client.token = "token"
+
+    def request(method, url, headers, timeout):
+        response = mocker.Mock()
+        response.status_code = 200 if headers["X-Vault-Namespace"] in namespaces else 404
+        response.json.return_value = {"data": {"keys": namespaces.get(headers["X-Vault-Namespace"])}}
+        return response
+
+    vault_client.session.request.side_effect = request
+    return vault_client
+
+
+@pytest.mark.parametrize("max_concurrency", [1, 4])
+def test_iter_namespaces(mocker, max_concurrency):
+    vault_client = get_vault_client(mocker, NAMESPACES)
+
+    namespaces = list(vault_namespaces.iter_namespaces(vault_client, max_concurrency=max_concurrency))
+
+    assert namespaces[0] == ""
+    assert sorted(namespaces[1:]) == ["team-a", "team-a/dev", "team-a/prod", "team-b"]
+    # Every namespace is listed with the namespace header on the shared session, rather than with a client per namespace
+    assert vault_client.session.request.call_count == 5
+    assert vault_client.session.request.call_args.args[:2] == ("LIST", "https://vault:8200/v1/sys/namespaces")
+
+
+def test_iter_namespaces_parent(mocker):
+    vault_client = get_vault_client(mocker, NAMESPACES)
+
+    assert list(vault_namespaces.iter_namespaces(vault_client, parent="/team-a/", recursive=False)) == ["team-a", "team-a/dev", "team-a/prod"]
+    vault_client.session.request.assert_called_once()
+
+
+def test_get_request_headers(mocker):
+    vault_client = mocker.Mock()
+    vault_client.adapter.namespace = "client"
+    vault_client.token = "token"
+
+    assert vault_namespaces.get_request_headers(vault_client) == {"X-Vault-Namespace": "client", "X-Vault-Token": "token"}
+    assert vault_namespaces.get_request_headers(vault_client, "") == {"X-Vault-Namespace": "", "X-Vault-Token": "token"}
+    assert vault_namespaces.get_request_headers(vault_client, "team-a") == {"X-Vault-Namespace": "team-a", "X-Vault-Token": "token"}
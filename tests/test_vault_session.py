@@ -0,0 +1,253 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import hvac
+import pytest
+import requests
+from prometheus_client import REGISTRY
+
+from vault_monitor.common import vault_session
+from vault_monitor.common.rate_limit import RateLimiter
+from vault_monitor.common.retry import CircuitBreaker, CircuitOpenError, RetryPolicy
+
+
+class MetadataHandler(BaseHTTPRequestHandler):
+    """
+    Minimal keep-alive capable stand in for Vault
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b'{"data": {}}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FailingHandler(MetadataHandler):
+    """
+    Responds to the first requests with the error statuses in server.failures, as Vault does when rate limited or unavailable
+    """
+
+    def do_GET(self):
+        if self.server.failures:
+            status_code = self.server.failures.pop(0)
+            self.send_response(status_code)
+            if status_code == 429:
+                self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        super().do_GET()
+
+
+@pytest.fixture
+def vault_server(request):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FailingHandler)
+    server.failures = list(getattr(request, "param", []))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_configure_connection_pool_mounts_adapter():
+    """
+    The pooled adapter must be used for both http and https requests from the client's session
+    """
+    client = hvac.Client(url="https://vault.test.url", token="token")
+    adapter = vault_session.configure_connection_pool(client, pool_size=3)
+
+    assert client.session.get_adapter("https://vault.test.url") is adapter
+    assert client.session.get_adapter("http://vault.test.url") is adapter
+    assert adapter._pool_maxsize == 3
+    assert "Connection" not in client.session.headers or client.session.headers["Connection"] != "close"
+
+
+def test_keep_alive_disabled():
+    client = hvac.Client(url="https://vault.test.url", token="token")
+    vault_session.configure_connection_pool(client, keep_alive=False)
+
+    assert client.session.headers["Connection"] == "close"
+
+
+def test_cycle_stats_count_reused_connections(vault_server):
+    """
+    Sequential requests over the pool should open a single connection and reuse it for every further request
+    """
+    client = hvac.Client(url=vault_server, token="token")
+    adapter = vault_session.configure_connection_pool(client)
+
+    for _ in range(5):
+        client.session.get(f"{vault_server}/v1/secret/metadata/test", timeout=5).raise_for_status()
+
+    assert adapter.get_cycle_stats() == (1, 4)
+
+    client.session.get(f"{vault_server}/v1/secret/metadata/test", timeout=5).raise_for_status()
+
+    # Only the requests made since the previous call are reported
+    assert adapter.get_cycle_stats() == (0, 1)
+
+
+def test_cycle_stats_concurrent_requests(vault_server):
+    """
+    Requests sent from many threads at once are all counted
+    """
+    client = hvac.Client(url=vault_server, token="token")
+    adapter = vault_session.configure_connection_pool(client, pool_size=4)
+
+    def send_requests():
+        for _ in range(25):
+            client.session.get(f"{vault_server}/v1/secret/metadata/test", timeout=5).raise_for_status()
+
+    threads = [threading.Thread(target=send_requests) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    opened, reused = adapter.get_cycle_stats()
+    assert opened + reused == 200
+
+
+def test_cycle_stats_without_keep_alive(vault_server):
+    client = hvac.Client(url=vault_server, token="token")
+    adapter = vault_session.configure_connection_pool(client, keep_alive=False)
+
+    for _ in range(3):
+        client.session.get(f"{vault_server}/v1/secret/metadata/test", timeout=5).raise_for_status()
+
+    assert adapter.get_cycle_stats() == (3, 0)
+
+
+@pytest.mark.parametrize("vault_server, max_retries, status_code", [([429, 429], 3, 200), ([429, 429], 1, 429)], indirect=["vault_server"])
+def test_rate_limited_requests_are_retried(vault_server, max_retries, status_code):
+    """
+    Requests rejected with 429 are retried after Retry-After, until max_retries is reached
+    """
+    client = hvac.Client(url=vault_server, token="token")
+    vault_session.configure_connection_pool(client, rate_limiter=RateLimiter(max_retries=max_retries))
+
+    assert client.session.get(f"{vault_server}/v1/secret/metadata/test", timeout=5).status_code == status_code
+
+
+@pytest.mark.parametrize("vault_server, max_retries, status_code, retries", [([503, 502], 3, 200, 2), ([503, 502], 1, 502, 1), ([403], 3, 403, 0)], indirect=["vault_server"])
+def test_server_errors_are_retried(vault_server, max_retries, status_code, retries):
+    """
+    Server errors are retried with backoff, other errors are returned straight away
+    """
+    client = hvac.Client(url=vault_server, token="token")
+    backoffs = []
+    vault_session.configure_connection_pool(client, retry_policy=RetryPolicy(max_retries=max_retries, sleep_function=backoffs.append))
+
+    assert client.session.get(f"{vault_server}/v1/secret/metadata/test", timeout=5).status_code == status_code
+    assert len(backoffs) == retries
+    assert all(0 <= backoff <= 0.5 * 2**retry for retry, backoff in enumerate(backoffs))
+
+
+def test_connection_errors_are_retried():
+    client = hvac.Client(url="http://127.0.0.1:1", token="token")
+    backoffs = []
+    vault_session.configure_connection_pool(client, retry_policy=RetryPolicy(max_retries=2, sleep_function=backoffs.append))
+
+    with pytest.raises(requests.ConnectionError):
+        client.session.get("http://127.0.0.1:1/v1/secret/metadata/test", timeout=5)
+    assert len(backoffs) == 2
+
+
+@pytest.mark.parametrize("vault_server", [[500, 500, 500]], indirect=True)
+def test_circuit_breaker(vault_server):
+    """
+    Requests to a mount point stop once its backend has failed repeatedly, without affecting other mount points
+    """
+    client = hvac.Client(url=vault_server, token="token")
+    vault_session.configure_connection_pool(client, circuit_breaker_factory=lambda: CircuitBreaker(failure_threshold=2, reset_timeout=3600))
+
+    for _ in range(2):
+        assert client.session.get(f"{vault_server}/v1/secret/metadata/test", timeout=5).status_code == 500
+    with pytest.raises(CircuitOpenError):
+        client.session.get(f"{vault_server}/v1/secret/metadata/test", timeout=5)
+    assert REGISTRY.get_sample_value("vault_exporter_circuit_breaker_open", {"vault_target": "", "mount_point": "secret"}) == 1
+
+    assert client.session.get(f"{vault_server}/v1/other/metadata/test", timeout=5).status_code == 500
+    assert client.session.get(f"{vault_server}/v1/other/metadata/test", timeout=5).status_code == 200
+
+
+@pytest.mark.parametrize("vault_server", [[500, 500]], indirect=True)
+def test_circuit_breaker_namespaces(vault_server):
+    """
+    The same mount point in another namespace has its own circuit breaker
+    """
+    client = hvac.Client(url=vault_server, token="token")
+    vault_session.configure_connection_pool(client, circuit_breaker_factory=lambda: CircuitBreaker(failure_threshold=2, reset_timeout=3600))
+
+    for _ in range(2):
+        client.session.get(f"{vault_server}/v1/kv/metadata/test", headers={"X-Vault-Namespace": "team-a/"}, timeout=5)
+    with pytest.raises(CircuitOpenError):
+        client.session.get(f"{vault_server}/v1/kv/metadata/test", headers={"X-Vault-Namespace": "team-a/"}, timeout=5)
+    assert REGISTRY.get_sample_value("vault_exporter_circuit_breaker_open", {"vault_target": "", "mount_point": "team-a/kv"}) == 1
+
+    assert client.session.get(f"{vault_server}/v1/kv/metadata/test", headers={"X-Vault-Namespace": "team-b"}, timeout=5).status_code == 200
+    assert client.session.get(f"{vault_server}/v1/kv/metadata/test", timeout=5).status_code == 200
+
+
+def test_timeout_override(mocker):
+    """
+    A configured timeout replaces the one requested by the caller
+    """
+    adapter = vault_session.PooledHTTPAdapter(timeout=(1, 2))
+    send = mocker.patch.object(vault_session.HTTPAdapter, "send")
+    send.return_value.status_code = 200
+    request = requests.Request("GET", "https://vault.test.url/v1/secret/metadata/test").prepare()
+
+    adapter.send(request, timeout=60)
+
+    assert send.call_args.kwargs["timeout"] == (1, 2)
+
+
+def test_get_request_timeout():
+    """
+    Requests made directly with the session of the client use the timeout configured for its connection pool
+    """
+    client = hvac.Client(url="https://vault.test.url", token="token")
+    assert vault_session.get_request_timeout(client) == (vault_session.DEFAULT_CONNECT_TIMEOUT, vault_session.DEFAULT_READ_TIMEOUT)
+
+    vault_session.configure_connection_pool(client, timeout=(1, 2))
+    assert vault_session.get_request_timeout(client) == (1, 2)
+
+
+@pytest.mark.parametrize(
+    "method, api_path, operation",
+    [
+        ("GET", "secret/metadata/some/secret", "metadata"),
+        ("PATCH", "secret/metadata/some/secret", "metadata_write"),
+        ("LIST", "secret/metadata/some", "list"),
+        ("GET", "identity/entity/id/1234", "entity"),
+        ("POST", "auth/token/renew-self", "renew"),
+        ("GET", "sys/health", "other"),
+    ],
+)
+def test_get_operation(method, api_path, operation):
+    assert vault_session.get_operation(method, api_path) == operation
+
+
+@pytest.mark.parametrize("vault_server", [[404]], indirect=True)
+def test_request_metrics(vault_server):
+    client = hvac.Client(url=vault_server, token="token")
+    vault_session.configure_connection_pool(client)
+    labels = {"vault_target": "", "operation": "metadata", "mount_point": "instrumented"}
+    requests_before = REGISTRY.get_sample_value("vault_exporter_request_duration_seconds_count", labels) or 0
+    errors_before = REGISTRY.get_sample_value("vault_exporter_request_errors_total", {"vault_target": "", "status_code": "404"}) or 0
+
+    for _ in range(2):
+        client.session.get(f"{vault_server}/v1/instrumented/metadata/test", timeout=5)
+
+    assert REGISTRY.get_sample_value("vault_exporter_request_duration_seconds_count", labels) == requests_before + 2
+    assert REGISTRY.get_sample_value("vault_exporter_request_errors_total", {"vault_target": "", "status_code": "404"}) == errors_before + 1
@@ -0,0 +1,135 @@
+import pytest
+from cerberus import Validator
+from pytest_mock import mocker
+
+from vault_monitor.common import vault_target
+from vault_monitor.common.vault_target import VaultTarget
+from vault_monitor.scripts.start_exporter import EXPORTER_MODULES, get_config_schema, get_vault_targets
+
+AUTHENTICATION = {"authentication": {"token": {}}}
+
+
+def get_target_config(name, prometheus_labels=None):
+    return {"name": name, "vault": {"address": f"https://{name}.vault:8200", **AUTHENTICATION}, "expiration_monitoring": {"prometheus_labels": prometheus_labels or {}}}
+
+
+def test_single_target():
+    config = {"vault": AUTHENTICATION, "expiration_monitoring": {"prometheus_labels": {"team": "a"}}}
+
+    assert get_vault_targets(config) == [(None, AUTHENTICATION, {"prometheus_labels": {"team": "a"}})]
+
+
+def test_vault_targets_label():
+    """
+    Every target's series carry its name as the vault_target label
+    """
+    config = {"vault_targets": [get_target_config("eu", {"team": "a"}), get_target_config("us", {"team": "b"})]}
+
+    targets = get_vault_targets(config)
+
+    assert [name for name, _, _ in targets] == ["eu", "us"]
+    assert targets[0][1]["address"] == "https://eu.vault:8200"
+    assert targets[0][2]["prometheus_labels"] == {"vault_target": "eu", "team": "a"}
+    assert targets[1][2]["prometheus_labels"] == {"vault_target": "us", "team": "b"}
+    # The configuration itself is left untouched
+    assert config["vault_targets"][0]["expiration_monitoring"]["prometheus_labels"] == {"team": "a"}
+
+
+@pytest.mark.parametrize(
+    "target_configs",
+    [
+        [get_target_config("eu"), get_target_config("eu")],
+        [get_target_config("eu", {"team": "a"}), get_target_config("us")],
+        [get_target_config("eu", {"vault_target": "other"})],
+        [get_target_config("eu"), {**get_target_config("us"), "expiration_monitoring": {"namespaces": {}}}],
+    ],
+)
+def test_invalid_vault_targets(target_configs):
+    with pytest.raises(ValueError):
+        get_vault_targets({"vault_targets": target_configs})
+
+
+def test_vault_target(mocker):
+    vault_client = mocker.Mock()
+    get_authenticated_client = mocker.patch.object(vault_target, "get_authenticated_client", return_value=vault_client)
+    configure_connection_pool = mocker.patch.object(vault_target, "configure_connection_pool")
+    configure_connection_pool.return_value.get_cycle_stats.return_value = (1, 2)
+
+    target = VaultTarget({"address": "https://eu.vault:8200", "token_autorenew": True, "connection_pool": {"pool_size": 4}, **AUTHENTICATION}, name="eu")
+    # Nothing is sent to Vault until the target is authenticated
+    get_authenticated_client.assert_not_called()
+    assert target.get_cycle_stats() == (0, 0)
+
+    assert target.authenticate() is vault_client
+    assert target.authenticate() is vault_client
+
+    get_authenticated_client.assert_called_once_with(auth_config={"token": {}}, address="https://eu.vault:8200", namespace=None)
+    assert configure_connection_pool.call_args.args == (vault_client,)
+    assert configure_connection_pool.call_args.kwargs["pool_size"] == 4
+    # The default timeouts apply without a timeouts section
+    assert configure_connection_pool.call_args.kwargs["timeout"] == (10, 60)
+    assert target.get_cycle_stats() == (1, 2)
+    assert len(target.registry) == 0
+
+    target.renew_token(45)
+    vault_client.auth.token.renew_self.assert_called_once_with("45s")
+
+
+def test_vault_target_without_autorenew(mocker):
+    vault_client = mocker.Mock()
+    mocker.patch.object(vault_target, "get_authenticated_client", return_value=vault_client)
+    mocker.patch.object(vault_target, "configure_connection_pool")
+
+    target = VaultTarget(AUTHENTICATION)
+    target.authenticate()
+    target.renew_token(45)
+
+    vault_client.auth.token.renew_self.assert_not_called()
+
+
+def test_vault_target_authentication_failure(mocker):
+    """
+    A failed authentication is retried by the next call, and tokens aren't renewed until it succeeds
+    """
+    vault_client = mocker.Mock()
+    mocker.patch.object(vault_target, "get_authenticated_client", side_effect=[ConnectionError("Vault unavailable"), vault_client])
+    mocker.patch.object(vault_target, "configure_connection_pool")
+    target = VaultTarget({"token_autorenew": True, **AUTHENTICATION}, name="eu")
+
+    with pytest.raises(ConnectionError):
+        target.authenticate()
+    assert target.vault_client is None
+    target.renew_token(45)
+
+    assert target.authenticate() is vault_client
+    vault_client.auth.token.renew_self.assert_not_called()
+
+
+def test_vault_target_timeouts(mocker):
+    mocker.patch.object(vault_target, "get_authenticated_client")
+    configure_connection_pool = mocker.patch.object(vault_target, "configure_connection_pool")
+
+    VaultTarget({"timeouts": {"read": 5}, **AUTHENTICATION}).authenticate()
+
+    assert configure_connection_pool.call_args.kwargs["timeout"] == (10, 5)
+
+
+def test_vault_targets_schema_service_labels():
+    """
+    Services of a target can override its prometheus_labels, as with a single target
+    """
+    config = {
+        "vault_targets": [
+            {
+                "name": "eu",
+                "vault": {"address": "https://eu.vault:8200", **AUTHENTICATION},
+                "expiration_monitoring": {
+                    "prometheus_labels": {"team": "a"},
+                    "services": [{"name": "service", "prometheus_labels": {"team": "b"}, "secrets": [{"mount_point": "secret", "secret_path": "a"}]}],
+                },
+            }
+        ]
+    }
+    validator = Validator(get_config_schema(EXPORTER_MODULES))
+
+    assert validator.validate(config), validator.errors
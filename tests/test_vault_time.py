@@ -88,3 +88,43 @@ def test_missing_fieldname_and_malformed_timestamp_is_zero(input, output):
     """
     expiration_metadata_object = ExpirationMetadata.from_metadata(input)
     assert expiration_metadata_object.get_serialized_expiration_metadata() == output
+
+
+@pytest.mark.parametrize(
+    "timestamp, expected",
+    [
+        ("2022-08-08T09:49:41Z", datetime.datetime(2022, 8, 8, 9, 49, 41, tzinfo=datetime.timezone.utc)),
+        ("2022-08-08T09:49:41.4Z", datetime.datetime(2022, 8, 8, 9, 49, 41, 400000, tzinfo=datetime.timezone.utc)),
+        # Nanosecond precision, as written by Vault
+        ("2022-08-08T09:49:41.415869123Z", datetime.datetime(2022, 8, 8, 9, 49, 41, 415869, tzinfo=datetime.timezone.utc)),
+        ("2022-08-08T11:49:41.415869+02:00", datetime.datetime(2022, 8, 8, 9, 49, 41, 415869, tzinfo=datetime.timezone.utc)),
+        ("2022-08-08T05:19:41.415869-04:30", datetime.datetime(2022, 8, 8, 9, 49, 41, 415869, tzinfo=datetime.timezone.utc)),
+        # As written by set_expiration
+        ("2022-08-08T09:49:41.415869+00:00Z", datetime.datetime(2022, 8, 8, 9, 49, 41, 415869, tzinfo=datetime.timezone.utc)),
+        ("2024-02-29T00:00:00Z", datetime.datetime(2024, 2, 29, tzinfo=datetime.timezone.utc)),
+    ],
+)
+def test_timestamp_formats(timestamp, expected):
+    """
+    Tests that fractional seconds of any precision and numeric offsets are parsed
+    """
+    expiration_metadata = ExpirationMetadata.from_metadata({"expiration_timestamp": timestamp, "last_renewed_timestamp": timestamp})
+
+    assert expiration_metadata.get_expiration_timestamp() == pytest.approx(expected.timestamp(), abs=1e-6)
+    assert expiration_metadata.expiration_time - expected < datetime.timedelta(microseconds=1)
+
+
+@pytest.mark.parametrize("timestamp", ["2022-02-29T00:00:00Z", "2022-13-01T00:00:00Z", "2022-08-08T24:00:00Z", "2022-08-08T09:49:41.1234567890Z", "2022-08-08T09:49:41+24:00", "2022-08-08"])
+def test_invalid_timestamps_are_zero(timestamp):
+    expiration_metadata = ExpirationMetadata.from_metadata({"expiration_timestamp": timestamp, "last_renewed_timestamp": "2022-05-02T09:49:41.415869Z"})
+
+    assert expiration_metadata.get_expiration_timestamp() == 0
+
+
+def test_from_metadata_batch():
+    metadata_list = [{"expiration_timestamp": "2022-08-08T09:49:41Z", "last_renewed_timestamp": "2022-05-02T09:49:41Z"}, None, {"expires": "2022-08-08T09:49:41Z"}]
+
+    expiration_metadata = ExpirationMetadata.from_metadata_batch(metadata_list)
+
+    assert [metadata.get_expiration_timestamp() for metadata in expiration_metadata] == [1659952181, 0, 0]
+    assert [metadata.get_last_renewal_timestamp() for metadata in expiration_metadata] == [1651484981, 0, 0]
@@ -0,0 +1,176 @@
+"""
+Background discovery of monitors, keeping the registry in line with what exists in Vault.
+"""
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future, FIRST_COMPLETED, wait
+from threading import Event, Thread
+from time import perf_counter
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+from vault_monitor.common.exporter_metrics import DISCOVERED_MONITORS_GAUGE, DISCOVERY_DURATION_GAUGE, DISCOVERY_FAILURES_COUNTER
+from vault_monitor.common.monitor_registry import MonitorRegistry
+
+LOGGER = logging.getLogger("discovery")
+
+DiscoverFunction = Callable[[Dict[Hashable, Any]], Iterable[Any]]
+
+# Seconds between publishing the monitors found so far by a partial discovery
+PARTIAL_RESULTS_INTERVAL = 1.0
+DEFAULT_RETRY_INTERVAL = 30
+
+
+# Discovery keeps its callbacks and schedule next to the ready/stop events the exporter waits on
+class PeriodicDiscovery(Thread):  # pylint: disable=too-many-instance-attributes
+    """
+    Daemon thread which runs the initial discovery, then periodically re-runs discovery and incrementally updates the registry with the result.
+
+    The discover function receives the currently registered monitors (by key) so that it can reuse them rather than creating new instances.
+    The initial discovery registers monitors as they are found, and is retried every retry_interval seconds until it succeeds, at which point ready is set.
+    If provided, setup is called before the initial discovery (e.g. to authenticate), and retried along with it until it succeeds.
+    If provided, on_added is called with the monitors registered by the initial discovery, e.g. to update them without waiting for the next refresh.
+    vault_target is the name of the Vault target the monitors are discovered in (if there are several), as set on the discovery metrics.
+    """
+
+    def __init__(
+        self,
+        discover: DiscoverFunction,
+        registry: MonitorRegistry,
+        interval: float,
+        retry_interval: float = DEFAULT_RETRY_INTERVAL,
+        on_added: Optional[Callable[[List[Any]], Any]] = None,
+        vault_target: str = "",
+        setup: Optional[Callable[[], Any]] = None,
+    ) -> None:
+        super().__init__(name="periodic_discovery", daemon=True)
+        self.discover = discover
+        self.registry = registry
+        self.interval = interval
+        self.retry_interval = retry_interval
+        self.on_added = on_added
+        self.vault_target = vault_target
+        self.setup = setup
+        # Set once the initial discovery has succeeded, see vault_exporter_ready
+        self.ready = Event()
+        self._stop_event = Event()
+
+    def run(self) -> None:
+        if not self.run_initial_discovery():
+            return
+        # Without an interval, discovery only runs once
+        while self.interval and not self._stop_event.wait(self.interval):
+            self.run_discovery()
+
+    def run_initial_discovery(self) -> bool:
+        """
+        Runs discovery, publishing partial results, until it succeeds and sets ready. Returns False if stopped first.
+        """
+        while not (self.run_setup() and self.run_discovery(partial=True)):
+            LOGGER.warning("Initial discovery%s failed, retrying in %s seconds", f" of {self.vault_target}" if self.vault_target else "", self.retry_interval)
+            if self._stop_event.wait(self.retry_interval):
+                return False
+        self.ready.set()
+        return True
+
+    def run_setup(self) -> bool:
+        """
+        Calls setup, unless it has succeeded already. Returns whether setup has succeeded.
+        """
+        if self.setup is None:
+            return True
+        try:
+            self.setup()
+        except Exception:  # pylint: disable=broad-except
+            DISCOVERY_FAILURES_COUNTER.labels(vault_target=self.vault_target).inc()
+            LOGGER.exception("Setting up discovery%s failed", f" of {self.vault_target}" if self.vault_target else "")
+            return False
+        self.setup = None
+        return True
+
+    def discover_monitors(self, partial: bool = False) -> List[Any]:
+        """
+        Runs discovery once and returns the monitors found, recording how long it took and how many monitors there are.
+
+        With partial set, the monitors found so far are added to the registry about every PARTIAL_RESULTS_INTERVAL seconds while discovery is running.
+        """
+        start = perf_counter()
+        monitors = list(self.discover(self.registry.get_monitors_by_key())) if not partial else self._discover_partial(start)
+        DISCOVERY_DURATION_GAUGE.labels(vault_target=self.vault_target).set(perf_counter() - start)
+        DISCOVERED_MONITORS_GAUGE.labels(vault_target=self.vault_target).set(len(monitors))
+        return monitors
+
+    def _discover_partial(self, start: float) -> List[Any]:
+        """
+        Runs discovery once, adding the monitors found to the registry in batches as they arrive.
+        """
+        monitors: List[Any] = []
+        published = 0
+        # Publish the first monitor straight away, so there is something to scrape as soon as possible
+        next_publish = start
+        for monitor in self.discover(self.registry.get_monitors_by_key()):
+            monitors.append(monitor)
+            if perf_counter() >= next_publish:
+                self._publish(monitors[published:])
+                published = len(monitors)
+                next_publish = perf_counter() + PARTIAL_RESULTS_INTERVAL
+        self._publish(monitors[published:])
+        return monitors
+
+    def _publish(self, monitors: List[Any]) -> None:
+        """
+        Adds the monitors to the registry, passing the ones which weren't registered yet to on_added.
+        """
+        added = self.registry.add(monitors)
+        if added and self.on_added is not None:
+            self.on_added(added)
+
+    def run_discovery(self, partial: bool = False) -> bool:
+        """
+        Runs discovery once and syncs the registry, keeping the current monitors if discovery fails. Returns whether discovery succeeded.
+        """
+        try:
+            monitors = self.discover_monitors(partial=partial)
+        except Exception:  # pylint: disable=broad-except
+            DISCOVERY_FAILURES_COUNTER.labels(vault_target=self.vault_target).inc()
+            LOGGER.exception("Discovery failed, keeping the current set of %d monitors", len(self.registry))
+            return False
+        _, removed = self.registry.sync(monitors)
+        # Stop exposing series for monitors which dropped out of discovery
+        for monitor in removed:
+            monitor.remove_metrics()
+        return True
+
+    def stop(self) -> None:
+        """
+        Signals the thread to stop after the current discovery run.
+        """
+        self._stop_event.set()
+
+
+def walk_breadth_first(root: str, list_keys: Callable[[str], List[str]], max_concurrency: int = 1, recursive: bool = True, thread_name_prefix: str = "walk") -> Iterator[Tuple[str, str]]:
+    """
+    Walks a tree listed with list_keys (e.g. secret paths or namespaces in Vault), yielding every path and key as soon as the path has been listed.
+
+    Keys ending in a forward slash are "directories", which are listed in turn if recursive is set.
+    The tree is walked breadth first without recursion, with up to max_concurrency calls to list_keys in flight at once.
+    "Directories" which are yet to be listed are queued as paths, so memory is bounded by the width of the tree rather than by its size.
+    """
+    frontier = deque([root])
+    with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix=thread_name_prefix) as executor:
+        pending: Dict[Future, str] = {}
+        try:
+            while frontier or pending:
+                while frontier and len(pending) < max_concurrency:
+                    path = frontier.popleft()
+                    pending[executor.submit(list_keys, path)] = path
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path = pending.pop(future)
+                    for key in future.result():
+                        if recursive and key[-1] == "/":
+                            frontier.append(f"{path}/{key[:-1]}" if path else key[:-1])
+                        yield path, key
+        finally:
+            # Don't leave the rest of the walk queued up behind a failure, or when the caller stops early
+            for future in pending:
+                future.cancel()
@@ -0,0 +1,68 @@
+"""
+Metrics describing the operation of the exporter itself, rather than the monitored Vault objects.
+"""
+from collections import Counter as TallyCounter
+from typing import Any, Callable, Iterable, Iterator, Mapping
+
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+# Metrics about a Vault target have a vault_target label, which is empty (i.e. the label is absent in Prometheus) unless several Vault targets are configured
+CONNECTIONS_OPENED_GAUGE = Gauge("vault_exporter_connections_opened", "Number of new connections opened to Vault during the last refresh cycle.", ["vault_target"])
+CONNECTIONS_REUSED_GAUGE = Gauge("vault_exporter_connections_reused", "Number of requests sent to Vault during the last refresh cycle over an already open connection.", ["vault_target"])
+
+CYCLE_LAG_GAUGE = Gauge("vault_exporter_cycle_lag_seconds", "Delay between the scheduled and actual start of the last refresh cycle.")
+CYCLE_OVERRUNS_COUNTER = Counter("vault_exporter_cycle_overruns", "Number of refresh cycles which took longer than the refresh interval.")
+CYCLES_SKIPPED_COUNTER = Counter("vault_exporter_cycles_skipped", "Number of refresh cycles skipped due to a previous cycle overrunning.")
+
+RATE_LIMITED_COUNTER = Counter("vault_exporter_rate_limited_responses", "Number of requests rejected by the rate limit quotas of Vault (429 responses).", ["vault_target"])
+REQUEST_RETRIES_COUNTER = Counter("vault_exporter_request_retries", "Number of requests to Vault retried after a timeout, connection error or 5xx response.", ["vault_target"])
+CIRCUIT_BREAKER_OPEN_GAUGE = Gauge("vault_exporter_circuit_breaker_open", "Whether requests to a mount point are stopped because its backend keeps failing.", ["vault_target", "mount_point"])
+
+CYCLE_DURATION_HISTOGRAM = Histogram(
+    "vault_exporter_cycle_duration_seconds", "Time taken to refresh the monitors in a cycle.", buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, float("inf"))
+)
+REQUEST_DURATION_HISTOGRAM = Histogram("vault_exporter_request_duration_seconds", "Time taken by requests to Vault, by operation and mount point.", ["vault_target", "operation", "mount_point"])
+REQUEST_ERRORS_COUNTER = Counter("vault_exporter_request_errors", "Number of requests to Vault which failed, by status code (or connection_error and timeout).", ["vault_target", "status_code"])
+MONITOR_UPDATE_FAILURES_COUNTER = Counter("vault_exporter_monitor_update_failures", "Number of monitor updates which failed, by monitor type.", ["monitor_type"])
+TOKEN_RENEWAL_FAILURES_COUNTER = Counter("vault_exporter_token_renewal_failures", "Number of times renewing the Vault token failed.", ["vault_target"])
+
+EXPORTER_READY_GAUGE = Gauge("vault_exporter_ready", "Whether the initial discovery of the monitors has completed, until then only part of the monitors may be exported.")
+
+DISCOVERY_DURATION_GAUGE = Gauge("vault_exporter_discovery_duration_seconds", "Time taken by the last discovery of the monitors.", ["vault_target"])
+DISCOVERED_MONITORS_GAUGE = Gauge("vault_exporter_discovered_monitors", "Number of monitors found by the last discovery.", ["vault_target"])
+DISCOVERY_FAILURES_COUNTER = Counter("vault_exporter_discovery_failures", "Number of discoveries of the monitors which failed.", ["vault_target"])
+SERIES_LIMIT_EXCEEDED_GAUGE = Gauge("vault_exporter_series_limit_exceeded", "Whether the series limit of a service (or the global limit, with scope global) is exceeded.", ["vault_target", "scope"])
+SUPPRESSED_MONITORS_GAUGE = Gauge("vault_exporter_suppressed_monitors", "Number of monitors whose series are held back by the series limits, by service.", ["vault_target", "service"])
+
+
+class ActiveMonitorsCollector(Collector):
+    """
+    Reports the number of active monitors per Vault target and service, counted from the live set of monitors whenever the metrics are collected.
+
+    get_monitors returns the monitors of every target by the name of the target (empty with a single target).
+    """
+
+    def __init__(self, get_monitors: Callable[[], Mapping[str, Iterable[Any]]]) -> None:
+        self.get_monitors = get_monitors
+
+    def describe(self) -> Iterator[GaugeMetricFamily]:
+        """
+        Yields the metric without its samples, so that registering the collector doesn't need the monitors.
+        """
+        yield self._get_gauge()
+
+    def collect(self) -> Iterator[GaugeMetricFamily]:
+        """
+        Yields the number of active monitors, counting the monitors of every target by service.
+        """
+        gauge = self._get_gauge()
+        counts = TallyCounter((vault_target, getattr(monitor, "service", "")) for vault_target, monitors in self.get_monitors().items() for monitor in monitors)
+        for (vault_target, service), count in sorted(counts.items()):
+            gauge.add_metric([vault_target, service], count)
+        yield gauge
+
+    @staticmethod
+    def _get_gauge() -> GaugeMetricFamily:
+        return GaugeMetricFamily("vault_exporter_active_monitors", "Number of monitors currently active, by service.", labels=["vault_target", "service"])
@@ -0,0 +1,93 @@
+"""
+Thread-safe registry of the monitors currently active in the exporter.
+"""
+import logging
+from threading import Lock
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+LOGGER = logging.getLogger("monitor_registry")
+
+
+class MonitorRegistry:
+    """
+    Holds the live set of monitors keyed by their identity, allowing them to be replaced in the background while the refresh loop is running.
+
+    Monitors with an event_key (e.g. the namespace, mount point and path of a secret) are also indexed by it, so events can be matched without scanning every monitor.
+    """
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._monitors: Dict[Hashable, Any] = {}
+        self._monitors_by_event_key: Dict[Hashable, Dict[Hashable, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._monitors)
+
+    def get_monitors(self) -> List[Any]:
+        """
+        Returns a snapshot of the currently registered monitors.
+        """
+        with self._lock:
+            return list(self._monitors.values())
+
+    def get_monitors_by_key(self) -> Dict[Hashable, Any]:
+        """
+        Returns a snapshot of the currently registered monitors, keyed by their identity.
+        """
+        with self._lock:
+            return dict(self._monitors)
+
+    def get_monitors_by_event_key(self, event_key: Hashable) -> List[Any]:
+        """
+        Returns the registered monitors with the provided event_key.
+        """
+        with self._lock:
+            return list(self._monitors_by_event_key.get(event_key, {}).values())
+
+    def _register(self, monitor: Any) -> None:
+        self._monitors[monitor.key] = monitor
+        event_key: Optional[Hashable] = getattr(monitor, "event_key", None)
+        if event_key is not None:
+            self._monitors_by_event_key.setdefault(event_key, {})[monitor.key] = monitor
+
+    def _unregister(self, monitor: Any) -> None:
+        del self._monitors[monitor.key]
+        event_key: Optional[Hashable] = getattr(monitor, "event_key", None)
+        if event_key is not None:
+            indexed_monitors = self._monitors_by_event_key[event_key]
+            del indexed_monitors[monitor.key]
+            if not indexed_monitors:
+                del self._monitors_by_event_key[event_key]
+
+    def add(self, monitors: Iterable[Any]) -> List[Any]:
+        """
+        Registers the provided monitors without removing any, returning the monitors which were added (e.g. the partial results of a discovery which is still running).
+
+        Monitors with a key which is already registered keep the registered instance.
+        """
+        added = []
+        with self._lock:
+            for monitor in monitors:
+                if monitor.key not in self._monitors:
+                    self._register(monitor)
+                    added.append(monitor)
+        return added
+
+    def sync(self, monitors: Iterable[Any]) -> Tuple[List[Any], List[Any]]:
+        """
+        Replaces the registered monitors with the provided ones, returning the monitors which were added and those which were removed.
+
+        Monitors with a key which is already registered keep the registered instance, so only new monitors are added.
+        """
+        monitors_by_key = {monitor.key: monitor for monitor in monitors}
+        with self._lock:
+            added = [monitor for key, monitor in monitors_by_key.items() if key not in self._monitors]
+            removed = [monitor for key, monitor in self._monitors.items() if key not in monitors_by_key]
+            for monitor in removed:
+                self._unregister(monitor)
+            for monitor in added:
+                self._register(monitor)
+
+        if added or removed:
+            LOGGER.info("Monitor set changed: %d added, %d removed, %d total", len(added), len(removed), len(self._monitors))
+        return added, removed
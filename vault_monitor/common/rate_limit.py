@@ -0,0 +1,152 @@
+"""
+Client side rate limiting of requests to HashiCorp Vault, to stay under Vault's rate limit quotas.
+"""
+import logging
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from threading import Lock
+from time import monotonic, sleep
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+LOGGER = logging.getLogger("rate_limit")
+
+DEFAULT_RETRY_AFTER = 1.0
+MAX_RETRY_AFTER = 60.0
+
+
+# Besides its settings, a bucket keeps the state shared by the threads acquiring from it
+class TokenBucket:  # pylint: disable=too-many-instance-attributes
+    """
+    Thread-safe token bucket, allowing rate requests per second on average with bursts of up to burst requests.
+
+    Without a rate, the bucket never limits requests but can still be paused (e.g. after Vault asked to retry later).
+    """
+
+    def __init__(self, rate: Optional[float] = None, burst: Optional[float] = None, clock: Callable[[], float] = monotonic, sleep_function: Callable[[float], None] = sleep) -> None:
+        if rate is not None and rate <= 0:
+            raise ValueError("rate must be above 0.")
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate or 1.0, 1.0)
+        self.time_function = clock
+        self.sleep_function = sleep_function
+        self._tokens = self.burst
+        self._last_refill = self.time_function()
+        self._paused_until = 0.0
+        self._lock = Lock()
+
+    def acquire(self) -> float:
+        """
+        Blocks until a request may be sent, returning the time waited.
+        """
+        rate = self.rate
+        with self._lock:
+            now = self.time_function()
+            delay = max(self._paused_until - now, 0.0)
+            if rate is not None:
+                # Reserve the token right away, so that waiting threads are served in order rather than racing each other
+                tokens = min(self.burst, self._tokens + (now - self._last_refill) * rate) - 1
+                self._tokens = tokens
+                self._last_refill = now
+                if tokens < 0:
+                    delay = max(delay, -tokens / rate)
+        if delay > 0:
+            self.sleep_function(delay)
+        return delay
+
+    def pause(self, delay: float) -> None:
+        """
+        Stops requests from being sent for the next delay seconds.
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, self.time_function() + delay)
+
+
+class RateLimiter:
+    """
+    Limits the requests sent to Vault with a global token bucket and optional token buckets per mount point.
+
+    Mount point limits apply to the mount point in every namespace, each namespace getting its own bucket, unless they are prefixed with a namespace (e.g. team-a/secret).
+    Responses with a 429 status pause the bucket for the mount point (or the global bucket) for as long as Retry-After asks.
+    """
+
+    def __init__(
+        self,
+        rate: Optional[float] = None,
+        burst: Optional[float] = None,
+        mount_limits: Optional[Dict[str, Dict[str, float]]] = None,
+        max_retries: int = 3,
+        clock: Callable[[], float] = monotonic,
+        sleep_function: Callable[[float], None] = sleep,
+    ) -> None:
+        self.max_retries = max_retries
+        self.time_function = clock
+        self.sleep_function = sleep_function
+        self._global_bucket = TokenBucket(rate, burst, clock, sleep_function)
+        # The longest matching mount point wins, so that nested mounts (e.g. team/secret under team) are handled
+        self._mount_limits = sorted(((mount_point.strip("/"), limit) for mount_point, limit in (mount_limits or {}).items()), key=lambda item: len(item[0]), reverse=True)
+        self._mount_buckets: Dict[str, TokenBucket] = {}
+        self._mount_buckets_lock = Lock()
+
+    def _get_buckets(self, url: str, namespace: Optional[str] = None) -> List[TokenBucket]:
+        path = get_api_path(url)
+        qualified_path = get_namespace_path(path, namespace)
+        for mount_point, limit in self._mount_limits:
+            for candidate in [qualified_path, path]:
+                if candidate == mount_point or candidate.startswith(f"{mount_point}/"):
+                    # A limit without a namespace prefix gets a bucket per namespace, like Vault's quotas on the mount point in each namespace
+                    qualified_mount_point = mount_point if candidate is qualified_path else get_namespace_path(mount_point, namespace)
+                    with self._mount_buckets_lock:
+                        if qualified_mount_point not in self._mount_buckets:
+                            self._mount_buckets[qualified_mount_point] = TokenBucket(limit.get("requests_per_second"), limit.get("burst"), self.time_function, self.sleep_function)
+                        return [self._global_bucket, self._mount_buckets[qualified_mount_point]]
+        return [self._global_bucket]
+
+    def acquire(self, url: str, namespace: Optional[str] = None) -> None:
+        """
+        Blocks until a request to url (in namespace, by default the root namespace) may be sent.
+        """
+        waited = sum(bucket.acquire() for bucket in self._get_buckets(url, namespace))
+        if waited > 0:
+            LOGGER.debug("Throttled request to %s for %.3f seconds", url, waited)
+
+    def pause(self, url: str, delay: float, namespace: Optional[str] = None) -> None:
+        """
+        Stops requests to the mount point of url (or to Vault if url isn't part of a rate limited mount point) for the next delay seconds.
+        """
+        self._get_buckets(url, namespace)[-1].pause(delay)
+
+
+def get_api_path(url: str) -> str:
+    """
+    Returns the path of a Vault API url, without the leading /v1/ (e.g. secret/metadata/some/secret).
+    """
+    path = urlsplit(url).path
+    return path[len("/v1/") :] if path.startswith("/v1/") else path.lstrip("/")
+
+
+def get_namespace_path(path: str, namespace: Optional[str] = None) -> str:
+    """
+    Returns an API path prefixed with the namespace it is requested in (e.g. from the X-Vault-Namespace header), as the mount points of each namespace are distinct.
+    """
+    namespace = (namespace or "").strip("/")
+    return f"{namespace}/{path}" if namespace else path
+
+
+def get_retry_after(header: Optional[str], now: Optional[datetime] = None) -> float:
+    """
+    Returns the number of seconds to wait based on a Retry-After header, given either as seconds or as an HTTP date.
+    """
+    if not header:
+        return DEFAULT_RETRY_AFTER
+    try:
+        delay = float(header)
+    except ValueError:
+        try:
+            retry_at = parsedate_to_datetime(header)
+        except (TypeError, ValueError):
+            return DEFAULT_RETRY_AFTER
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        delay = (retry_at - (now or datetime.now(timezone.utc))).total_seconds()
+    return min(max(delay, 0.0), MAX_RETRY_AFTER)
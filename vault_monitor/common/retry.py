@@ -0,0 +1,102 @@
+"""
+Retrying of transient failures and circuit breaking for requests to HashiCorp Vault.
+"""
+import logging
+import random
+from threading import Lock
+from time import monotonic, sleep
+from typing import Callable, Optional
+
+from requests.exceptions import RequestException
+
+LOGGER = logging.getLogger("retry")
+
+# Statuses returned by Vault (or a load balancer in front of it) which are worth retrying
+RETRY_STATUSES = [500, 502, 503, 504]
+
+
+# An exception only needs to be raised and caught, it has no methods of its own
+class CircuitOpenError(RequestException):  # pylint: disable=too-few-public-methods
+    """
+    Raised instead of sending a request while the circuit breaker for its mount point is open.
+    """
+
+
+class RetryPolicy:  # pylint: disable=too-few-public-methods
+    """
+    Exponential backoff with full jitter: retry n waits a random time between 0 and min(backoff_max, backoff_factor * 2^n) seconds.
+    """
+
+    def __init__(self, max_retries: int = 3, backoff_factor: float = 0.5, backoff_max: float = 30, sleep_function: Callable[[float], None] = sleep) -> None:
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.sleep_function = sleep_function
+
+    def get_backoff(self, retry: int) -> float:
+        """
+        Returns the time to wait before the given retry (starting at 0).
+        """
+        # Not used for security, only to spread out retries
+        return random.uniform(0, min(self.backoff_max, self.backoff_factor * 2**retry))  # nosec B311
+
+    def backoff(self, retry: int) -> None:
+        """
+        Waits before the given retry (starting at 0).
+        """
+        self.sleep_function(self.get_backoff(retry))
+
+
+class CircuitBreaker:
+    """
+    Stops requests to a failing backend after failure_threshold consecutive failures.
+
+    Once reset_timeout seconds have passed, a single trial request is let through: the circuit closes again if it succeeds, or stays open for another reset_timeout if it fails.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60, clock: Callable[[], float] = monotonic) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.time_function = clock
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = Lock()
+
+    @property
+    def is_open(self) -> bool:
+        """
+        Whether requests are currently being stopped (a trial request may still be let through).
+        """
+        return self._opened_at is not None
+
+    def allow_request(self) -> bool:
+        """
+        Returns whether a request may be sent.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if not self._trial_in_flight and self.time_function() - self._opened_at >= self.reset_timeout:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        """
+        Records a request which reached the backend, closing the circuit.
+        """
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        """
+        Records a failed request, opening the circuit if there were too many in a row or the trial request failed.
+        """
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = self.time_function()
+                self._trial_in_flight = False
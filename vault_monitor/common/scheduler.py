@@ -0,0 +1,84 @@
+"""
+Fixed-rate scheduling of the refresh cycle.
+"""
+import logging
+import math
+import random
+from time import monotonic, sleep
+from typing import Callable, Optional, Tuple
+
+from vault_monitor.common.exporter_metrics import CYCLE_LAG_GAUGE, CYCLE_OVERRUNS_COUNTER, CYCLES_SKIPPED_COUNTER
+
+LOGGER = logging.getLogger("scheduler")
+
+OVERRUN_POLICIES = ["immediate", "skip"]
+
+
+class FixedRateScheduler:
+    """
+    Runs a task at a fixed rate on the monotonic clock, so the period does not drift with the duration of the task.
+
+    Cycles never overlap. When a cycle overruns its period, the overrun policy decides what happens next:
+    * immediate - the next cycle starts as soon as the overrunning one finishes, and the schedule continues from there
+    * skip - the missed start times are skipped, and the next cycle starts at the next start time on the original schedule
+    """
+
+    def __init__(
+        self,
+        interval: float,
+        jitter: float = 0.0,
+        overrun_policy: str = "immediate",
+        clock: Callable[[], float] = monotonic,
+        sleep_function: Callable[[float], None] = sleep,
+    ) -> None:
+        if interval <= 0:
+            raise ValueError("interval must be greater than 0.")
+        if overrun_policy not in OVERRUN_POLICIES:
+            raise ValueError(f"overrun_policy must be one of {OVERRUN_POLICIES}.")
+        self.interval = interval
+        self.jitter = jitter
+        self.overrun_policy = overrun_policy
+        self.time_function = clock
+        self.sleep_function = sleep_function
+
+    def run(self, task: Callable[[], None], cycles: Optional[int] = None) -> None:
+        """
+        Runs the task on schedule, forever or for the given number of cycles.
+        """
+        due = scheduled_start = self.time_function()
+        completed = 0
+        while cycles is None or completed < cycles:
+            delay = scheduled_start + self._get_jitter() - self.time_function()
+            if delay > 0:
+                self.sleep_function(delay)
+
+            # Lag is measured against when the cycle was due on the fixed-rate schedule, so an immediate start after an overrun still reports how late it is
+            CYCLE_LAG_GAUGE.set(max(self.time_function() - due, 0.0))
+            task()
+            completed += 1
+
+            due, scheduled_start = self.get_next_start(scheduled_start + self.interval, self.time_function())
+
+    def get_next_start(self, next_start: float, now: float) -> Tuple[float, float]:
+        """
+        Returns when the next cycle is due and when it should start, handling overruns according to the policy.
+        """
+        if now <= next_start:
+            return next_start, next_start
+
+        CYCLE_OVERRUNS_COUNTER.inc()
+        if self.overrun_policy == "skip":
+            missed_cycles = math.ceil((now - next_start) / self.interval)
+            LOGGER.warning("Refresh cycle overran by %.2f seconds, skipping %d cycle(s).", now - next_start, missed_cycles)
+            CYCLES_SKIPPED_COUNTER.inc(missed_cycles)
+            next_start += missed_cycles * self.interval
+            return next_start, next_start
+
+        LOGGER.warning("Refresh cycle overran by %.2f seconds, starting the next cycle immediately.", now - next_start)
+        return next_start, now
+
+    def _get_jitter(self) -> float:
+        if self.jitter <= 0:
+            return 0.0
+        # Jitter only spreads the load of several replicas, it doesn't need to be cryptographically secure
+        return random.uniform(0, self.jitter)  # nosec B311
@@ -0,0 +1,59 @@
+"""
+Collect-on-scrape support, refreshing metrics from Vault only when they are requested.
+"""
+import logging
+from threading import Lock
+from time import monotonic
+from typing import Callable, Iterable, Optional
+
+from prometheus_client import REGISTRY
+from prometheus_client.metrics_core import Metric
+from prometheus_client.registry import CollectorRegistry, RestrictedRegistry
+
+LOGGER = logging.getLogger("scrape_collector")
+
+
+class RefreshOnScrapeCollector(CollectorRegistry):
+    """
+    Collector which runs the refresh function when scraped and the previous refresh is older than the TTL, then exposes the wrapped registry.
+
+    Scrapes arriving while a refresh is in-flight wait for it and share its result, rather than starting a refresh of their own.
+    It is a registry itself, so that it can be served directly by start_http_server.
+    """
+
+    def __init__(self, refresh: Callable[[], None], ttl: float, registry: CollectorRegistry = REGISTRY) -> None:
+        super().__init__()
+        self.refresh = refresh
+        self.ttl = ttl
+        self.registry = registry
+        self._refresh_lock = Lock()
+        self._last_refresh: Optional[float] = None
+
+    def collect(self) -> Iterable[Metric]:
+        """
+        Returns the metrics of the wrapped registry, refreshing them first if they are stale.
+        """
+        self.refresh_if_stale()
+        return self.registry.collect()
+
+    def restricted_registry(self, names: Iterable[str]) -> RestrictedRegistry:
+        """
+        Returns the wrapped registry restricted to the provided metric names (for scrapes which only request specific metrics), refreshing it first if it is stale.
+        """
+        self.refresh_if_stale()
+        return self.registry.restricted_registry(names)
+
+    def refresh_if_stale(self) -> None:
+        """
+        Refreshes the metrics if the cached values are older than the TTL, at most one refresh runs at a time.
+        """
+        with self._refresh_lock:
+            if self._last_refresh is not None and monotonic() - self._last_refresh < self.ttl:
+                return
+            try:
+                self.refresh()
+            except Exception:  # pylint: disable=broad-except
+                # Serve the previous values rather than failing the scrape
+                LOGGER.exception("Failed to refresh metrics on scrape")
+            # Even on failure, wait for the TTL before trying again so scrapes don't hammer Vault
+            self._last_refresh = monotonic()
@@ -0,0 +1,31 @@
+"""
+Sharding of monitors across several exporter replicas.
+"""
+import hashlib
+
+
+# A class rather than a function of the shard settings, so that discovery can be passed a single selector and stays unaware of sharding
+class ShardSelector:  # pylint: disable=too-few-public-methods
+    """
+    Decides whether this replica owns an object, based on a stable hash of the parts identifying it.
+
+    Every replica configured with the same shard_count and a different shard_index owns a disjoint slice of the objects.
+    """
+
+    def __init__(self, shard_index: int = 0, shard_count: int = 1) -> None:
+        if shard_count < 1:
+            raise ValueError("shard_count must be at least 1.")
+        if not 0 <= shard_index < shard_count:
+            raise ValueError(f"shard_index must be between 0 and {shard_count - 1}.")
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+
+    def owns(self, *parts: str) -> bool:
+        """
+        Returns True if the object identified by the parts belongs to this shard.
+        """
+        if self.shard_count == 1:
+            return True
+        # A cryptographic hash is used for its stable and even distribution across processes and Python versions (unlike hash())
+        digest = hashlib.sha256("\0".join(parts).encode("utf-8")).digest()
+        return int.from_bytes(digest[:8], "big") % self.shard_count == self.shard_index
@@ -0,0 +1,48 @@
+"""
+Periodic renewal of the tokens of the Vault targets, independent of how often the monitors are refreshed.
+"""
+import logging
+from threading import Event, Thread
+from typing import Any, Iterable
+
+from vault_monitor.common.exporter_metrics import TOKEN_RENEWAL_FAILURES_COUNTER
+
+LOGGER = logging.getLogger("token_renewal")
+
+
+def renew_tokens(targets: Iterable[Any], increment: int) -> None:
+    """
+    Renews the token of every target by increment seconds, logging and counting rather than raising on failure.
+    """
+    for target in targets:
+        try:
+            target.renew_token(increment)
+        except Exception:  # pylint: disable=broad-except
+            # The token may still be valid, so try again next time rather than stopping the exporter
+            TOKEN_RENEWAL_FAILURES_COUNTER.labels(vault_target=target.name or "").inc()
+            LOGGER.exception("Failed to refresh token for %s", target)
+
+
+class TokenRenewer(Thread):
+    """
+    Daemon thread which renews the tokens of the targets right away and then every interval seconds.
+
+    Used when the refresh cycle runs less often than the tokens need renewing, e.g. with vault_events only sweeping every hour.
+    """
+
+    def __init__(self, targets: Iterable[Any], interval: float) -> None:
+        super().__init__(name="token_renewer", daemon=True)
+        self.targets = targets
+        self.interval = interval
+        self._stop_event = Event()
+
+    def run(self) -> None:
+        renew_tokens(self.targets, int(self.interval * 1.5))
+        while not self._stop_event.wait(self.interval):
+            renew_tokens(self.targets, int(self.interval * 1.5))
+
+    def stop(self) -> None:
+        """
+        Signals the thread to stop after the current renewal.
+        """
+        self._stop_event.set()
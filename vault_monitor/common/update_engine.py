@@ -0,0 +1,81 @@
+"""
+Engine for refreshing the metrics of a collection of monitors, either serially or concurrently.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor, Future
+from threading import Lock
+from typing import Any, Iterable, List, Optional
+
+from vault_monitor.common.exporter_metrics import MONITOR_UPDATE_FAILURES_COUNTER
+
+LOGGER = logging.getLogger("update_engine")
+
+
+class UpdateEngine:
+    """
+    Runs update_metrics for every monitor in a cycle, using a bounded thread pool when max_concurrency is above one.
+
+    A failure in one monitor is logged and counted, but does not abort the rest of the cycle.
+    Updates can also be submitted without waiting for them, e.g. while discovering monitors, in which case they run on the same thread pool (or a single background thread).
+    """
+
+    def __init__(self, max_concurrency: int = 1) -> None:
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1.")
+        self.max_concurrency = max_concurrency
+        self._executor: Optional[ThreadPoolExecutor] = None
+        if max_concurrency > 1:
+            self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="update_engine")
+        self._background_executor: Optional[ThreadPoolExecutor] = None
+        self._background_executor_lock = Lock()
+
+    def run_cycle(self, monitors: Iterable[Any]) -> int:
+        """
+        Updates the metrics for all provided monitors, returning the number of monitors which failed to update.
+        """
+        if self._executor is None:
+            return sum(1 for monitor in monitors if not self._update_monitor(monitor))
+
+        futures: List[Future] = [self._executor.submit(self._update_monitor, monitor) for monitor in monitors]
+        return sum(1 for future in futures if not future.result())
+
+    def submit(self, monitors: Iterable[Any]) -> None:
+        """
+        Queues updates of the metrics for all provided monitors and returns without waiting for them, failures are logged and counted as with run_cycle.
+        """
+        executor = self._executor or self._get_background_executor()
+        for monitor in monitors:
+            executor.submit(self._update_monitor, monitor)
+
+    def _get_background_executor(self) -> ThreadPoolExecutor:
+        """
+        Returns the single worker thread for submitted updates without a thread pool, creating it on first use.
+        """
+        with self._background_executor_lock:
+            if self._background_executor is None:
+                self._background_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="update_engine")
+            return self._background_executor
+
+    @staticmethod
+    def _update_monitor(monitor: Any) -> bool:
+        """
+        Updates a single monitor, returning False rather than raising if the update failed.
+        """
+        try:
+            monitor.update_metrics()
+        except Exception:  # pylint: disable=broad-except
+            LOGGER.exception("Failed to update metrics for %s", monitor)
+            MONITOR_UPDATE_FAILURES_COUNTER.labels(monitor_type=type(monitor).__name__).inc()
+            return False
+        return True
+
+    def shutdown(self) -> None:
+        """
+        Stops the worker threads, waiting for any in-flight updates to finish.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self._background_executor is not None:
+            self._background_executor.shutdown(wait=True)
+            self._background_executor = None
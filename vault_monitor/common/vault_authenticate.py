@@ -5,7 +5,7 @@ import os
 import logging
 import warnings
 
-from typing import Dict
+from typing import Dict, Optional
 
 import hvac
 
@@ -34,7 +34,7 @@ def get_vault_client_for_user(url: str = None, namespace: str = None, vault_toke
     return hvac.Client(url=url, token=vault_token, namespace=namespace)
 
 
-def get_authenticated_client(auth_config: Dict[str, Dict[str, str]], address: str, namespace: str) -> hvac.Client:
+def get_authenticated_client(auth_config: Dict[str, Dict[str, str]], address: Optional[str], namespace: Optional[str]) -> hvac.Client:
     """
     Returns an authenticated Vault client as configured by the authentication section of the configuration file.
     """
@@ -60,7 +60,7 @@ def get_authenticated_client(auth_config: Dict[str, Dict[str, str]], address: st
     return get_client_with_token_auth(token_auth_config, address, namespace)
 
 
-def get_namespace(namespace: str = None) -> str:
+def get_namespace(namespace: Optional[str] = None) -> str:
     """
     In the event that namespace is None, return the value for VAULT_NAMESPACE if that is set
     """
@@ -70,7 +70,7 @@ def get_namespace(namespace: str = None) -> str:
     return namespace
 
 
-def get_address(address: str = None) -> str:
+def get_address(address: Optional[str] = None) -> str:
     """
     If the Vault address isn't set, check the contents of the VAULT_ADDR environmental variable and return it.
     """
@@ -0,0 +1,45 @@
+"""
+Enumeration of Vault Enterprise namespaces, and requests to a namespace other than the one of the client.
+"""
+import logging
+from typing import Dict, Iterator, List, Optional
+
+import hvac
+
+from vault_monitor.common.discovery import walk_breadth_first
+from vault_monitor.common.vault_session import get_request_timeout
+
+LOGGER = logging.getLogger("vault_namespaces")
+
+
+def get_request_headers(vault_client: hvac.Client, namespace: Optional[str] = None) -> Dict[str, str]:
+    """
+    Returns the headers for a request made with the session of the client, to namespace or (if None) the namespace of the client.
+
+    Setting the namespace per request lets the requests to every namespace share the client's token and connection pool.
+    """
+    return {"X-Vault-Namespace": namespace if namespace is not None else vault_client.adapter.namespace, "X-Vault-Token": vault_client.token}
+
+
+def list_namespaces(vault_client: hvac.Client, namespace: str) -> List[str]:
+    """
+    Returns the names of the child namespaces directly under a namespace, ending in a forward slash.
+    """
+    response = vault_client.session.request("LIST", f"{vault_client.url}/v1/sys/namespaces", headers=get_request_headers(vault_client, namespace), timeout=get_request_timeout(vault_client))
+    # Vault responds with a 404 when there is nothing to list
+    if response.status_code == 404:
+        return []
+    response.raise_for_status()
+    return response.json()["data"]["keys"]
+
+
+def iter_namespaces(vault_client: hvac.Client, parent: str = "", max_concurrency: int = 1, recursive: bool = True) -> Iterator[str]:
+    """
+    Yields the path of the parent namespace (empty for the root namespace) followed by its child namespaces, as soon as they are listed.
+
+    With recursive set, nested namespaces are enumerated as well, with up to max_concurrency LIST calls to Vault in flight at once.
+    """
+    parent = parent.strip("/")
+    yield parent
+    for path, key in walk_breadth_first(parent, lambda path: list_namespaces(vault_client, path), max_concurrency, recursive=recursive, thread_name_prefix="namespaces"):
+        yield f"{path}/{key.strip('/')}" if path else key.strip("/")
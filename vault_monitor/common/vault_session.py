@@ -0,0 +1,289 @@
+"""
+Pooled, keep-alive HTTP session handling for connections to HashiCorp Vault.
+"""
+import logging
+from threading import Lock
+from time import perf_counter
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import hvac
+from requests import PreparedRequest, Response
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, Timeout  # pylint: disable=redefined-builtin
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from vault_monitor.common.exporter_metrics import (
+    CIRCUIT_BREAKER_OPEN_GAUGE,
+    RATE_LIMITED_COUNTER,
+    REQUEST_DURATION_HISTOGRAM,
+    REQUEST_ERRORS_COUNTER,
+    REQUEST_RETRIES_COUNTER,
+)
+from vault_monitor.common.rate_limit import RateLimiter, get_api_path, get_namespace_path, get_retry_after
+from vault_monitor.common.retry import RETRY_STATUSES, CircuitBreaker, CircuitOpenError, RetryPolicy
+
+LOGGER = logging.getLogger("vault_session")
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 60
+
+
+class _ConnectionTrackingMixin:  # pylint: disable=too-few-public-methods
+    """
+    Counts the requests sent through a connection pool, and how many of them had to open a new connection.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        # Requests are sent from many threads at once, so the counts are only updated while holding the lock
+        self._tracking_lock = Lock()
+        self.opened_connections = 0
+        self.sent_requests = 0
+
+    def _make_request(self, conn: Any, *args: Any, **kwargs: Any) -> Any:
+        with self._tracking_lock:
+            # A connection without a socket was either never used or was dropped, in both cases this request opens a new connection
+            if getattr(conn, "sock", None) is None:
+                self.opened_connections += 1
+            self.sent_requests += 1
+        return super()._make_request(conn, *args, **kwargs)  # type: ignore[misc]
+
+
+class _TrackingHTTPConnectionPool(_ConnectionTrackingMixin, HTTPConnectionPool):
+    pass
+
+
+class _TrackingHTTPSConnectionPool(_ConnectionTrackingMixin, HTTPSConnectionPool):
+    pass
+
+
+# The adapter holds the settings and state of every per request feature (rate limits, retries, circuit breakers, timeouts and connection tracking)
+class PooledHTTPAdapter(HTTPAdapter):  # pylint: disable=too-many-instance-attributes
+    """
+    HTTP adapter with a configurable connection pool, which keeps track of how many connections were opened versus reused.
+
+    If a rate limiter is provided, every request waits for it first and requests rejected by Vault's rate limit quotas (429) are retried after Retry-After.
+    If a retry policy is provided, timeouts, connection errors and 5xx responses are retried with backoff.
+    If a circuit breaker factory is provided, each mount point (per namespace) gets a circuit breaker which stops requests while its backend keeps failing.
+    If timeout is provided, it replaces the (connect, read) timeout requested by the caller.
+    vault_target is the name of the Vault target the adapter sends requests to (if there are several), as set on its metrics.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        rate_limiter: Optional[RateLimiter] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breaker_factory: Optional[Callable[[], CircuitBreaker]] = None,
+        timeout: Optional[Tuple[float, float]] = None,
+        vault_target: str = "",
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(pool_connections=pool_size, pool_maxsize=pool_size, **kwargs)
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy
+        self.circuit_breaker_factory = circuit_breaker_factory
+        self.timeout = timeout
+        self.vault_target = vault_target
+        self._circuit_breakers: Dict[str, CircuitBreaker] = {}
+        self._circuit_breakers_lock = Lock()
+        self._reported_connections = 0
+        self._reported_requests = 0
+
+    def get_circuit_breaker(self, mount_point: str) -> Optional[CircuitBreaker]:
+        """
+        Returns the circuit breaker for a mount point, creating it on first use.
+        """
+        if self.circuit_breaker_factory is None:
+            return None
+        with self._circuit_breakers_lock:
+            if mount_point not in self._circuit_breakers:
+                self._circuit_breakers[mount_point] = self.circuit_breaker_factory()
+            return self._circuit_breakers[mount_point]
+
+    def send(self, request: PreparedRequest, *args: Any, **kwargs: Any) -> Response:  # pylint: disable=arguments-differ
+        """
+        Sends a request with the configured timeout, unless the circuit breaker for its mount point is open (raising CircuitOpenError), rate limiting and retrying it as configured.
+        """
+        if self.timeout is not None:
+            kwargs["timeout"] = self.timeout
+
+        url = request.url or ""
+        # Nested mount points share the circuit breaker of their first path segment, mount points in other namespaces have their own
+        mount_point = get_request_mount_point(request)
+        circuit_breaker = self.get_circuit_breaker(mount_point)
+        if circuit_breaker is None:
+            return self._send_with_retries(request, *args, **kwargs)
+
+        if not circuit_breaker.allow_request():
+            raise CircuitOpenError(f"Circuit breaker for {mount_point} is open, not sending request to {url}", request=request)
+        try:
+            response = self._send_with_retries(request, *args, **kwargs)
+        except Exception:
+            self._record_result(mount_point, circuit_breaker, success=False)
+            raise
+        # Any response other than a server error shows the backend is working, even if the request itself was refused
+        self._record_result(mount_point, circuit_breaker, success=response.status_code not in RETRY_STATUSES)
+        return response
+
+    def _record_result(self, mount_point: str, circuit_breaker: CircuitBreaker, success: bool) -> None:
+        if success:
+            circuit_breaker.record_success()
+        else:
+            circuit_breaker.record_failure()
+        CIRCUIT_BREAKER_OPEN_GAUGE.labels(vault_target=self.vault_target, mount_point=mount_point).set(int(circuit_breaker.is_open))
+
+    def _send_with_retries(self, request: PreparedRequest, *args: Any, **kwargs: Any) -> Response:
+        url = request.url or ""
+        namespace = request.headers.get("X-Vault-Namespace")
+        max_retries = self.retry_policy.max_retries if self.retry_policy is not None else 0
+        retries = 0
+        rate_limited_retries = 0
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(url, namespace)
+
+            try:
+                response = self._timed_send(request, *args, **kwargs)
+            except (ConnectionError, Timeout) as error:
+                if self.retry_policy is None or retries >= max_retries:
+                    raise
+                LOGGER.info("Request to %s failed (%s), retrying", url, error)
+                REQUEST_RETRIES_COUNTER.labels(vault_target=self.vault_target).inc()
+                self.retry_policy.backoff(retries)
+                retries += 1
+                continue
+
+            if response.status_code == 429 and self.rate_limiter is not None:
+                RATE_LIMITED_COUNTER.labels(vault_target=self.vault_target).inc()
+                if rate_limited_retries >= self.rate_limiter.max_retries:
+                    LOGGER.warning("Request to %s was still rate limited by Vault after %d retries", url, rate_limited_retries)
+                    return response
+                rate_limited_retries += 1
+                delay = get_retry_after(response.headers.get("Retry-After"))
+                LOGGER.info("Request to %s was rate limited by Vault, retrying in %.1f seconds", url, delay)
+                # Release the connection back to the pool before waiting
+                response.close()
+                self.rate_limiter.pause(url, delay, namespace)
+                continue
+
+            if response.status_code in RETRY_STATUSES and self.retry_policy is not None and retries < max_retries:
+                LOGGER.info("Request to %s failed with status %d, retrying", url, response.status_code)
+                REQUEST_RETRIES_COUNTER.labels(vault_target=self.vault_target).inc()
+                response.close()
+                self.retry_policy.backoff(retries)
+                retries += 1
+                continue
+
+            return response
+
+    def _timed_send(self, request: PreparedRequest, *args: Any, **kwargs: Any) -> Response:
+        """
+        Sends a single request, recording its latency and any error.
+        """
+        api_path = get_api_path(request.url or "")
+        mount_point = get_request_mount_point(request)
+        start = perf_counter()
+        try:
+            response = super().send(request, *args, **kwargs)
+        except Timeout:
+            REQUEST_ERRORS_COUNTER.labels(vault_target=self.vault_target, status_code="timeout").inc()
+            raise
+        except ConnectionError:
+            REQUEST_ERRORS_COUNTER.labels(vault_target=self.vault_target, status_code="connection_error").inc()
+            raise
+        REQUEST_DURATION_HISTOGRAM.labels(vault_target=self.vault_target, operation=get_operation(request.method or "", api_path), mount_point=mount_point).observe(perf_counter() - start)
+        if response.status_code >= 400:
+            REQUEST_ERRORS_COUNTER.labels(vault_target=self.vault_target, status_code=str(response.status_code)).inc()
+        return response
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        """
+        Creates the pool manager, with connection pools which count the connections they open.
+        """
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _TrackingHTTPConnectionPool, "https": _TrackingHTTPSConnectionPool}
+
+    def get_connection_stats(self) -> Tuple[int, int]:
+        """
+        Returns the total number of connections opened and requests sent over all of the adapter's connection pools.
+        """
+        connections = 0
+        requests = 0
+        pools = self.poolmanager.pools
+        # Iterating the pool container directly is not supported, so look up each pool by key
+        for key in pools.keys():
+            pool = pools.get(key)
+            if isinstance(pool, _ConnectionTrackingMixin):
+                connections += pool.opened_connections
+                requests += pool.sent_requests
+        return connections, requests
+
+    def get_cycle_stats(self) -> Tuple[int, int]:
+        """
+        Returns the number of connections opened and the number of connections reused since the previous call.
+        """
+        connections, requests = self.get_connection_stats()
+        # Pools which were evicted take their counts with them, so never report negative values
+        opened = max(connections - self._reported_connections, 0)
+        reused = max((requests - self._reported_requests) - opened, 0)
+        self._reported_connections = connections
+        self._reported_requests = requests
+        return opened, reused
+
+
+def get_request_mount_point(request: PreparedRequest) -> str:
+    """
+    Returns the first path segment of a request to the Vault API, prefixed with the namespace of the request (from the X-Vault-Namespace header) if it has one.
+    """
+    return get_namespace_path(get_api_path(request.url or "").split("/", 1)[0], request.headers.get("X-Vault-Namespace"))
+
+
+def get_request_timeout(vault_client: hvac.Client) -> Tuple[float, float]:
+    """
+    Returns the (connect, read) timeout for a request made directly with the session of the client, the timeout configured for its connection pool if it has one.
+    """
+    adapter = vault_client.session.get_adapter(vault_client.url)
+    if isinstance(adapter, PooledHTTPAdapter) and adapter.timeout is not None:
+        return adapter.timeout
+    return DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT
+
+
+def get_operation(method: str, api_path: str) -> str:
+    """
+    Returns the kind of Vault operation a request performs, for labelling metrics: list, entity, renew, metadata, metadata_write or other.
+    """
+    if method.upper() == "LIST":
+        return "list"
+    if api_path.startswith("identity/entity"):
+        return "entity"
+    if api_path.startswith("auth/token/renew"):
+        return "renew"
+    if "/metadata/" in api_path:
+        return "metadata" if method.upper() == "GET" else "metadata_write"
+    return "other"
+
+
+def configure_connection_pool(
+    vault_client: hvac.Client,
+    pool_size: int = DEFAULT_POOL_SIZE,
+    keep_alive: bool = True,
+    rate_limiter: Optional[RateLimiter] = None,
+    retry_policy: Optional[RetryPolicy] = None,
+    circuit_breaker_factory: Optional[Callable[[], CircuitBreaker]] = None,
+    timeout: Optional[Tuple[float, float]] = None,
+    vault_target: str = "",
+) -> PooledHTTPAdapter:
+    """
+    Mounts a pooled adapter on the session of the Vault client, so that every request made with that session (by hvac or directly) shares the same connections, rate limits, retries and timeouts.
+    """
+    adapter = PooledHTTPAdapter(pool_size=pool_size, rate_limiter=rate_limiter, retry_policy=retry_policy, circuit_breaker_factory=circuit_breaker_factory, timeout=timeout, vault_target=vault_target)
+    vault_client.session.mount("https://", adapter)
+    vault_client.session.mount("http://", adapter)
+
+    if not keep_alive:
+        LOGGER.info("Keep-alive disabled, a new connection will be opened for every request to Vault.")
+        vault_client.session.headers["Connection"] = "close"
+
+    return adapter
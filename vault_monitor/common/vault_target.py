@@ -0,0 +1,89 @@
+"""
+A Vault cluster monitored by the exporter, with its own client, connection pool and monitors.
+"""
+import logging
+from typing import Dict, Optional, Tuple
+
+import hvac
+
+from vault_monitor.common.vault_authenticate import get_authenticated_client
+from vault_monitor.common.vault_session import configure_connection_pool, DEFAULT_CONNECT_TIMEOUT, DEFAULT_POOL_SIZE, DEFAULT_READ_TIMEOUT, PooledHTTPAdapter
+from vault_monitor.common.monitor_registry import MonitorRegistry
+from vault_monitor.common.rate_limit import RateLimiter
+from vault_monitor.common.retry import CircuitBreaker, RetryPolicy
+
+LOGGER = logging.getLogger("vault_target")
+
+
+class VaultTarget:
+    """
+    Authenticates against a Vault cluster as configured by a vault section, and holds the registry of the monitors for it.
+
+    name is None when the exporter monitors a single cluster, from the vault section of the configuration.
+    Rate limits, retries and circuit breakers apply per target, as they protect the target's Vault cluster.
+    Authentication is deferred to authenticate(), so that a cluster which is unavailable doesn't keep the exporter from monitoring the others.
+    """
+
+    def __init__(self, vault_config: Dict, name: Optional[str] = None, max_concurrency: int = 1) -> None:
+        self.name = name
+        self.vault_config = vault_config
+        self.max_concurrency = max_concurrency
+        # Set by authenticate, we will have to use requests some with the token the client manages
+        self.vault_client: Optional[hvac.Client] = None
+        self.connection_pool: Optional[PooledHTTPAdapter] = None
+        self.registry = MonitorRegistry()
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.name or self.vault_config.get('address') or 'vault'})"
+
+    def authenticate(self) -> hvac.Client:
+        """
+        Returns the authenticated client of this target, authenticating (and configuring its connection pool) on the first successful call.
+        """
+        if self.vault_client is not None:
+            return self.vault_client
+        vault_config = self.vault_config
+        vault_client = get_authenticated_client(auth_config=vault_config["authentication"], address=vault_config.get("address", None), namespace=vault_config.get("namespace", None))
+
+        # Share one pool of keep-alive connections between all monitors, sized so that concurrent updates don't have to open extra connections
+        pool_config = vault_config.get("connection_pool") or {}
+        # Without limits configured, requests are only held back when Vault responds with 429 and Retry-After
+        rate_limit_config = vault_config.get("rate_limit") or {}
+        rate_limiter = RateLimiter(
+            rate=rate_limit_config.get("requests_per_second"),
+            burst=rate_limit_config.get("burst"),
+            mount_limits=rate_limit_config.get("mounts"),
+            max_retries=rate_limit_config.get("max_retries", 3),
+        )
+        retries_config = vault_config.get("retries") or {}
+        circuit_breaker_config = vault_config.get("circuit_breaker") or {}
+        # Always replace the fixed timeout of the requests, so the defaults below hold without a timeouts section as well
+        timeouts_config = vault_config.get("timeouts") or {}
+        self.connection_pool = configure_connection_pool(
+            vault_client,
+            pool_size=pool_config.get("pool_size", max(DEFAULT_POOL_SIZE, self.max_concurrency)),
+            keep_alive=pool_config.get("keep_alive", True),
+            rate_limiter=rate_limiter,
+            retry_policy=RetryPolicy(max_retries=retries_config.get("max_retries", 3), backoff_factor=retries_config.get("backoff_factor", 0.5), backoff_max=retries_config.get("backoff_max", 30)),
+            circuit_breaker_factory=lambda: CircuitBreaker(failure_threshold=circuit_breaker_config.get("failure_threshold", 5), reset_timeout=circuit_breaker_config.get("reset_timeout", 60)),
+            timeout=(timeouts_config.get("connect") or DEFAULT_CONNECT_TIMEOUT, timeouts_config.get("read") or DEFAULT_READ_TIMEOUT),
+            vault_target=self.name or "",
+        )
+        self.vault_client = vault_client
+        LOGGER.info("Authenticated to %s", self)
+        return vault_client
+
+    def get_cycle_stats(self) -> Tuple[int, int]:
+        """
+        Returns the number of connections opened and reused by requests to this target since the last call.
+        """
+        if self.connection_pool is None:
+            return 0, 0
+        return self.connection_pool.get_cycle_stats()
+
+    def renew_token(self, increment: int) -> None:
+        """
+        Renews the token of this target's client by increment seconds, if token_autorenew is set and the target is authenticated.
+        """
+        if self.vault_client is not None and self.vault_config.get("token_autorenew", False):
+            self.vault_client.auth.token.renew_self(f"{increment}s")
@@ -0,0 +1,261 @@
+"""
+Minimal websocket client (RFC 6455), sufficient for receiving Vault event notifications without an extra dependency.
+"""
+import base64
+import hashlib
+import os
+import socket
+import ssl
+import struct
+from typing import Dict, Optional, Tuple, Union
+from urllib.parse import unquote, urlsplit
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OPCODE_CONTINUATION = 0x0
+OPCODE_TEXT = 0x1
+OPCODE_BINARY = 0x2
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+
+
+class WebSocketError(Exception):
+    """
+    Raised when the websocket handshake fails or the server violates the protocol.
+    """
+
+
+def read_http_headers(data: bytes) -> Tuple[str, Dict[str, str]]:
+    """
+    Returns the status line and the (lower cased) headers of an HTTP response head.
+    """
+    status_line, *header_lines = data.decode("iso-8859-1").split("\r\n")
+    headers = {}
+    for line in header_lines:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return status_line.strip(), headers
+
+
+# The client keeps the address, headers and TLS settings of the connection next to its state
+class WebSocketConnection:  # pylint: disable=too-many-instance-attributes
+    """
+    Client side of a websocket connection, only supporting what is needed to receive messages: text/binary messages, ping/pong and close.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = 60,
+        verify: Union[bool, str] = True,
+        ping_interval: Optional[float] = 30,
+        proxy: Optional[str] = None,
+        cert: Union[None, str, Tuple[str, str]] = None,
+    ) -> None:
+        """
+        Creates a connection to url (http(s):// or ws(s)://), which is opened with connect.
+
+        verify and cert work as for requests: either a boolean or the path to a CA bundle, and the client certificate file or a (certificate, key) tuple.
+        If the connection is idle for ping_interval seconds a ping is sent, and the connection is considered lost if nothing arrives within another ping_interval.
+        proxy is the URL of an HTTP proxy to tunnel the connection through.
+        """
+        self.url = urlsplit(url)
+        self.headers = headers or {}
+        self.timeout = timeout
+        self.verify = verify
+        self.ping_interval = ping_interval
+        self.proxy = urlsplit(proxy) if proxy else None
+        self.cert = cert
+        self._socket: Optional[socket.socket] = None
+        self._buffer = bytearray()
+        self._ping_sent = False
+
+    def connect(self) -> None:
+        """
+        Opens the connection and performs the websocket handshake.
+        """
+        secure = self.url.scheme in ["https", "wss"]
+        host = self.url.hostname or "localhost"
+        port = self.url.port or (443 if secure else 80)
+
+        if self.proxy is None:
+            sock = socket.create_connection((host, port), timeout=self.timeout)
+        else:
+            sock = self._open_tunnel(host, port)
+        if secure:
+            sock = self._get_ssl_context().wrap_socket(sock, server_hostname=host)
+        self._socket = sock
+        self._buffer = bytearray()
+        self._ping_sent = False
+
+        key = base64.b64encode(os.urandom(16)).decode("ascii")
+        path = self.url.path or "/"
+        if self.url.query:
+            path = f"{path}?{self.url.query}"
+        request_lines = [
+            f"GET {path} HTTP/1.1",
+            f"Host: {host}:{port}",
+            "Upgrade: websocket",
+            "Connection: Upgrade",
+            f"Sec-WebSocket-Key: {key}",
+            "Sec-WebSocket-Version: 13",
+        ]
+        request_lines += [f"{name}: {value}" for name, value in self.headers.items()]
+        sock.sendall(("\r\n".join(request_lines) + "\r\n\r\n").encode("utf-8"))
+        status_line, response_headers = read_http_headers(self._read_until(b"\r\n\r\n"))
+
+        if status_line.split(" ")[1:2] != ["101"]:
+            self.close()
+            raise WebSocketError(f"Websocket handshake failed: {status_line}")
+        # SHA-1 is mandated by the protocol for the handshake, it isn't used for security
+        expected_accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode("ascii")).digest()).decode("ascii")  # nosec B324
+        if response_headers.get("sec-websocket-accept") != expected_accept:
+            self.close()
+            raise WebSocketError("Websocket handshake failed: invalid Sec-WebSocket-Accept header.")
+        # Once connected, reads time out after ping_interval so idle connections are checked with a ping
+        sock.settimeout(self.ping_interval)
+
+    def _open_tunnel(self, host: str, port: int) -> socket.socket:
+        """
+        Connects to the proxy and asks it to tunnel the connection to host:port (HTTP CONNECT).
+        """
+        assert self.proxy is not None  # nosec B101
+        if self.proxy.scheme != "http":
+            raise WebSocketError(f"Unsupported proxy scheme {self.proxy.scheme}, only http proxies are supported.")
+        self._socket = socket.create_connection((self.proxy.hostname or "localhost", self.proxy.port or 80), timeout=self.timeout)
+        request_lines = [f"CONNECT {host}:{port} HTTP/1.1", f"Host: {host}:{port}"]
+        if self.proxy.username:
+            credentials = f"{unquote(self.proxy.username)}:{unquote(self.proxy.password or '')}"
+            request_lines.append(f"Proxy-Authorization: Basic {base64.b64encode(credentials.encode('utf-8')).decode('ascii')}")
+        self._socket.sendall(("\r\n".join(request_lines) + "\r\n\r\n").encode("utf-8"))
+
+        status_line, _ = read_http_headers(self._read_until(b"\r\n\r\n"))
+        if status_line.split(" ")[1:2] != ["200"]:
+            self.close()
+            raise WebSocketError(f"Proxy tunnel failed: {status_line}")
+        sock, self._socket = self._socket, None
+        return sock
+
+    def _get_ssl_context(self) -> ssl.SSLContext:
+        if self.verify is False:
+            context = ssl.create_default_context()
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        elif isinstance(self.verify, str):
+            context = ssl.create_default_context(cafile=self.verify)
+        else:
+            # Honour the same environment variables as requests for custom CAs
+            context = ssl.create_default_context(cafile=os.getenv("REQUESTS_CA_BUNDLE") or os.getenv("CURL_CA_BUNDLE") or None)
+        if isinstance(self.cert, str):
+            context.load_cert_chain(self.cert)
+        elif self.cert is not None:
+            context.load_cert_chain(*self.cert)
+        return context
+
+    def receive(self) -> Optional[str]:
+        """
+        Blocks until the next message arrives and returns it, or returns None once the server closes the connection.
+        """
+        message = b""
+        while True:
+            fin, opcode, payload = self._read_frame()
+            if opcode == OPCODE_CLOSE:
+                try:
+                    self._send_frame(OPCODE_CLOSE, payload[:2])
+                except OSError:
+                    # The server may not wait for the closing handshake
+                    pass
+                self.close()
+                return None
+            if opcode == OPCODE_PING:
+                self._send_frame(OPCODE_PONG, payload)
+                continue
+            if opcode == OPCODE_PONG:
+                continue
+            if opcode not in [OPCODE_TEXT, OPCODE_BINARY, OPCODE_CONTINUATION]:
+                raise WebSocketError(f"Unsupported websocket opcode {opcode}.")
+            message += payload
+            if fin:
+                return message.decode("utf-8")
+
+    def _receive_data(self, ping: bool = True) -> None:
+        """
+        Appends the data available on the socket to the buffer, sending a ping if nothing arrived for ping_interval seconds.
+
+        Data read before a timeout stays in the buffer, so frames can be split across timeouts.
+        Without ping (i.e. before the websocket handshake completed) timeouts fail right away.
+        """
+        if self._socket is None:
+            raise WebSocketError("Websocket is not connected.")
+        try:
+            data = self._socket.recv(65536)
+        except socket.timeout as error:
+            if not ping:
+                raise WebSocketError("Websocket connection timed out.") from error
+            if self._ping_sent:
+                raise WebSocketError("Websocket connection timed out, no response to ping.") from error
+            self._send_frame(OPCODE_PING, b"")
+            self._ping_sent = True
+            return
+        if not data:
+            raise WebSocketError("Websocket connection closed unexpectedly.")
+        self._ping_sent = False
+        self._buffer += data
+
+    def _read_until(self, delimiter: bytes) -> bytes:
+        while delimiter not in self._buffer:
+            self._receive_data(ping=False)
+        length = self._buffer.index(delimiter)
+        data = bytes(self._buffer[:length])
+        del self._buffer[: length + len(delimiter)]
+        return data
+
+    def _read_exactly(self, length: int) -> bytes:
+        while len(self._buffer) < length:
+            self._receive_data()
+        data = bytes(self._buffer[:length])
+        del self._buffer[:length]
+        return data
+
+    def _read_frame(self) -> Tuple[bool, int, bytes]:
+        first_byte, second_byte = self._read_exactly(2)
+        fin = bool(first_byte & 0x80)
+        opcode = first_byte & 0x0F
+        masked = bool(second_byte & 0x80)
+        length = second_byte & 0x7F
+        if length == 126:
+            (length,) = struct.unpack("!H", self._read_exactly(2))
+        elif length == 127:
+            (length,) = struct.unpack("!Q", self._read_exactly(8))
+        mask = self._read_exactly(4) if masked else None
+        payload = self._read_exactly(length)
+        if mask is not None:
+            payload = bytes(byte ^ mask[index % 4] for index, byte in enumerate(payload))
+        return fin, opcode, payload
+
+    def _send_frame(self, opcode: int, payload: bytes) -> None:
+        """
+        Sends a single frame, client frames must always be masked.
+        """
+        if self._socket is None:
+            return
+        header = bytes([0x80 | opcode])
+        if len(payload) < 126:
+            header += bytes([0x80 | len(payload)])
+        elif len(payload) < 2**16:
+            header += bytes([0x80 | 126]) + struct.pack("!H", len(payload))
+        else:
+            header += bytes([0x80 | 127]) + struct.pack("!Q", len(payload))
+        mask = os.urandom(4)
+        masked_payload = bytes(byte ^ mask[index % 4] for index, byte in enumerate(payload))
+        self._socket.sendall(header + mask + masked_payload)
+
+    def close(self) -> None:
+        """
+        Closes the underlying connection.
+        """
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
@@ -0,0 +1,77 @@
+"""
+Adaptive polling, refreshing each monitor at an interval based on how close it is to expiring.
+"""
+import heapq
+import logging
+from itertools import count
+from time import time
+from typing import Callable, Dict, Hashable, Iterable, List, Tuple
+
+from vault_monitor.expiration_monitor.expiration_monitor import ExpirationMonitor
+
+LOGGER = logging.getLogger("adaptive_polling")
+
+
+class AdaptivePoller:
+    """
+    Keeps a heap of when each monitor is next due to be refreshed.
+
+    The interval for a monitor is expiry_fraction of the time until it expires, bounded by min_interval and max_interval.
+    Monitors which have expired, or which have never been refreshed successfully, use min_interval so rotations show up quickly.
+    """
+
+    def __init__(self, min_interval: float, max_interval: float, expiry_fraction: float = 0.01, clock: Callable[[], float] = time) -> None:
+        if min_interval > max_interval:
+            raise ValueError("min_interval must not be larger than max_interval.")
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.expiry_fraction = expiry_fraction
+        self.time_function = clock
+        self._heap: List[Tuple[float, int, Hashable]] = []
+        self._due: Dict[Hashable, float] = {}
+        # Tie breaker, so the heap never has to compare keys
+        self._sequence = count()
+
+    def get_due_monitors(self, monitors: Iterable[ExpirationMonitor]) -> List[ExpirationMonitor]:
+        """
+        Returns the monitors which are due for a refresh, monitors not seen before are due immediately.
+
+        Monitors which are no longer provided are forgotten.
+        """
+        now = self.time_function()
+        monitors_by_key: Dict[Hashable, ExpirationMonitor] = {monitor.key: monitor for monitor in monitors}
+
+        due_monitors = [monitor for key, monitor in monitors_by_key.items() if key not in self._due]
+        for key in list(self._due):
+            if key not in monitors_by_key:
+                del self._due[key]
+
+        while self._heap and self._heap[0][0] <= now:
+            due_time, _, key = heapq.heappop(self._heap)
+            # Entries for forgotten or rescheduled monitors are left in the heap and skipped here
+            if self._due.get(key) == due_time:
+                del self._due[key]
+                due_monitors.append(monitors_by_key[key])
+
+        return due_monitors
+
+    def reschedule(self, monitors: Iterable[ExpirationMonitor]) -> None:
+        """
+        Schedules the next refresh of the monitors, based on their most recent expiration information.
+        """
+        now = self.time_function()
+        for monitor in monitors:
+            due_time = now + self.get_interval(monitor, now)
+            self._due[monitor.key] = due_time
+            heapq.heappush(self._heap, (due_time, next(self._sequence), monitor.key))
+
+    def get_interval(self, monitor: ExpirationMonitor, now: float) -> float:
+        """
+        Returns the time until the next refresh of the monitor.
+        """
+        if monitor.expiration_info is None:
+            return self.min_interval
+        time_until_expiry = monitor.expiration_info.get_expiration_timestamp() - now
+        if time_until_expiry <= 0:
+            return self.min_interval
+        return min(max(time_until_expiry * self.expiry_fraction, self.min_interval), self.max_interval)
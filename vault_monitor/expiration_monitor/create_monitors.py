@@ -2,88 +2,232 @@
 Functions for setting up expiration monitors.
 """
 import logging
+import re
 from copy import deepcopy
-from typing import List, Dict, Sequence
+from typing import Iterable, Iterator, List, Dict, Hashable, Mapping, Optional, Sequence, Tuple
 
 from hvac import Client as hvac_client
 
-from vault_monitor.expiration_monitor.expiration_monitor import ExpirationMonitor
+from vault_monitor.common.discovery import walk_breadth_first
+from vault_monitor.common.sharding import ShardSelector
+from vault_monitor.common.vault_namespaces import get_request_headers, iter_namespaces
+from vault_monitor.common.vault_session import get_request_timeout
+from vault_monitor.expiration_monitor.expiration_monitor import ExpirationMonitor, MonitorOptions, get_qualified_mount_point
 from vault_monitor.expiration_monitor.secret_expiration_monitor import SecretExpirationMonitor
 from vault_monitor.expiration_monitor.entity_expiration_monitor import EntityExpirationMonitor
+from vault_monitor.expiration_monitor.series_limiter import DEFAULT_PATH_LABEL_LENGTH, PATH_LABEL_MODES, SeriesLimiter, get_path_label
 
 LOGGER = logging.getLogger("secret-monitor")
 
+DEFAULT_METADATA_FIELDNAMES = {"last_renewal_timestamp": "last_renewal_timestamp", "expiration_timestamp": "expiration_timestamp"}
 
-def create_monitors(config: Dict, vault_client: hvac_client) -> Sequence[ExpirationMonitor]:
+
+def create_monitors(
+    config: Dict,
+    vault_client: hvac_client,
+    existing_monitors: Optional[Mapping[Hashable, ExpirationMonitor]] = None,
+    shard: Optional[ShardSelector] = None,
+    cached_secret_paths: Optional[Mapping[Tuple[str, str], Sequence[str]]] = None,
+) -> Sequence[ExpirationMonitor]:
     """
     Returns a list of secret monitors based on provided configuration.
+
+    See iter_monitors for the arguments.
+    """
+    return list(iter_monitors(config, vault_client, existing_monitors, shard, cached_secret_paths))
+
+
+def iter_monitors(
+    config: Dict,
+    vault_client: hvac_client,
+    existing_monitors: Optional[Mapping[Hashable, ExpirationMonitor]] = None,
+    shard: Optional[ShardSelector] = None,
+    cached_secret_paths: Optional[Mapping[Tuple[str, str], Sequence[str]]] = None,
+) -> Iterator[ExpirationMonitor]:
+    """
+    Yields secret monitors based on provided configuration, creating the monitors for recursive secret paths while the tree is still being walked.
+
+    Any monitor found in existing_monitors (keyed by ExpirationMonitor.key) is reused rather than created again, allowing discovery to be re-run against a live set of monitors.
+    If a shard is provided, only secrets (by mount point and path) and entities (by entity id) owned by the shard are monitored.
+    If cached_secret_paths (secret paths by service and mount point, e.g. from a snapshot) is provided, recursive secret paths are taken from it instead of being listed in Vault.
+    """
+    if existing_monitors is None:
+        existing_monitors = {}
+    if shard is None:
+        shard = ShardSelector()
+    prometheus_label_keys = list(config.get("prometheus_labels", {}).keys())
+    namespaces = get_namespaces(config, vault_client, prometheus_label_keys)
+
+    for namespace in namespaces:
+        for service_config in config.get("services", {}):
+            if namespace is not None and not re.fullmatch(service_config.get("namespace_pattern") or ".*", namespace):
+                continue
+            LOGGER.info("Configuring monitoring for service %s%s", service_config["name"], f" in namespace {namespace}" if namespace is not None else "")
+            service_prometheus_labels = get_service_prometheus_labels(config, service_config, prometheus_label_keys, namespace)
+            for secret in service_config.get("secrets", []):
+                for secret_path in iter_secret_paths(config, service_config["name"], secret, vault_client, namespace, cached_secret_paths):
+                    if not shard.owns(get_qualified_mount_point(secret.get("mount_point"), namespace), secret_path):
+                        continue
+                    existing_monitor = existing_monitors.get(SecretExpirationMonitor.get_key(service_config["name"], secret.get("mount_point"), secret_path, namespace))
+                    if existing_monitor is None:
+                        existing_monitor = create_secret_monitor(config, service_config, secret, secret_path, vault_client, service_prometheus_labels, namespace)
+                    yield existing_monitor
+
+            for entity in service_config.get("entities", []):
+                if not shard.owns(entity.get("entity_id")):
+                    continue
+                existing_monitor = existing_monitors.get(EntityExpirationMonitor.get_key(service_config["name"], entity.get("mount_point"), entity.get("entity_id"), namespace))
+                if existing_monitor is None:
+                    existing_monitor = create_entity_monitor(config, service_config, entity, vault_client, service_prometheus_labels, namespace)
+                yield existing_monitor
+
+
+def get_namespaces(config: Dict, vault_client: hvac_client, prometheus_label_keys: List[str]) -> Iterable[Optional[str]]:
+    """
+    Returns the namespaces to apply the services to, [None] for only the namespace of the client unless namespaces are configured.
+
+    When monitoring namespaces, the namespace label is added to prometheus_label_keys and the namespaces are yielded as soon as they have been enumerated.
+    """
+    namespaces_config = config.get("namespaces")
+    if namespaces_config is None:
+        return [None]
+    if "namespace" in prometheus_label_keys:
+        raise ValueError("expiration_monitoring configures the namespace prometheus label, which is set to the namespace of each secret when monitoring namespaces!")
+    prometheus_label_keys.append("namespace")
+    return iter_namespaces(
+        vault_client,
+        parent=namespaces_config.get("parent", vault_client.adapter.namespace or ""),
+        max_concurrency=config.get("discovery_concurrency") or 1,
+        recursive=namespaces_config.get("recursive", True),
+    )
+
+
+def get_service_prometheus_labels(config: Dict, service_config: Dict, prometheus_label_keys: List[str], namespace: Optional[str] = None) -> Dict[str, str]:
+    """
+    Returns the prometheus labels shared by the monitors of a service in a namespace, the global labels overridden by those of the service.
+    """
+    # Use deepcopy since dicts are handled by ref and tend to get overwritten otherwise
+    service_prometheus_labels = deepcopy(config.get("prometheus_labels", {}))
+    if namespace is not None:
+        service_prometheus_labels["namespace"] = namespace
+    service_prometheus_labels.update(service_config.get("prometheus_labels", {}))
+    if not check_prometheus_labels(prometheus_label_keys, service_prometheus_labels):
+        raise ValueError(f"expiration_monitoring {service_config['name']} configures prometheus_labels with a key(s) which is not in the globally configured prometheus labels!")
+    return service_prometheus_labels
+
+
+def iter_secret_paths(
+    config: Dict, service: str, secret: Dict, vault_client: hvac_client, namespace: Optional[str] = None, cached_secret_paths: Optional[Mapping[Tuple[str, str], Sequence[str]]] = None
+) -> Iterable[str]:
+    """
+    Returns the secret paths to monitor for a secret of a service, listing the paths under recursive secrets (unless cached_secret_paths is provided, see iter_monitors).
+    """
+    secret_path = secret["secret_path"]
+    if not secret.get("recursive", False):
+        return [secret_path]
+    # Remove any forward slashes at the beginning of the secret path
+    secret_path = secret_path[1:] if secret_path and secret_path[0] == "/" else secret_path
+    if cached_secret_paths is not None:
+        cached_paths = cached_secret_paths.get((service, get_qualified_mount_point(secret["mount_point"], namespace)), [])
+        return (cached_path for cached_path in cached_paths if cached_path.startswith(f"{secret_path}/"))
+    return iter_secrets(mount_point=secret["mount_point"], secret_path=secret_path, vault_client=vault_client, max_concurrency=config.get("discovery_concurrency") or 1, namespace=namespace)
+
+
+def create_secret_monitor(
+    config: Dict, service_config: Dict, secret: Dict, secret_path: str, vault_client: hvac_client, prometheus_labels: Dict[str, str], namespace: Optional[str] = None
+) -> SecretExpirationMonitor:
     """
-    default_prometheus_labels = config.get("prometheus_labels", {})
-    prometheus_label_keys = list(default_prometheus_labels.keys())
-    default_metadata_fieldnames = config.get("metadata_fieldnames", {"last_renewal_timestamp": "last_renewal_timestamp", "expiration_timestamp": "expiration_timestamp"})
-
-    expiration_monitors: List[ExpirationMonitor] = []
-    for service_config in config.get("services", {}):
-        LOGGER.info("Configuring monitoring for service %s", service_config["name"])
-        # Use deepcopy since dicts are handled by ref and tend to get overwritten otherwise
-        service_prometheus_labels = deepcopy(default_prometheus_labels)
-        service_prometheus_labels.update(service_config.get("prometheus_labels", {}))
-        if not check_prometheus_labels(prometheus_label_keys, service_prometheus_labels):
-            raise ValueError(f"expiration_monitoring {service_config['name']} configures prometheus_labels with a key(s) which is not in the globally configured prometheus labels!")
-        for secret in service_config.get("secrets", []):
-            secret_paths = []
-            if not secret.get("recursive", False):
-                secret_paths.append(secret.get("secret_path"))
-            else:
-                secret_path = secret.get("secret_path")
-                # Remove any forward slashes at the beginning of the secret path
-                secret_path = secret_path[1:] if secret_path and secret_path[0] == "/" else secret_path
-                secret_paths = recurse_secrets(mount_point=secret.get("mount_point"), secret_path=secret_path, vault_client=vault_client)
-
-            for secret_path in secret_paths:
-                LOGGER.debug("Monitoring %s/%s", secret.get("mount_point"), secret_path)
-                secret_monitor = SecretExpirationMonitor(
-                    secret.get("mount_point"),
-                    secret_path,
-                    vault_client,
-                    service_config["name"],
-                    service_prometheus_labels,
-                    service_config.get("metadata_fieldnames", default_metadata_fieldnames),
-                )
-                expiration_monitors.append(secret_monitor)
-
-        for entity in service_config.get("entities", []):
-            entity_monitor = EntityExpirationMonitor(
-                entity.get("mount_point"),
-                entity.get("entity_id"),
-                entity.get("entity_name"),
-                vault_client,
-                service_config["name"],
-                service_prometheus_labels,
-                service_config.get("metadata_fieldnames", default_metadata_fieldnames),
-            )
-            expiration_monitors.append(entity_monitor)
-
-    return expiration_monitors
-
-
-def recurse_secrets(mount_point: str, secret_path: str, vault_client: hvac_client) -> List[str]:
-    """
-    Recursively return a list of secret paths to monitor
-    """
-    keys = vault_client.secrets.kv.v2.list_secrets(mount_point=mount_point, path=secret_path)["data"]["keys"]
-
-    secrets = []
-
-    for key in keys:
+    Returns a monitor for a secret path of a service, with the secret's settings taking precedence over those of the service and the global ones.
+    """
+    aggregate = secret.get("aggregate", service_config.get("aggregate", False))
+    export_series = get_export_series(secret.get("export_series", service_config.get("export_series")), aggregate)
+    path_label_config = service_config.get("monitored_path_label") or config.get("monitored_path_label") or {}
+    path_label_mode = path_label_config.get("mode", "full")
+    LOGGER.debug("Monitoring %s/%s", secret["mount_point"], secret_path)
+    return SecretExpirationMonitor(
+        secret["mount_point"],
+        secret_path,
+        vault_client,
+        service_config["name"],
+        prometheus_labels,
+        get_metadata_fieldnames(config, service_config),
+        MonitorOptions(export_series, aggregate, namespace),
+        path_label=get_path_label(secret_path, path_label_mode, path_label_config.get("max_length", DEFAULT_PATH_LABEL_LENGTH)) if path_label_mode != "full" else None,
+    )
+
+
+def create_entity_monitor(config: Dict, service_config: Dict, entity: Dict, vault_client: hvac_client, prometheus_labels: Dict[str, str], namespace: Optional[str] = None) -> EntityExpirationMonitor:
+    """
+    Returns a monitor for an entity of a service, with the service's settings taking precedence over the global ones.
+    """
+    aggregate = service_config.get("aggregate", False)
+    return EntityExpirationMonitor(
+        entity["mount_point"],
+        entity["entity_id"],
+        entity["entity_name"],
+        vault_client,
+        service_config["name"],
+        prometheus_labels,
+        get_metadata_fieldnames(config, service_config),
+        MonitorOptions(get_export_series(service_config.get("export_series"), aggregate), aggregate, namespace),
+    )
+
+
+def get_metadata_fieldnames(config: Dict, service_config: Dict) -> Dict[str, str]:
+    """
+    Returns the custom metadata fieldnames for the monitors of a service, by default the global ones.
+    """
+    return service_config.get("metadata_fieldnames", config.get("metadata_fieldnames", DEFAULT_METADATA_FIELDNAMES))
+
+
+def recurse_secrets(mount_point: str, secret_path: str, vault_client: hvac_client, max_concurrency: int = 1) -> List[str]:
+    """
+    Recursively return a list of secret paths to monitor.
+
+    The tree is walked breadth first, with up to max_concurrency LIST calls to Vault in flight at once.
+    """
+    return list(iter_secrets(mount_point, secret_path, vault_client, max_concurrency))
+
+
+def iter_secrets(mount_point: str, secret_path: str, vault_client: hvac_client, max_concurrency: int = 1, namespace: Optional[str] = None) -> Iterator[str]:
+    """
+    Recursively yield the secret paths to monitor, as soon as the "directory" containing them has been listed.
+
+    The tree is walked breadth first, with up to max_concurrency LIST calls to Vault in flight at once, see walk_breadth_first.
+    If namespace is provided, the secrets are listed in that namespace rather than the namespace of the client.
+    """
+    for path, key in walk_breadth_first(secret_path, lambda path: list_secrets(mount_point, path, vault_client, namespace), max_concurrency, thread_name_prefix="recurse_secrets"):
         # Check if the key is a "directory"
-        if key[-1] == "/":
-            subpath = f"{secret_path}/{key[:-1]}" if secret_path else key[:-1]
-            secrets += recurse_secrets(mount_point=mount_point, secret_path=subpath, vault_client=vault_client)
-        else:
-            secrets.append(f"{secret_path}/{key}")
+        if key[-1] != "/":
+            yield f"{path}/{key}"
+
+
+def list_secrets(mount_point: str, secret_path: str, vault_client: hvac_client, namespace: Optional[str] = None) -> List[str]:
+    """
+    Returns the keys directly under a secret path, "directories" end in a forward slash.
+    """
+    if namespace is None:
+        return vault_client.secrets.kv.v2.list_secrets(mount_point=mount_point, path=secret_path)["data"]["keys"]
+    response = vault_client.session.request(
+        "LIST", f"{vault_client.url}/v1/{mount_point}/metadata/{secret_path}", headers=get_request_headers(vault_client, namespace), timeout=get_request_timeout(vault_client)
+    )
+    response.raise_for_status()
+    return response.json()["data"]["keys"]
+
+
+def create_series_limiter(config: Dict, vault_target: str = "") -> SeriesLimiter:
+    """
+    Returns a series limiter with the global and per service series limits from the configuration, with vault_target the name of the target it applies to (if there are several).
+    """
+    service_limits = {service_config["name"]: service_config["series_limit"] for service_config in config.get("services", []) if service_config.get("series_limit") is not None}
+    return SeriesLimiter(global_limit=config.get("series_limit"), service_limits=service_limits, vault_target=vault_target)
 
-    return secrets
+
+def get_export_series(export_series: Optional[bool], aggregate: bool) -> bool:
+    """
+    Returns whether a monitor exposes its own series, by default only when it isn't aggregated.
+    """
+    return export_series if export_series is not None else not aggregate
 
 
 def check_prometheus_labels(configured_label_keys: List[str], proposed_labels: Dict[str, str]) -> bool:
@@ -120,6 +264,61 @@ def get_configuration_schema() -> Dict:
                     "keysrules": {"type": "string", "forbidden": ["secret_path", "mount_point", "service"]},
                     "meta": {"description": "Labels to set in the Prometheus metrics."},
                 },
+                "discovery_concurrency": {
+                    "type": "integer",
+                    "nullable": True,
+                    "min": 1,
+                    "meta": {"description": "Maximum number of LIST calls in flight while walking recursive secret paths, by default 1."},
+                },
+                "summary_buckets": {
+                    "type": "list",
+                    "nullable": True,
+                    "schema": {"type": "number"},
+                    "meta": {"description": "Upper bounds in seconds of the time until expiry histogram for aggregated monitors, by default 0, 1, 7, 30, 90, 180 and 365 days."},
+                },
+                "series_limit": {
+                    "type": "integer",
+                    "nullable": True,
+                    "min": 0,
+                    "meta": {"description": "Maximum number of secrets and entities exposing their own series, beyond it only the soonest expiring ones keep their series."},
+                },
+                "monitored_path_label": {
+                    "type": "dict",
+                    "nullable": True,
+                    "meta": {"description": "How the monitored_path label is set, to keep very long paths out of the labels."},
+                    "schema": {
+                        "mode": {
+                            "type": "string",
+                            "allowed": PATH_LABEL_MODES,
+                            "meta": {"description": "full (the default) uses the path, truncate cuts paths longer than max_length (ending them in a short hash) and hash uses a hash of the path."},
+                        },
+                        "max_length": {"type": "integer", "min": 16, "meta": {"description": "Maximum length of the label with truncate, by default 64."}},
+                    },
+                },
+                "snapshot": {
+                    "type": "dict",
+                    "nullable": True,
+                    "meta": {"description": "Periodically store the monitored secrets and their last known expiration information, to serve metrics right after a restart."},
+                    "schema": {
+                        "path": {"type": "string", "required": True, "nullable": False, "meta": {"description": "File to store the snapshot in, its directory must be writable."}},
+                        "interval": {"type": "integer", "nullable": True, "min": 1, "meta": {"description": "Frequency in seconds with which the snapshot is written, by default 300."}},
+                    },
+                },
+                "namespaces": {
+                    "type": "dict",
+                    "nullable": True,
+                    "meta": {"description": "Vault Enterprise only: apply the services to every namespace under parent, labelling their series with the namespace."},
+                    "schema": {
+                        "parent": {"type": "string", "meta": {"description": "Namespace whose child namespaces are monitored (along with itself), by default the namespace of the vault section."}},
+                        "recursive": {"type": "boolean", "meta": {"description": "Whether nested namespaces are monitored as well, by default true."}},
+                    },
+                },
+                "discovery_interval": {
+                    "type": "integer",
+                    "nullable": True,
+                    "min": 0,
+                    "meta": {"description": "Frequency in seconds with which recursive secret paths are walked again to pick up added or deleted secrets, 0 or unset disables re-discovery."},
+                },
                 "services": {
                     "type": "list",
                     "required": True,
@@ -129,6 +328,13 @@ def get_configuration_schema() -> Dict:
                         "type": "dict",
                         "schema": {
                             "name": {"type": "string", "meta": {"description": "Name of service."}},
+                            "namespace_pattern": {
+                                "type": "string",
+                                "nullable": True,
+                                "meta": {
+                                    "description": "With namespaces, regular expression the full path of a namespace must match for the service to be monitored in it, by default all namespaces."
+                                },
+                            },
                             "metadata_fieldnames": {
                                 "type": "dict",
                                 "nullable": True,
@@ -142,6 +348,39 @@ def get_configuration_schema() -> Dict:
                                 "keysrules": {"type": "string", "forbidden": ["secret_path", "mount_point", "service"]},
                                 "meta": {"description": "Labels to set in the Prometheus metrics. All of the keys must already exist in the global prometheus_labels."},
                             },
+                            "aggregate": {
+                                "type": "boolean",
+                                "nullable": False,
+                                "meta": {"description": "Include the secrets and entities of the service in the summary metrics, rather than only exposing a series per secret."},
+                            },
+                            "export_series": {
+                                "type": "boolean",
+                                "nullable": False,
+                                "meta": {"description": "Expose a series per secret or entity of the service, by default only when aggregate isn't set."},
+                            },
+                            "series_limit": {
+                                "type": "integer",
+                                "nullable": True,
+                                "min": 0,
+                                "meta": {"description": "Maximum number of secrets and entities of the service exposing their own series."},
+                            },
+                            "monitored_path_label": {
+                                "type": "dict",
+                                "nullable": True,
+                                "meta": {"description": "How the monitored_path label is set for the service, overrides the global value."},
+                                "schema": {
+                                    "mode": {
+                                        "type": "string",
+                                        "allowed": PATH_LABEL_MODES,
+                                        "meta": {
+                                            "description": (
+                                                "full (the default) uses the path, truncate cuts paths longer than max_length (ending them in a short hash) and hash uses a hash of the path."
+                                            )
+                                        },
+                                    },
+                                    "max_length": {"type": "integer", "min": 16, "meta": {"description": "Maximum length of the label with truncate, by default 64."}},
+                                },
+                            },
                             "secrets": {
                                 "type": "list",
                                 "required": False,
@@ -158,6 +397,16 @@ def get_configuration_schema() -> Dict:
                                         },
                                         "secret_path": {"type": "string", "required": True, "nullable": False, "meta": {"description": "Path to the secret (minus the mount_point)."}},
                                         "recursive": {"type": "boolean", "nullable": False, "meta": {"description": "Recursively monitor all secrets at or below the secret_path."}},
+                                        "aggregate": {
+                                            "type": "boolean",
+                                            "nullable": False,
+                                            "meta": {"description": "Include the secrets in the summary metrics, overrides the value for the service."},
+                                        },
+                                        "export_series": {
+                                            "type": "boolean",
+                                            "nullable": False,
+                                            "meta": {"description": "Expose a series per secret, overrides the value for the service."},
+                                        },
                                     },
                                 },
                             },
@@ -4,42 +4,52 @@ Class for monitoring entity secret expiration information in HashiCorp Vault.
 
 from typing import Dict
 
-import requests
 import hvac
 
-from vault_monitor.expiration_monitor.expiration_monitor import ExpirationMonitor
+from vault_monitor.common.vault_namespaces import get_request_headers
+from vault_monitor.common.vault_session import get_request_timeout
+from vault_monitor.expiration_monitor.expiration_monitor import DEFAULT_OPTIONS, ExpirationMonitor, MonitorOptions
 from vault_monitor.expiration_monitor.vault_time import ExpirationMetadata
 
-TIMEOUT = 60
-
 
 class EntityExpirationMonitor(ExpirationMonitor):
     """
     Class for monitoring entity secrets
     """
 
+    __slots__ = ()
+
     last_renewal_gauge_name = "vault_entity_last_renewal_timestamp"
     last_renewal_gauge_description = "Timestamp for when an entity's secrets were last updated."
     expiration_gauge_name = "vault_entity_expiration_timestamp"
     expiration_gauge_description = "Timestamp for when an entity's secrets should be expired and rotated."
+    last_update_gauge_name = "vault_entity_last_successful_update_timestamp"
+    last_update_gauge_description = "Timestamp for when an entity's expiration metadata was last read from Vault successfully."
+    summary_metric_prefix = "vault_entity_summary"
+    overflow_metric_prefix = "vault_entity_overflow"
 
     def __init__(
-        self, mount_point: str, monitored_path: str, name: str, vault_client: hvac.Client, service: str, prometheus_labels: Dict[str, str] = None, metadata_fieldnames: Dict[str, str] = None
+        self,
+        mount_point: str,
+        monitored_path: str,
+        name: str,
+        vault_client: hvac.Client,
+        service: str,
+        prometheus_labels: Dict[str, str] = None,
+        metadata_fieldnames: Dict[str, str] = None,
+        options: MonitorOptions = DEFAULT_OPTIONS,
     ) -> None:
-        if prometheus_labels:
-            prometheus_labels.update({"entity_name": name})
-        else:
-            prometheus_labels = {"entity_name": name}
-        super().__init__(mount_point, monitored_path, vault_client, service, prometheus_labels, metadata_fieldnames)
+        # Copy rather than update the provided labels, as they are shared with the other monitors of the service
+        super().__init__(mount_point, monitored_path, vault_client, service, {**(prometheus_labels or {}), "entity_name": name}, metadata_fieldnames, options)
 
     def get_expiration_info(self) -> ExpirationMetadata:
         """
         Returns a URL for the entity being monitored
         """
-        response = requests.get(
+        response = self.vault_client.session.get(
             f"{self.vault_client.url}/v1/identity/entity/id/{self.monitored_path}",
-            headers={"X-Vault-Namespace": self.vault_client.adapter.namespace, "X-Vault-Token": self.vault_client.token},
-            timeout=TIMEOUT,
+            headers=get_request_headers(self.vault_client, self.namespace),
+            timeout=get_request_timeout(self.vault_client),
         )
         response.raise_for_status()
 
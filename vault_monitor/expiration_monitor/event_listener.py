@@ -0,0 +1,132 @@
+"""
+Event-driven refreshing of secret monitors, based on the event notifications published by Vault.
+"""
+import json
+import logging
+from threading import Event, Thread
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+import hvac
+from requests.utils import select_proxy
+
+from vault_monitor.common.monitor_registry import MonitorRegistry
+from vault_monitor.common.update_engine import UpdateEngine
+from vault_monitor.common.websocket import WebSocketConnection
+from vault_monitor.expiration_monitor.expiration_monitor import get_qualified_mount_point
+from vault_monitor.expiration_monitor.secret_expiration_monitor import SecretExpirationMonitor
+
+LOGGER = logging.getLogger("event_listener")
+
+DEFAULT_EVENT_TYPE = "kv-v2/*"
+
+
+def get_secret_from_event(event: Dict[str, Any]) -> Optional[Tuple[Optional[str], str, str]]:
+    """
+    Returns the namespace, mount point and secret path a KV2 event refers to, or None if it doesn't refer to a secret.
+
+    The namespace is None if the event doesn't include it (i.e. the namespace of the subscription), and empty for the root namespace.
+    The event path includes the API prefix, e.g. secret/data/some/secret or secret/metadata/some/secret.
+    """
+    data = event.get("data") or {}
+    mount_path = ((data.get("plugin_info") or {}).get("mount_path") or "").strip("/")
+    event_path = (((data.get("event") or {}).get("metadata") or {}).get("path") or "").strip("/")
+    if not mount_path or not event_path.startswith(f"{mount_path}/"):
+        return None
+
+    # Drop the API prefix (data/, metadata/, delete/, ...) to get the secret path
+    _, _, secret_path = event_path[len(mount_path) + 1 :].partition("/")
+    if not secret_path:
+        return None
+    namespace = data.get("namespace")
+    return namespace.strip("/") if namespace is not None else None, mount_path, secret_path
+
+
+class SecretEventListener(Thread):
+    """
+    Daemon thread subscribing to Vault's KV2 event notifications, refreshing only the secret monitors whose secrets changed.
+
+    If namespaces is provided, the events of the namespaces matching those patterns (relative to the namespace of the client, e.g. * for all child namespaces) are subscribed to as well.
+    The connection is re-established after failures, waiting reconnect_delay seconds in between.
+    """
+
+    def __init__(
+        self,
+        vault_client: hvac.Client,
+        registry: MonitorRegistry,
+        update_engine: UpdateEngine,
+        event_type: str = DEFAULT_EVENT_TYPE,
+        reconnect_delay: float = 5,
+        namespaces: Optional[List[str]] = None,
+    ) -> None:
+        super().__init__(name="secret_event_listener", daemon=True)
+        self.vault_client = vault_client
+        self.registry = registry
+        self.update_engine = update_engine
+        self.reconnect_delay = reconnect_delay
+        query = urlencode({"json": "true", **({"namespaces": namespaces} if namespaces else {})}, doseq=True, safe="*/")
+        self.subscription_path = f"sys/events/subscribe/{event_type}?{query}"
+        self._stop_event = Event()
+        self._connection: Optional[WebSocketConnection] = None
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                self.listen()
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.exception("Lost subscription to Vault events, reconnecting in %s seconds.", self.reconnect_delay)
+            self._stop_event.wait(self.reconnect_delay)
+
+    def listen(self) -> None:
+        """
+        Subscribes to the events and handles them until the connection is closed.
+        """
+        headers = {"X-Vault-Token": self.vault_client.token}
+        if self.vault_client.adapter.namespace:
+            headers["X-Vault-Namespace"] = self.vault_client.adapter.namespace
+        url = f"{self.vault_client.url}/v1/{self.subscription_path}"
+        # Connect through the same proxy (including the proxy environment variables) and with the same client certificate as the requests to Vault
+        settings = self.vault_client.session.merge_environment_settings(url, {}, None, self.vault_client.session.verify, None)
+        self._connection = WebSocketConnection(url, headers=headers, verify=settings["verify"], proxy=select_proxy(url, settings["proxies"]), cert=settings["cert"])
+        self._connection.connect()
+        LOGGER.info("Subscribed to Vault events with %s", self.subscription_path)
+
+        while True:
+            message = self._connection.receive()
+            if message is None:
+                LOGGER.info("Vault closed the event subscription.")
+                return
+            self.handle_message(message)
+
+    def handle_message(self, message: str) -> List[SecretExpirationMonitor]:
+        """
+        Refreshes the monitors for the secret an event refers to, returning the refreshed monitors.
+        """
+        try:
+            secret = get_secret_from_event(json.loads(message))
+        except (ValueError, AttributeError):
+            LOGGER.warning("Ignoring malformed Vault event: %s", message)
+            return []
+        if secret is None:
+            return []
+
+        namespace, mount_point, secret_path = secret
+        # Monitors without a namespace of their own, like events without one, are in the namespace of the client
+        client_namespace = (self.vault_client.adapter.namespace or "").strip("/")
+        if namespace is None:
+            namespace = client_namespace
+        # The index keeps monitors without a namespace of their own under None
+        monitors = self.registry.get_monitors_by_event_key((None, mount_point, secret_path)) if namespace == client_namespace else []
+        monitors += self.registry.get_monitors_by_event_key((namespace, mount_point, secret_path))
+        if monitors:
+            LOGGER.debug("Secret %s/%s changed, refreshing %d monitor(s).", get_qualified_mount_point(mount_point, namespace), secret_path, len(monitors))
+            self.update_engine.run_cycle(monitors)
+        return monitors
+
+    def stop(self) -> None:
+        """
+        Stops listening to events.
+        """
+        self._stop_event.set()
+        if self._connection is not None:
+            self._connection.close()
@@ -1,52 +1,206 @@
 """
 Class for monitoring expiration information in HashiCorp Vault.
 """
+import logging
+import sys
 from abc import ABC, abstractmethod
-from typing import Dict, List, Type, TypeVar
+from typing import Any, ClassVar, Dict, Hashable, List, NamedTuple, Optional, Tuple, Type, TypeVar
 
 import hvac
+import requests
 from prometheus_client import Gauge
 
 from vault_monitor.expiration_monitor.vault_time import ExpirationMetadata
 
 ExpirationMonitorType = TypeVar("ExpirationMonitorType", bound="ExpirationMonitor")  # pylint: disable=invalid-name
 
+LOGGER = logging.getLogger("expiration_monitor")
 
-class ExpirationMonitor(ABC):
+# Label keys and metadata fieldnames are identical for most monitors, so a single copy of each is shared between them
+_SHARED_VALUES: Dict[Hashable, Any] = {}
+
+
+def share(value: Hashable) -> Any:
+    """
+    Returns a single shared instance of an immutable value (e.g. a tuple of label keys), strings are interned.
+    """
+    if type(value) is str:  # pylint: disable=unidiomatic-typecheck
+        return sys.intern(value)
+    return _SHARED_VALUES.setdefault(value, value)
+
+
+def get_qualified_mount_point(mount_point: str, namespace: Optional[str] = None) -> str:
+    """
+    Returns the mount point prefixed with the path of its namespace, as it identifies the mount across namespaces.
+    """
+    return f"{namespace}/{mount_point}" if namespace else mount_point
+
+
+class MonitorOptions(NamedTuple):
+    """
+    Options of a monitor which don't identify what it monitors, usually the same for all monitors of a service.
+
+    export_series sets whether the monitor exposes its own series, aggregate whether it is included in the per service summary metrics.
+    namespace is the Vault namespace the monitored object is in, by default the namespace of the client.
+    """
+
+    export_series: bool = True
+    aggregate: bool = False
+    namespace: Optional[str] = None
+
+
+DEFAULT_OPTIONS = MonitorOptions()
+
+
+# Each attribute is a slot, and the expiration information, labels and series are all needed per monitor
+class ExpirationMonitor(ABC):  # pylint: disable=too-many-instance-attributes
     """
     Monitors and updates custom metadata in HashiCorp Vault for expiration based on custom metadata.
     """
 
-    secret_last_renewal_timestamp_gauge: Gauge
-    secret_expiration_timestamp_gauge: Gauge
+    # Class level only, so that they don't need a slot: the gauges are shared by all monitors of a type, and the names are set by each type
+    secret_last_renewal_timestamp_gauge: ClassVar[Gauge]
+    secret_expiration_timestamp_gauge: ClassVar[Gauge]
+    last_successful_update_timestamp_gauge: ClassVar[Gauge]
+
+    last_renewal_gauge_name: ClassVar[str]
+    last_renewal_gauge_description: ClassVar[str]
+    expiration_gauge_name: ClassVar[str]
+    expiration_gauge_description: ClassVar[str]
+    last_update_gauge_name: ClassVar[str]
+    last_update_gauge_description: ClassVar[str]
+    # Prefixes of the metrics aggregating the monitors of this type, and those over the series limits, see ExpirationSummaryCollector
+    summary_metric_prefix: ClassVar[str]
+    overflow_metric_prefix: ClassVar[str]
 
-    last_renewal_gauge_name: str
-    last_renewal_gauge_description: str
-    expiration_gauge_name: str
-    expiration_gauge_description: str
+    # Exporting hundreds of thousands of secrets means as many monitors, so avoid a __dict__ per instance
+    __slots__ = (
+        "mount_point",
+        "monitored_path",
+        "vault_client",
+        "service",
+        "expiration_info",
+        "_label_keys",
+        "_label_values",
+        "_fieldnames",
+        "_series",
+        "series_suppressed",
+        "options",
+    )
 
-    def __init__(self, mount_point: str, monitored_path: str, vault_client: hvac.Client, service: str, prometheus_labels: Dict[str, str] = None, metadata_fieldnames: Dict[str, str] = None) -> None:
+    def __init__(
+        self,
+        mount_point: str,
+        monitored_path: str,
+        vault_client: hvac.Client,
+        service: str,
+        prometheus_labels: Dict[str, str] = None,
+        metadata_fieldnames: Dict[str, str] = None,
+        options: MonitorOptions = DEFAULT_OPTIONS,
+        path_label: Optional[str] = None,
+    ) -> None:
         """
         Creates an instance of the ExpirationMonitor class.
+
+        options sets whether the monitor exports its series or is aggregated, and the namespace it monitors in, see MonitorOptions.
+        path_label replaces monitored_path as the value of the monitored_path label, e.g. to shorten long paths.
         """
-        self.mount_point = mount_point
+        self.mount_point = share(mount_point)
         self.monitored_path = monitored_path
         self.vault_client = vault_client
-        self.service = service
+        self.service = share(service)
+        # Most recently retrieved expiration information, None until the first successful update
+        self.expiration_info: Optional[ExpirationMetadata] = None
         # Add the secret specific labels to the provided labels
-        self.prometheus_labels = {"monitored_path": monitored_path, "mount_point": mount_point, "service": service}
-
+        labels = {"monitored_path": path_label if path_label is not None else monitored_path, "mount_point": self.mount_point, "service": self.service}
         if prometheus_labels is not None:
-            self.prometheus_labels.update(prometheus_labels)
-
-        prometheus_label_keys = list(self.prometheus_labels.keys())
+            labels.update(prometheus_labels)
+        # The values of the configured labels are already shared by all monitors of a service, as they come from the same configuration
+        self._label_keys: Tuple[str, ...] = share(tuple(labels))
+        self._label_values: Tuple[str, ...] = tuple(labels.values())
 
         if metadata_fieldnames is None:
             metadata_fieldnames = {}
-        self.last_renewed_timestamp_fieldname = metadata_fieldnames.get("last_renewal_timestamp", "last_renewal_timestamp")
-        self.expiration_timestamp_fieldname = metadata_fieldnames.get("expiration_timestamp", "expiration_timestamp")
+        self._fieldnames: Tuple[str, str] = share(
+            (metadata_fieldnames.get("last_renewal_timestamp", "last_renewal_timestamp"), metadata_fieldnames.get("expiration_timestamp", "expiration_timestamp"))
+        )
+        # Gauge children for this monitor's labels, bound on the first successful update so that no series is exposed before the metadata has been read
+        self._series: Optional[Tuple[Gauge, Gauge, Gauge]] = None
+        # Set while the monitor's series are held back by the series limits, see SeriesLimiter
+        self.series_suppressed = False
+        self.options = share(options)
+
+        self.create_metrics(list(self._label_keys))
+
+    @property
+    def export_series(self) -> bool:
+        """
+        Whether the monitor exposes its own series.
+        """
+        return self.options.export_series
+
+    @property
+    def aggregate(self) -> bool:
+        """
+        Whether the monitor is included in the per service summary metrics.
+        """
+        return self.options.aggregate
+
+    @property
+    def namespace(self) -> Optional[str]:
+        """
+        Vault namespace the monitored object is in, None for the namespace of the client.
+        """
+        return self.options.namespace
+
+    @property
+    def prometheus_labels(self) -> Dict[str, str]:
+        """
+        Labels of this monitor's series, including monitored_path, mount_point and service.
+        """
+        return dict(zip(self._label_keys, self._label_values))
 
-        self.create_metrics(prometheus_label_keys)
+    def get_label_value(self, label_key: str) -> Optional[str]:
+        """
+        Returns the value of one of this monitor's labels, or None if it doesn't have the label.
+        """
+        try:
+            return self._label_values[self._label_keys.index(label_key)]
+        except ValueError:
+            return None
+
+    @property
+    def last_renewed_timestamp_fieldname(self) -> str:
+        """
+        Custom metadata field holding the last renewal timestamp.
+        """
+        return self._fieldnames[0]
+
+    @property
+    def expiration_timestamp_fieldname(self) -> str:
+        """
+        Custom metadata field holding the expiration timestamp.
+        """
+        return self._fieldnames[1]
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({get_qualified_mount_point(self.mount_point, self.namespace)}/{self.monitored_path})"
+
+    @classmethod
+    def get_key(cls: Type[ExpirationMonitorType], service: str, mount_point: str, monitored_path: str, namespace: Optional[str] = None) -> Tuple[str, str, str, str]:
+        """
+        Returns the key identifying a monitor of this type, without needing to create it.
+
+        For monitors with their own namespace, the mount point is prefixed with the namespace (see get_qualified_mount_point).
+        """
+        return (cls.__name__, service, get_qualified_mount_point(mount_point, namespace), monitored_path)
+
+    @property
+    def key(self) -> Tuple[str, str, str, str]:
+        """
+        Key identifying this monitor, used to match monitors between discovery runs.
+        """
+        return self.get_key(self.service, self.mount_point, self.monitored_path, self.namespace)
 
     @classmethod
     def create_metrics(cls: Type[ExpirationMonitorType], prometheus_label_keys: List[str]) -> None:
@@ -58,6 +212,8 @@ class ExpirationMonitor(ABC):
             cls.secret_last_renewal_timestamp_gauge = Gauge(cls.last_renewal_gauge_name, cls.last_renewal_gauge_description, prometheus_label_keys)
         if not hasattr(cls, "secret_expiration_timestamp_gauge"):
             cls.secret_expiration_timestamp_gauge = Gauge(cls.expiration_gauge_name, cls.expiration_gauge_description, prometheus_label_keys)
+        if not hasattr(cls, "last_successful_update_timestamp_gauge"):
+            cls.last_successful_update_timestamp_gauge = Gauge(cls.last_update_gauge_name, cls.last_update_gauge_description, prometheus_label_keys)
 
     @abstractmethod
     def get_expiration_info(self) -> ExpirationMetadata:
@@ -68,9 +224,71 @@ class ExpirationMonitor(ABC):
     def update_metrics(self) -> None:
         """
         Update the current value for the metrics.
+
+        If the expiration information can't be retrieved, the metrics keep their last known values and the last successful update timestamp shows how stale they are.
+        """
+
+        try:
+            expiration_info = self.get_expiration_info()
+        except requests.HTTPError as error:
+            # The monitored object was deleted, so stop exposing its series rather than failing
+            if error.response is not None and error.response.status_code == 404:
+                LOGGER.warning("%s no longer exists in Vault, removing its metrics.", self)
+                self.remove_metrics()
+                return
+            raise
+
+        self.expiration_info = expiration_info
+        if not self.export_series or self.series_suppressed:
+            return
+        if self._series is None:
+            labels = self.prometheus_labels
+            self._series = (
+                self.secret_last_renewal_timestamp_gauge.labels(**labels),
+                self.secret_expiration_timestamp_gauge.labels(**labels),
+                self.last_successful_update_timestamp_gauge.labels(**labels),
+            )
+        last_renewal_series, expiration_series, last_update_series = self._series
+        last_renewal_series.set(expiration_info.get_last_renewal_timestamp())
+        expiration_series.set(expiration_info.get_expiration_timestamp())
+        last_update_series.set_to_current_time()
+
+    def remove_metrics(self) -> None:
+        """
+        Remove the series for this monitor from the metrics, e.g. when the monitored object has been deleted.
         """
+        self._series = None
+        for gauge in [self.secret_last_renewal_timestamp_gauge, self.secret_expiration_timestamp_gauge, self.last_successful_update_timestamp_gauge]:
+            try:
+                gauge.remove(*self._label_values)
+            except KeyError:
+                # The series was never set (or already removed)
+                pass
 
-        expiration_info = self.get_expiration_info()
+    def restore_expiration_info(self, last_renewal_timestamp: float, expiration_timestamp: float) -> None:
+        """
+        Sets the expiration information from previously stored values (e.g. a snapshot), unless the monitor has been updated already.
+
+        The series are set right away, except for the last successful update timestamp which is only set by an actual update.
+        """
+        if self.expiration_info is not None:
+            return
+        self.expiration_info = ExpirationMetadata(last_renewal_timestamp, expiration_timestamp, *self._fieldnames)
+        if self.export_series and not self.series_suppressed:
+            labels = self.prometheus_labels
+            self.secret_last_renewal_timestamp_gauge.labels(**labels).set(last_renewal_timestamp)
+            self.secret_expiration_timestamp_gauge.labels(**labels).set(expiration_timestamp)
+
+    def suppress_series(self) -> None:
+        """
+        Stops exposing the series for this monitor, while still reading its expiration information.
+        """
+        if not self.series_suppressed:
+            self.series_suppressed = True
+            self.remove_metrics()
 
-        self.secret_last_renewal_timestamp_gauge.labels(**self.prometheus_labels).set(expiration_info.get_last_renewal_timestamp())
-        self.secret_expiration_timestamp_gauge.labels(**self.prometheus_labels).set(expiration_info.get_expiration_timestamp())
+    def restore_series(self) -> None:
+        """
+        Exposes the series for this monitor again, starting from its next update.
+        """
+        self.series_suppressed = False
@@ -0,0 +1,82 @@
+"""
+Reads manifests of secrets to update with the set_expiration script, in YAML, CSV or NDJSON format.
+"""
+import csv
+import json
+from typing import Dict, Iterator, Optional, TextIO, Tuple
+
+import yaml
+from cerberus import Validator
+
+MANIFEST_FORMATS = ["yaml", "csv", "ndjson"]
+
+MANIFEST_ENTRY_SCHEMA = {
+    "mount_point": {"type": "string", "required": True, "empty": False, "meta": {"description": "Mount point of kv2 engine, e.g. secret"}},
+    "secret_path": {"type": "string", "required": True, "empty": False, "meta": {"description": "Path to secret, e.g. some/secret"}},
+    "weeks": {"type": "integer", "coerce": int, "min": 0, "meta": {"description": "Number of weeks before expiration."}},
+    "days": {"type": "integer", "coerce": int, "min": 0, "meta": {"description": "Number of days before expiration."}},
+    "hours": {"type": "integer", "coerce": int, "min": 0, "meta": {"description": "Number of hours before expiration."}},
+    "minutes": {"type": "integer", "coerce": int, "min": 0, "meta": {"description": "Number of minutes before expiration."}},
+    "seconds": {"type": "integer", "coerce": int, "min": 0, "meta": {"description": "Number of seconds before expiration."}},
+    "last_renewed_timestamp_fieldname": {"type": "string", "empty": False, "meta": {"description": "Fieldname to use for the last renewed timestamp."}},
+    "expiration_timestamp_fieldname": {"type": "string", "empty": False, "meta": {"description": "Fieldname to use for the expiration timestamp."}},
+}
+
+
+def get_manifest_format(filename: str) -> Optional[str]:
+    """
+    Returns the manifest format matching the extension of filename, if any.
+    """
+    extension = filename.rsplit(".", 1)[-1].lower()
+    if extension in ["yaml", "yml"]:
+        return "yaml"
+    if extension in ["ndjson", "jsonl"]:
+        return "ndjson"
+    if extension == "csv":
+        return "csv"
+    return None
+
+
+def read_manifest(stream: TextIO, manifest_format: str) -> Iterator[Tuple[Dict, Optional[str]]]:
+    """
+    Yields every entry of the manifest, along with a description of why it is invalid (or None if it is valid).
+
+    Values missing from an entry are left out, so that defaults can be applied by the caller.
+    """
+    validator = Validator(MANIFEST_ENTRY_SCHEMA)
+    for entry in _read_entries(stream, manifest_format):
+        if isinstance(entry, ValueError):
+            yield {}, f"Malformed entry: {entry}"
+            continue
+        if not isinstance(entry, dict):
+            yield {}, f"Entry must be a mapping, got {entry!r}"
+            continue
+        # Empty CSV cells mean the value isn't set
+        entry = {key: value for key, value in entry.items() if value not in [None, ""]}
+        if validator.validate(entry):
+            yield validator.document, None
+        else:
+            yield entry, str(validator.errors)
+
+
+def _read_entries(stream: TextIO, manifest_format: str) -> Iterator:
+    """
+    Yields the raw entries of the manifest, NDJSON lines which can't be parsed are yielded as the ValueError raised for them.
+    """
+    if manifest_format == "yaml":
+        entries = yaml.safe_load(stream) or []
+        if not isinstance(entries, list):
+            raise ValueError("YAML manifest must contain a list of entries.")
+        yield from entries
+    elif manifest_format == "csv":
+        yield from csv.DictReader(stream)
+    elif manifest_format == "ndjson":
+        for line in stream:
+            if line.strip():
+                # A malformed line only invalidates its own entry, rather than the rest of the manifest
+                try:
+                    yield json.loads(line)
+                except ValueError as error:
+                    yield error
+    else:
+        raise ValueError(f"Unsupported manifest format {manifest_format}, must be one of {MANIFEST_FORMATS}.")
@@ -2,32 +2,45 @@
 Class for monitoring secret (KV2) expiration information in HashiCorp Vault.
 """
 
-import requests
+from typing import Optional, Tuple
 
+from vault_monitor.common.vault_namespaces import get_request_headers
+from vault_monitor.common.vault_session import get_request_timeout
 from vault_monitor.expiration_monitor.expiration_monitor import ExpirationMonitor
 from vault_monitor.expiration_monitor.vault_time import ExpirationMetadata
 
-TIMEOUT = 60
-
 
 class SecretExpirationMonitor(ExpirationMonitor):
     """
     Class for monitoring KV2 secrets
     """
 
+    __slots__ = ()
+
     last_renewal_gauge_name = "vault_secret_last_renewal_timestamp"
     last_renewal_gauge_description = "Timestamp for when a secret was last updated."
     expiration_gauge_name = "vault_secret_expiration_timestamp"
     expiration_gauge_description = "Timestamp for when a secret should expire."
+    last_update_gauge_name = "vault_secret_last_successful_update_timestamp"
+    last_update_gauge_description = "Timestamp for when a secret's expiration metadata was last read from Vault successfully."
+    summary_metric_prefix = "vault_secret_summary"
+    overflow_metric_prefix = "vault_secret_overflow"
+
+    @property
+    def event_key(self) -> Tuple[Optional[str], str, str]:
+        """
+        Namespace (None for the namespace of the client), mount point and path of the secret, as found in the events Vault publishes when it changes.
+        """
+        return self.namespace.strip("/") if self.namespace is not None else None, self.mount_point.strip("/"), self.monitored_path.strip("/")
 
     def get_expiration_info(self) -> ExpirationMetadata:
         """
         Returns a URL for the secret being monitored
         """
-        response = requests.get(
+        response = self.vault_client.session.get(
             f"{self.vault_client.url}/v1/{self.mount_point}/metadata/{self.monitored_path}",
-            headers={"X-Vault-Namespace": self.vault_client.adapter.namespace, "X-Vault-Token": self.vault_client.token},
-            timeout=TIMEOUT,
+            headers=get_request_headers(self.vault_client, self.namespace),
+            timeout=get_request_timeout(self.vault_client),
         )
         response.raise_for_status()
 
@@ -0,0 +1,112 @@
+"""
+Limits on the number of monitors exposing their own series, so that a single misconfigured recursive path can't flood Prometheus.
+"""
+import hashlib
+import heapq
+import logging
+from collections import defaultdict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from vault_monitor.common.exporter_metrics import SERIES_LIMIT_EXCEEDED_GAUGE, SUPPRESSED_MONITORS_GAUGE
+
+LOGGER = logging.getLogger("series_limiter")
+
+GLOBAL_SCOPE = "global"
+PATH_LABEL_MODES = ["full", "truncate", "hash"]
+DEFAULT_PATH_LABEL_LENGTH = 64
+# Length of the hash of the monitored path used by the hash mode, and appended to truncated paths so they stay unique
+PATH_HASH_LENGTH = 16
+TRUNCATED_HASH_LENGTH = 8
+
+
+def get_expiry_rank(monitor: Any) -> Tuple[float, Hashable]:
+    """
+    Sort key putting the soonest expiring monitors first, monitors without expiration information last.
+    """
+    expiration_info = monitor.expiration_info
+    return (expiration_info.get_expiration_timestamp() if expiration_info is not None else float("inf"), monitor.key)
+
+
+class SeriesLimiter:
+    """
+    Keeps the number of monitors exposing their own series within a global limit and limits per service.
+
+    When a limit is exceeded, only the soonest expiring monitors (based on their last known expiration information) keep their series.
+    The series of the others are suppressed, they are still updated and are aggregated as an overflow bucket by ExpirationSummaryCollector.
+    With several Vault targets, each target has its own limiter, with vault_target the name of the target (the global limit applies to the target).
+    """
+
+    def __init__(self, global_limit: Optional[int] = None, service_limits: Optional[Dict[str, int]] = None, vault_target: str = "") -> None:
+        self.global_limit = global_limit
+        self.service_limits = service_limits or {}
+        self.vault_target = vault_target
+        self._exceeded: Set[str] = set()
+
+    @property
+    def enabled(self) -> bool:
+        """
+        Whether any limit is configured.
+        """
+        return self.global_limit is not None or bool(self.service_limits)
+
+    def apply(self, monitors: Iterable[Any]) -> int:
+        """
+        Suppresses or restores the series of the monitors to stay within the limits, returning the number of monitors suppressed.
+        """
+        candidates = [monitor for monitor in monitors if monitor.export_series]
+        by_service: Dict[str, List[Any]] = defaultdict(list)
+        for monitor in candidates:
+            by_service[monitor.service].append(monitor)
+
+        exceeded = set()
+        selected: List[Any] = []
+        for service, service_monitors in by_service.items():
+            limit = self.service_limits.get(service)
+            if limit is not None and len(service_monitors) > limit:
+                exceeded.add(service)
+                service_monitors = heapq.nsmallest(limit, service_monitors, key=get_expiry_rank)
+            selected += service_monitors
+        if self.global_limit is not None and len(selected) > self.global_limit:
+            exceeded.add(GLOBAL_SCOPE)
+            selected = heapq.nsmallest(self.global_limit, selected, key=get_expiry_rank)
+
+        selected_ids = {id(monitor) for monitor in selected}
+        suppressed: Dict[str, int] = defaultdict(int)
+        for monitor in candidates:
+            if id(monitor) in selected_ids:
+                monitor.restore_series()
+            else:
+                monitor.suppress_series()
+                suppressed[monitor.service] += 1
+
+        self._record(exceeded, suppressed, by_service)
+        return len(candidates) - len(selected)
+
+    def _record(self, exceeded: Set[str], suppressed: Dict[str, int], by_service: Dict[str, List[Any]]) -> None:
+        for scope in exceeded - self._exceeded:
+            LOGGER.warning("Series limit exceeded for %s%s, only the soonest expiring secrets keep their series.", scope, self._get_target_suffix())
+        for scope in self._exceeded - exceeded:
+            LOGGER.info("Series limit no longer exceeded for %s%s.", scope, self._get_target_suffix())
+        self._exceeded = exceeded
+
+        for scope in [GLOBAL_SCOPE, *self.service_limits]:
+            SERIES_LIMIT_EXCEEDED_GAUGE.labels(vault_target=self.vault_target, scope=scope).set(1 if scope in exceeded else 0)
+        for service in by_service:
+            SUPPRESSED_MONITORS_GAUGE.labels(vault_target=self.vault_target, service=service).set(suppressed.get(service, 0))
+
+    def _get_target_suffix(self) -> str:
+        return f" on {self.vault_target}" if self.vault_target else ""
+
+
+def get_path_label(monitored_path: str, mode: str = "full", max_length: int = DEFAULT_PATH_LABEL_LENGTH) -> str:
+    """
+    Returns the value of the monitored_path label for a path.
+
+    truncate cuts paths longer than max_length, ending them in a short hash of the full path so that they stay unique, hash replaces the path with a hash.
+    """
+    if mode == "hash":
+        return hashlib.sha256(monitored_path.encode("utf-8")).hexdigest()[:PATH_HASH_LENGTH]
+    if mode == "truncate" and len(monitored_path) > max_length:
+        digest = hashlib.sha256(monitored_path.encode("utf-8")).hexdigest()[:TRUNCATED_HASH_LENGTH]
+        return f"{monitored_path[:max_length - TRUNCATED_HASH_LENGTH - 1]}~{digest}"
+    return monitored_path
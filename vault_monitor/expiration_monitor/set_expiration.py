@@ -2,18 +2,29 @@
 Updates the last-updated and expiration date-time fields for a given secret
 """
 
+import json
 import logging
 import argparse
+import sys
 import warnings
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple, TypeVar
 
+import hvac
 import requests
 
+from vault_monitor.common.rate_limit import RateLimiter
+from vault_monitor.common.retry import RetryPolicy
 from vault_monitor.common.vault_authenticate import get_vault_client_for_user
+from vault_monitor.common.vault_session import DEFAULT_CONNECT_TIMEOUT, DEFAULT_POOL_SIZE, DEFAULT_READ_TIMEOUT, configure_connection_pool
 from vault_monitor.expiration_monitor.vault_time import ExpirationMetadata
-from vault_monitor.expiration_monitor.create_monitors import recurse_secrets
+from vault_monitor.expiration_monitor.create_monitors import iter_secrets
+from vault_monitor.expiration_monitor.manifest import MANIFEST_FORMATS, get_manifest_format, read_manifest
 
 LOGGER = logging.getLogger("set_expiration")
-TIMEOUT = 60
+PROGRESS_INTERVAL = 100
+
+T = TypeVar("T")
 
 # Disable certain things for scripts only, as over-doing the DRY-ness of them can cause them to be less useful as samples
 # pylint: disable=duplicate-code,too-many-arguments,too-many-locals
@@ -25,10 +36,16 @@ def handle_args() -> argparse.Namespace:
     """
     parser = argparse.ArgumentParser(description="Update a kv2 secret with expiration metadata.")
 
-    parser.add_argument("mount_point", type=str, help="Mount point of kv2 engine, e.g. secret")
-    parser.add_argument("secret_path", type=str, help="Path to secret, e.g. some/secret")
+    parser.add_argument("mount_point", type=str, nargs="?", help="Mount point of kv2 engine, e.g. secret")
+    parser.add_argument("secret_path", type=str, nargs="?", help="Path to secret, e.g. some/secret")
 
     parser.add_argument("--recursive", action="store_true", help="Recursively set expiration")
+    parser.add_argument("--discovery_concurrency", type=int, default=1, help="Maximum number of LIST calls in flight while recursively discovering secrets.")
+    parser.add_argument("--connect_timeout", type=float, default=DEFAULT_CONNECT_TIMEOUT, help="Seconds to wait for a connection to Vault to be established.")
+    parser.add_argument("--read_timeout", type=float, default=DEFAULT_READ_TIMEOUT, help="Seconds to wait for Vault to send a response.")
+    parser.add_argument("--max_retries", type=int, default=3, help="Number of times a request is retried after a timeout, connection error or 5xx response.")
+    parser.add_argument("--rate_limit", type=float, default=None, help="Maximum number of requests per second sent to Vault.")
+    parser.add_argument("--workers", type=int, default=1, help="Number of secrets updated in parallel when used with --recursive or --manifest.")
 
     parser.add_argument(
         "-l",
@@ -39,6 +56,13 @@ def handle_args() -> argparse.Namespace:
         help="Set the log level.",
     )
 
+    manifest_group = parser.add_argument_group(
+        title="Manifest", description="Update every secret listed in a manifest instead of mount_point and secret_path, see the documentation for the manifest format."
+    )
+    manifest_group.add_argument("--manifest", type=argparse.FileType("r", encoding="UTF-8"), default=None, help="Manifest file, or - to read it from stdin.")
+    manifest_group.add_argument("--manifest_format", type=str, default=None, choices=MANIFEST_FORMATS, help="Format of the manifest (defaults to guessing from the file extension).")
+    manifest_group.add_argument("--results", type=argparse.FileType("w", encoding="UTF-8"), default="-", help="File to write the result of every manifest entry to as NDJSON, defaults to stdout.")
+
     vault_group = parser.add_argument_group(title="Vault configuration")
     vault_group.add_argument("--address", type=str, default=None, help="Sets the Vault address (defaults to checking $VAULT_ADDR).")
     vault_group.add_argument("--namespace", type=str, default=None, help="Sets the Vault namespace (defaults to checking $VAULT_NAMESPACE).")
@@ -56,7 +80,16 @@ def handle_args() -> argparse.Namespace:
     fieldnames_group.add_argument("--last_renewed_timestamp_fieldname", default="last_renewal_timestamp", type=str, help="Set the fieldname to use for the last renewed timestamp.")
     fieldnames_group.add_argument("--expiration_timestamp_fieldname", default="expiration_timestamp", type=str, help="Set the fieldname to use for the expiration timestamp.")
 
-    return parser.parse_args()
+    args = parser.parse_args()
+
+    if args.manifest is None and (args.mount_point is None or args.secret_path is None):
+        parser.error("mount_point and secret_path are required unless --manifest is used.")
+    if args.manifest is not None and args.manifest_format is None:
+        args.manifest_format = get_manifest_format(args.manifest.name)
+        if args.manifest_format is None:
+            parser.error("--manifest_format is required when it can't be guessed from the manifest file extension.")
+
+    return args
 
 
 def set_expiration(
@@ -72,58 +105,178 @@ def set_expiration(
     vault_client_token: str,
     last_renewed_timestamp_fieldname: str = "last_renewal_timestamp",
     expiration_timestamp_fieldname: str = "expiration_timestamp",
-) -> None:
+    session: Optional[requests.Session] = None,
+    use_patch: bool = True,
+    timeout: Tuple[float, float] = (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT),
+) -> bool:
     """
     Sets expiration metadadate for specified secret.
+
+    Requests are sent through session if provided, allowing connections to be reused across secrets.
+    The (connect, read) timeout is replaced by the one configured for the connection pool of the session, if it has one (see configure_connection_pool).
+    Returns whether Vault supports PATCH for metadata, when it does not (or use_patch is False) the slower GET+PUT is used instead.
     """
+    # Custom metadata isn't fully supported by hvac at the moment, use requests
+    http = session if session is not None else requests
 
     expiration_info = ExpirationMetadata.from_duration(weeks, days, hours, minutes, seconds, last_renewed_timestamp_fieldname, expiration_timestamp_fieldname)
 
-    LOGGER.info("Updating expiration data for secret.")
+    LOGGER.debug("Updating expiration data for secret %s/%s.", mount_point, secret_path)
 
-    # Custom metadata isn't fully supported by hvac at the moment, use requests
-    response = requests.patch(
-        f"{vault_client_url}/v1/{mount_point}/metadata/{secret_path}",
-        headers={"X-Vault-Namespace": vault_client_namespace, "X-Vault-Token": vault_client_token, "Content-Type": "application/merge-patch+json"},
-        json={"custom_metadata": expiration_info.get_serialized_expiration_metadata()},
-        timeout=TIMEOUT,
-    )
+    if use_patch:
+        response = http.patch(
+            f"{vault_client_url}/v1/{mount_point}/metadata/{secret_path}",
+            headers={"X-Vault-Namespace": vault_client_namespace, "X-Vault-Token": vault_client_token, "Content-Type": "application/merge-patch+json"},
+            json={"custom_metadata": expiration_info.get_serialized_expiration_metadata()},
+            timeout=timeout,
+        )
+        if response.status_code != 405:
+            response.raise_for_status()
+            return True
 
-    if response.status_code == 405:
         warnings.warn(
             "Received 405 error when attempting to PATCH metadata, using GET+PUT instead. This indicates an older version of Vault is in use (<10), support will eventually be dropped from this tool.",
             DeprecationWarning,
         )
-        response = requests.get(
-            f"{vault_client_url}/v1/{mount_point}/metadata/{secret_path}",
-            headers={"X-Vault-Namespace": vault_client_namespace, "X-Vault-Token": vault_client_token, "Content-Type": "application/merge-patch+json"},
-            timeout=TIMEOUT,
-        )
-        response.raise_for_status()
 
-        # Take the existing metadata, clean up what we don't control, update it and then push it
-        metadata = response.json()
+    response = http.get(
+        f"{vault_client_url}/v1/{mount_point}/metadata/{secret_path}",
+        headers={"X-Vault-Namespace": vault_client_namespace, "X-Vault-Token": vault_client_token, "Content-Type": "application/merge-patch+json"},
+        timeout=timeout,
+    )
+    response.raise_for_status()
 
-        # When no custom_metadata is set, Vault will return None, so we have to set up an empty dictionary
-        if not metadata["data"]["custom_metadata"]:
-            metadata["data"]["custom_metadata"] = {}
+    # Take the existing metadata, clean up what we don't control, update it and then push it
+    metadata = response.json()
 
-        metadata["data"]["custom_metadata"].update(expiration_info.get_serialized_expiration_metadata())
-        metadata = metadata["data"]
-        del metadata["created_time"]
-        del metadata["current_version"]
-        del metadata["oldest_version"]
-        del metadata["updated_time"]
-        del metadata["versions"]
+    # When no custom_metadata is set, Vault will return None, so we have to set up an empty dictionary
+    if not metadata["data"]["custom_metadata"]:
+        metadata["data"]["custom_metadata"] = {}
 
-        response = requests.put(
-            f"{vault_client_url}/v1/{mount_point}/metadata/{secret_path}",
-            headers={"X-Vault-Namespace": vault_client_namespace, "X-Vault-Token": vault_client_token},
-            json=metadata,
-            timeout=TIMEOUT,
-        )
+    metadata["data"]["custom_metadata"].update(expiration_info.get_serialized_expiration_metadata())
+    metadata = metadata["data"]
+    del metadata["created_time"]
+    del metadata["current_version"]
+    del metadata["oldest_version"]
+    del metadata["updated_time"]
+    del metadata["versions"]
+
+    response = http.put(
+        f"{vault_client_url}/v1/{mount_point}/metadata/{secret_path}",
+        headers={"X-Vault-Namespace": vault_client_namespace, "X-Vault-Token": vault_client_token},
+        json=metadata,
+        timeout=timeout,
+    )
 
     response.raise_for_status()
+    return False
+
+
+def set_expiration_bulk(
+    secrets: Iterable[T], update_secret: Callable[[T, bool], bool], workers: int = 1, report: Optional[Callable[[T, Optional[BaseException]], None]] = None
+) -> Tuple[int, List[Tuple[T, str]]]:
+    """
+    Updates every secret with update_secret(secret, use_patch), with up to workers updates in flight at once.
+
+    secrets is consumed lazily, so updates start while it is still being discovered.
+    Secrets are updated one at a time until one succeeds, to find out once whether Vault supports PATCH for metadata.
+    If provided, report is called (from the calling thread) with every secret and the exception it failed with, or None.
+    Returns the number of updated secrets and the error for every secret which could not be updated.
+    """
+    secrets_iterator = iter(secrets)
+    updated = 0
+    errors: List[Tuple[T, str]] = []
+
+    def record(secret: T, exception: Optional[BaseException]) -> None:
+        nonlocal updated
+        if exception is None:
+            updated += 1
+        else:
+            LOGGER.debug("Failed to update %s.", secret, exc_info=exception)
+            errors.append((secret, str(exception)))
+        if report is not None:
+            report(secret, exception)
+        if (updated + len(errors)) % PROGRESS_INTERVAL == 0:
+            LOGGER.info("Processed %d secrets, %d failed.", updated + len(errors), len(errors))
+
+    use_patch = True
+    for secret in secrets_iterator:
+        try:
+            use_patch = update_secret(secret, True)
+        except Exception as exception:  # pylint: disable=broad-except
+            record(secret, exception)
+            continue
+        record(secret, None)
+        break
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="set_expiration") as executor:
+        pending: Dict[Future, T] = {}
+
+        def collect() -> None:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                record(pending.pop(future), future.exception())
+
+        for secret in secrets_iterator:
+            # Bound the number of queued updates, so discovery doesn't run arbitrarily far ahead
+            if len(pending) >= 2 * workers:
+                collect()
+            pending[executor.submit(update_secret, secret, use_patch)] = secret
+        while pending:
+            collect()
+
+    return updated, errors
+
+
+def set_expiration_from_manifest(manifest: TextIO, manifest_format: str, results: TextIO, vault_client: hvac.Client, defaults: argparse.Namespace, workers: int = 1) -> Tuple[int, int]:
+    """
+    Updates every secret listed in the manifest, writing the result of every entry to results as NDJSON.
+
+    Duration and fieldnames missing from an entry are taken from defaults (the parsed arguments).
+    Returns the number of updated and failed entries (including invalid ones).
+    """
+    invalid = 0
+
+    def write_result(entry_number: int, entry: Dict, error: Optional[str]) -> None:
+        result = {"entry": entry_number, "mount_point": entry.get("mount_point"), "secret_path": entry.get("secret_path"), "status": "failed" if error else "updated"}
+        if error:
+            result["error"] = error
+        results.write(json.dumps(result) + "\n")
+        results.flush()
+
+    def valid_entries() -> Iterator[Tuple[int, Dict]]:
+        nonlocal invalid
+        for entry_number, (entry, error) in enumerate(read_manifest(manifest, manifest_format), start=1):
+            if error:
+                invalid += 1
+                write_result(entry_number, entry, f"Invalid entry: {error}")
+            else:
+                yield entry_number, entry
+
+    def update_entry(numbered_entry: Tuple[int, Dict], use_patch: bool) -> bool:
+        _, entry = numbered_entry
+        return set_expiration(
+            entry["mount_point"],
+            entry["secret_path"],
+            entry.get("weeks", defaults.weeks),
+            entry.get("days", defaults.days),
+            entry.get("hours", defaults.hours),
+            entry.get("minutes", defaults.minutes),
+            entry.get("seconds", defaults.seconds),
+            vault_client.url,
+            vault_client.adapter.namespace,
+            vault_client.token,
+            entry.get("last_renewed_timestamp_fieldname", defaults.last_renewed_timestamp_fieldname),
+            entry.get("expiration_timestamp_fieldname", defaults.expiration_timestamp_fieldname),
+            session=vault_client.session,
+            use_patch=use_patch,
+        )
+
+    def report(numbered_entry: Tuple[int, Dict], exception: Optional[BaseException]) -> None:
+        write_result(*numbered_entry, str(exception) if exception is not None else None)
+
+    updated, errors = set_expiration_bulk(valid_entries(), update_entry, workers=workers, report=report)
+    return updated, len(errors) + invalid
 
 
 def main() -> None:
@@ -138,13 +291,29 @@ def main() -> None:
     # configure logging level
     logging.basicConfig(level=args.logging)
 
-    if args.recursive:
-        secrets = recurse_secrets(args.mount_point, args.secret_path, vault_client)
+    # Share a pool of kept-alive connections between the discovery and update threads
+    configure_connection_pool(
+        vault_client,
+        pool_size=max(DEFAULT_POOL_SIZE, args.workers + args.discovery_concurrency),
+        keep_alive=True,
+        rate_limiter=RateLimiter(rate=args.rate_limit),
+        retry_policy=RetryPolicy(max_retries=args.max_retries),
+        timeout=(args.connect_timeout, args.read_timeout),
+    )
 
-        for secret in secrets:
-            set_expiration(
+    if args.manifest is not None:
+        updated, failed = set_expiration_from_manifest(args.manifest, args.manifest_format, args.results, vault_client, args, workers=args.workers)
+
+        LOGGER.info("Updated expiration data for %d manifest entries, %d failed.", updated, failed)
+        if failed:
+            sys.exit(1)
+
+    elif args.recursive:
+
+        def update_secret(secret: str, use_patch: bool) -> bool:
+            return set_expiration(
                 args.mount_point,
-                secret[1:],  # Drop the '/' at the beginning of the result
+                secret[1:] if secret[0] == "/" else secret,  # Drop the '/' at the beginning of results from the root of the mount
                 args.weeks,
                 args.days,
                 args.hours,
@@ -155,8 +324,19 @@ def main() -> None:
                 vault_client.token,
                 args.last_renewed_timestamp_fieldname,
                 args.expiration_timestamp_fieldname,
+                session=vault_client.session,
+                use_patch=use_patch,
             )
 
+        secrets = iter_secrets(args.mount_point, args.secret_path, vault_client, max_concurrency=args.discovery_concurrency)
+        updated, errors = set_expiration_bulk(secrets, update_secret, workers=args.workers)
+
+        LOGGER.info("Updated expiration data for %d secrets, %d failed.", updated, len(errors))
+        for secret, error in errors:
+            LOGGER.error("Failed to update %s: %s", secret, error)
+        if errors:
+            sys.exit(1)
+
     else:
         set_expiration(
             args.mount_point,
@@ -171,6 +351,7 @@ def main() -> None:
             vault_client.token,
             args.last_renewed_timestamp_fieldname,
             args.expiration_timestamp_fieldname,
+            session=vault_client.session,
         )
 
 
@@ -0,0 +1,150 @@
+"""
+On-disk snapshot of the monitored paths and their last known expiration information, allowing the exporter to serve metrics right after a restart.
+"""
+import gzip
+import json
+import logging
+import os
+import tempfile
+from collections import defaultdict
+from threading import Event, Thread
+from time import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Type, TypeVar
+
+from vault_monitor.expiration_monitor.secret_expiration_monitor import SecretExpirationMonitor
+
+ExpirationSnapshotType = TypeVar("ExpirationSnapshotType", bound="ExpirationSnapshot")  # pylint: disable=invalid-name
+
+LOGGER = logging.getLogger("snapshot")
+
+SNAPSHOT_VERSION = 1
+DEFAULT_SNAPSHOT_INTERVAL = 300
+
+# Monitor key (type, service, mount point, monitored path) and its last renewal and expiration timestamps, if known
+SnapshotEntry = Tuple[Tuple[str, str, str, str], Optional[Tuple[float, float]]]
+
+
+class ExpirationSnapshot:
+    """
+    The monitors known to the exporter (by key) with their last known expiration timestamps.
+
+    Stored as gzipped JSON: {"version": 1, "written_at": ..., "monitors": [[type, service, mount_point, monitored_path, last_renewal, expiration], ...]}
+    """
+
+    def __init__(self, entries: Iterable[SnapshotEntry], written_at: Optional[float] = None) -> None:
+        self.entries = dict(entries)
+        self.written_at = written_at if written_at is not None else time()
+
+    @classmethod
+    def from_monitors(cls: Type[ExpirationSnapshotType], monitors: Iterable[Any]) -> ExpirationSnapshotType:
+        """
+        Takes a snapshot of the monitors and their current expiration information.
+        """
+        entries = []
+        for monitor in monitors:
+            expiration_info = monitor.expiration_info
+            timestamps = (expiration_info.get_last_renewal_timestamp(), expiration_info.get_expiration_timestamp()) if expiration_info is not None else None
+            entries.append((monitor.key, timestamps))
+        return cls(entries)
+
+    @classmethod
+    def load(cls: Type[ExpirationSnapshotType], path: str) -> Optional[ExpirationSnapshotType]:
+        """
+        Reads a snapshot from path, returning None if there is no (usable) snapshot.
+        """
+        try:
+            with gzip.open(path, "rt", encoding="UTF-8") as snapshot_file:
+                data = json.load(snapshot_file)
+        except FileNotFoundError:
+            LOGGER.info("No snapshot found at %s, starting with a full discovery.", path)
+            return None
+        except (OSError, ValueError):
+            LOGGER.warning("Failed to read the snapshot at %s, starting with a full discovery.", path, exc_info=True)
+            return None
+
+        if not isinstance(data, dict) or data.get("version") != SNAPSHOT_VERSION:
+            LOGGER.warning("Ignoring the snapshot at %s, as it isn't version %d.", path, SNAPSHOT_VERSION)
+            return None
+        try:
+            entries = [((entry[0], entry[1], entry[2], entry[3]), (entry[4], entry[5]) if entry[4] is not None else None) for entry in data["monitors"]]
+        except (KeyError, IndexError, TypeError):
+            LOGGER.warning("Ignoring the snapshot at %s, as it is malformed.", path, exc_info=True)
+            return None
+        return cls(entries, written_at=data.get("written_at"))
+
+    def write(self, path: str) -> None:
+        """
+        Writes the snapshot to path, replacing any existing snapshot atomically so a crash can't leave a partial snapshot behind.
+        """
+        data = {
+            "version": SNAPSHOT_VERSION,
+            "written_at": self.written_at,
+            "monitors": [[*key, *(timestamps if timestamps is not None else (None, None))] for key, timestamps in self.entries.items()],
+        }
+        directory = os.path.dirname(os.path.abspath(path))
+        # The temporary file must be on the same filesystem for the rename to be atomic
+        file_descriptor, temporary_path = tempfile.mkstemp(prefix=".snapshot-", dir=directory)
+        try:
+            with os.fdopen(file_descriptor, "wb") as raw_file:
+                with gzip.GzipFile(fileobj=raw_file, mode="wb") as snapshot_file:
+                    snapshot_file.write(json.dumps(data, separators=(",", ":")).encode("utf-8"))
+                raw_file.flush()
+                os.fsync(raw_file.fileno())
+            os.replace(temporary_path, path)
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+
+    def get_secret_paths(self) -> Dict[Tuple[str, str], List[str]]:
+        """
+        Returns the secret paths in the snapshot by service and mount point, as used by create_monitors instead of walking recursive secret paths.
+        """
+        secret_paths: Dict[Tuple[str, str], List[str]] = defaultdict(list)
+        for monitor_type, service, mount_point, monitored_path in self.entries:
+            if monitor_type == SecretExpirationMonitor.__name__:
+                secret_paths[service, mount_point].append(monitored_path)
+        return dict(secret_paths)
+
+    def restore(self, monitors: Iterable[Any]) -> int:
+        """
+        Sets the expiration information of the monitors from the snapshot, returning the number of monitors restored.
+        """
+        restored = 0
+        for monitor in monitors:
+            timestamps = self.entries.get(monitor.key)
+            if timestamps is not None:
+                monitor.restore_expiration_info(*timestamps)
+                restored += 1
+        return restored
+
+
+class SnapshotWriter(Thread):
+    """
+    Daemon thread which periodically writes a snapshot of the monitors.
+    """
+
+    def __init__(self, path: str, get_monitors: Callable[[], Iterable[Any]], interval: float = DEFAULT_SNAPSHOT_INTERVAL) -> None:
+        super().__init__(name="snapshot_writer", daemon=True)
+        self.path = path
+        self.get_monitors = get_monitors
+        self.interval = interval
+        self._stop_event = Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            self.write_snapshot()
+
+    def write_snapshot(self) -> None:
+        """
+        Writes a snapshot of the current monitors, logging rather than raising on failure.
+        """
+        try:
+            ExpirationSnapshot.from_monitors(self.get_monitors()).write(self.path)
+        except Exception:  # pylint: disable=broad-except
+            LOGGER.exception("Failed to write the snapshot to %s", self.path)
+
+    def stop(self) -> None:
+        """
+        Signals the thread to stop after the current snapshot.
+        """
+        self._stop_event.set()
@@ -0,0 +1,115 @@
+"""
+Summary metrics aggregating the expiration information of many monitors, as a lower cardinality alternative to a series per secret.
+"""
+from bisect import bisect_left
+from time import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from prometheus_client.core import GaugeMetricFamily, HistogramMetricFamily
+from prometheus_client.registry import Collector
+from prometheus_client.utils import floatToGoString
+
+from vault_monitor.expiration_monitor.expiration_monitor import get_qualified_mount_point
+
+# Upper bounds in seconds of the time until expiry buckets: expired, then 1 day, 1 week, 30, 90, 180 and 365 days
+DEFAULT_SUMMARY_BUCKETS = [0, 86400, 604800, 2592000, 7776000, 15552000, 31536000]
+
+
+class ServiceSummary:  # pylint: disable=too-few-public-methods
+    """
+    Running aggregate of the expiration information for the monitors of a service and mount point.
+    """
+
+    def __init__(self, bucket_count: int) -> None:
+        self.bucket_counts = [0] * (bucket_count + 1)
+        self.time_until_expiry_sum = 0.0
+        self.expired = 0
+        self.min_expiration_timestamp: Optional[float] = None
+        self.max_age = 0.0
+
+    def add(self, bucket: int, expiration_timestamp: float, last_renewal_timestamp: float, now: float) -> None:
+        """
+        Adds the expiration information of a monitor, with bucket the index of the time until expiry bucket it falls in.
+        """
+        time_until_expiry = expiration_timestamp - now
+        self.bucket_counts[bucket] += 1
+        self.time_until_expiry_sum += time_until_expiry
+        if time_until_expiry <= 0:
+            self.expired += 1
+        if self.min_expiration_timestamp is None or expiration_timestamp < self.min_expiration_timestamp:
+            self.min_expiration_timestamp = expiration_timestamp
+        self.max_age = max(self.max_age, now - last_renewal_timestamp)
+
+
+class ExpirationSummaryCollector(Collector):
+    """
+    Aggregates the last known expiration information of the monitors with aggregate set, by service and mount point, whenever the metrics are collected.
+
+    Monitors whose series are suppressed by the series limits (and which aren't aggregated already) are aggregated separately, as an overflow bucket.
+
+    Monitors in a namespace of their own are grouped by their mount point prefixed with the namespace (e.g. team-a/secret).
+    Monitors which haven't been updated successfully yet are left out. As with the series per secret, missing metadata counts as expiring in 1970.
+    If target_label is set (e.g. vault_target with several Vault targets), the monitors are also grouped by the value of that label.
+    """
+
+    def __init__(self, get_monitors: Callable[[], Iterable[Any]], buckets: Optional[Sequence[Union[int, float]]] = None, clock: Callable[[], float] = time, target_label: Optional[str] = None) -> None:
+        self.get_monitors = get_monitors
+        self.buckets = sorted(buckets if buckets is not None else DEFAULT_SUMMARY_BUCKETS)
+        self.time_function = clock
+        self.target_label = target_label
+
+    def collect(self) -> Iterator[Union[GaugeMetricFamily, HistogramMetricFamily]]:
+        """
+        Yields the summary metrics of every monitor type, aggregating the monitors in a single pass.
+        """
+        now = self.time_function()
+        buckets = self.buckets
+        target_label = self.target_label
+        # Summaries per metric prefix (i.e. monitor type), then per service and mount point (and target)
+        summaries: Dict[str, Dict[Tuple[str, ...], ServiceSummary]] = {}
+        for monitor in self.get_monitors():
+            expiration_info = monitor.expiration_info
+            if expiration_info is None:
+                continue
+            if monitor.aggregate:
+                prefix = monitor.summary_metric_prefix
+            elif monitor.series_suppressed:
+                prefix = monitor.overflow_metric_prefix
+            else:
+                continue
+            type_summaries = summaries.setdefault(prefix, {})
+            # The same mount point in another namespace is summarized separately
+            mount_point = get_qualified_mount_point(monitor.mount_point, monitor.namespace)
+            label_values = (monitor.service, mount_point) if target_label is None else (monitor.service, mount_point, monitor.get_label_value(target_label) or "")
+            summary = type_summaries.get(label_values)
+            if summary is None:
+                summary = type_summaries[label_values] = ServiceSummary(len(buckets))
+            expiration_timestamp = expiration_info.get_expiration_timestamp()
+            summary.add(bisect_left(buckets, expiration_timestamp - now), expiration_timestamp, expiration_info.get_last_renewal_timestamp(), now)
+
+        for prefix, type_summaries in sorted(summaries.items()):
+            yield from self.get_metric_families(prefix, type_summaries)
+
+    def get_metric_families(self, prefix: str, summaries: Dict[Tuple[str, ...], ServiceSummary]) -> List[Union[GaugeMetricFamily, HistogramMetricFamily]]:
+        """
+        Returns the summary metrics for the monitors of a type, with prefix their metric name prefix.
+        """
+        labels = ["service", "mount_point"] if self.target_label is None else ["service", "mount_point", self.target_label]
+        time_until_expiry = HistogramMetricFamily(f"{prefix}_time_until_expiry_seconds", "Time until expiry of the aggregated monitors, expired ones are negative.", labels=labels)
+        expired = GaugeMetricFamily(f"{prefix}_expired", "Number of aggregated monitors which have expired.", labels=labels)
+        min_expiration = GaugeMetricFamily(f"{prefix}_min_expiration_timestamp", "Earliest expiration timestamp of the aggregated monitors.", labels=labels)
+        max_age = GaugeMetricFamily(f"{prefix}_max_age_seconds", "Longest time since the last renewal of the aggregated monitors.", labels=labels)
+
+        for label_values, summary in sorted(summaries.items()):
+            cumulative_buckets = []
+            count = 0
+            for upper_bound, bucket_count in zip([*map(floatToGoString, self.buckets), "+Inf"], summary.bucket_counts):
+                count += bucket_count
+                cumulative_buckets.append((upper_bound, count))
+            time_until_expiry.add_metric(list(label_values), cumulative_buckets, summary.time_until_expiry_sum)
+            expired.add_metric(list(label_values), summary.expired)
+            if summary.min_expiration_timestamp is not None:
+                min_expiration.add_metric(list(label_values), summary.min_expiration_timestamp)
+            max_age.add_metric(list(label_values), summary.max_age)
+
+        return [time_until_expiry, expired, min_expiration, max_age]
@@ -2,23 +2,94 @@
 Wraps time handling calls to ensure consistent formatting
 """
 import logging
-from typing import Dict, TypeVar, Type
+import re
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from time import time
+from typing import Dict, Iterable, List, Optional, Tuple, TypeVar, Type
 
 ExpirationMetadataType = TypeVar("ExpirationMetadataType", bound="ExpirationMetadata")  # pylint: disable=invalid-name
 
+# Timestamps rarely change between refreshes, so parsed values are cached by the raw string (enough for the timestamps of a few ten thousand secrets)
+PARSE_CACHE_SIZE = 2**16
+
+# RFC 3339 timestamp, with up to nanosecond precision (as written by Vault) and either Z or a numeric offset (optionally followed by Z, as written by set_expiration)
+# Only the parts after the fixed width date and time are captured: the fraction, the Z suffix or the offset's sign, hours and minutes
+TIMESTAMP_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}[Tt]\d{2}:\d{2}:\d{2}(?:\.(\d{1,9}))?(?:([Zz])|([+-])(\d{2}):(\d{2})Z?)")
+
+# Every pair of utc_suffixes, so that the same tuples are shared by all instances
+UTC_SUFFIX_PAIRS = {(last_renewed, expiration): (last_renewed, expiration) for last_renewed in [False, True] for expiration in [False, True]}
+
+EPOCH = datetime(1970, 1, 1)
+ONE_SECOND = timedelta(seconds=1)
+
+
+def get_offset_seconds(timestamp: str, offset_sign: str, offset_hours: str, offset_minutes: str) -> int:
+    """
+    Returns the numeric UTC offset of a timestamp in seconds, from the parts matched by TIMESTAMP_PATTERN.
+    """
+    hours, minutes = int(offset_hours), int(offset_minutes)
+    if hours > 23 or minutes > 59:
+        raise ValueError(f"Invalid timestamp offset: {timestamp}")
+    offset = hours * 3600 + minutes * 60
+    return offset if offset_sign == "+" else -offset
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_timestamp(timestamp: str) -> Tuple[float, bool]:
+    """
+    Parses an RFC 3339 timestamp into seconds since the epoch, only converting its date and time with datetime (as a naive datetime, so that no timezone is involved).
+
+    Returns the timestamp and whether it was given in UTC with a plain Z suffix.
+    Raises a TypeError if timestamp isn't a string and a ValueError if it is malformed or has no timezone.
+    """
+    if not isinstance(timestamp, str):
+        raise TypeError(f"Timestamp must be a string, not {type(timestamp).__name__}.")
+    match = TIMESTAMP_PATTERN.fullmatch(timestamp)
+    if match is None:
+        raise ValueError(f"Invalid timestamp: {timestamp}")
+    fraction, utc, offset_sign, offset_hours, offset_minutes = match.groups()
+    try:
+        # The date and time have a fixed width, and datetime checks their ranges (e.g. for leap days) far faster than the equivalent Python code
+        seconds = (datetime.fromisoformat(timestamp[:19]) - EPOCH) // ONE_SECOND
+    except ValueError as error:
+        raise ValueError(f"Invalid timestamp: {timestamp}") from error
+    if not utc:
+        seconds -= get_offset_seconds(timestamp, offset_sign, offset_hours, offset_minutes)
+
+    if not fraction:
+        return float(seconds), bool(utc)
+    # Divide integers, so that the result is the closest float to the exact timestamp
+    return (seconds * 10 ** len(fraction) + int(fraction)) / 10 ** len(fraction), bool(utc)
+
 
 class ExpirationMetadata:
     """
     Handles updating and retrieving last renewal and expiration timestamps from custom_metadata of a secret.
+
+    Timestamps are kept as seconds since the epoch, datetimes are only created when needed.
     """
 
-    def __init__(self, last_renewed_time: datetime, expiration_time: datetime, last_renewed_timestamp_fieldname: str, expiration_timestamp_fieldname: str) -> None:
-        self.last_renewed_time = last_renewed_time
-        self.expiration_time = expiration_time
+    # Kept by every monitor as its last known expiration information
+    __slots__ = ("last_renewed_timestamp", "expiration_timestamp", "last_renewed_timestamp_fieldname", "expiration_timestamp_fieldname", "utc_suffixes")
+
+    def __init__(
+        self,
+        last_renewed_timestamp: float,
+        expiration_timestamp: float,
+        last_renewed_timestamp_fieldname: str,
+        expiration_timestamp_fieldname: str,
+        utc_suffixes: Tuple[bool, bool] = (False, False),
+    ) -> None:
+        """
+        utc_suffixes is whether each timestamp was read with a plain Z suffix, which is kept when serializing it.
+        """
+        self.last_renewed_timestamp = last_renewed_timestamp
+        self.expiration_timestamp = expiration_timestamp
 
         self.last_renewed_timestamp_fieldname = last_renewed_timestamp_fieldname
         self.expiration_timestamp_fieldname = expiration_timestamp_fieldname
+        self.utc_suffixes = utc_suffixes
 
     @classmethod
     def from_duration(
@@ -34,17 +105,20 @@ class ExpirationMetadata:
         """
         Creates an instance of ExpirationMetadata from the current time for last_renewed_time and gets the expiration from duration input
         """
-        last_renewed_time = datetime.now(timezone.utc)
+        last_renewed_timestamp = time()
         expiration_delta = timedelta(weeks=expiration_weeks, days=expiration_days, hours=expiration_hours, minutes=expiration_minutes, seconds=expiration_seconds)
 
-        expiration_time = last_renewed_time + expiration_delta
+        expiration_timestamp = last_renewed_timestamp + expiration_delta.total_seconds()
 
-        return cls(last_renewed_time, expiration_time, last_renewed_timestamp_fieldname, expiration_timestamp_fieldname)
+        return cls(last_renewed_timestamp, expiration_timestamp, last_renewed_timestamp_fieldname, expiration_timestamp_fieldname)
 
     # Used when reading from a secret
     @classmethod
     def from_metadata(
-        cls: Type[ExpirationMetadataType], metadata: dict, last_renewed_timestamp_fieldname: str = "last_renewed_timestamp", expiration_timestamp_fieldname: str = "expiration_timestamp"
+        cls: Type[ExpirationMetadataType],
+        metadata: Optional[dict],
+        last_renewed_timestamp_fieldname: str = "last_renewed_timestamp",
+        expiration_timestamp_fieldname: str = "expiration_timestamp",
     ) -> ExpirationMetadataType:
         """
         Creates an instance of ExpirationMetadata based on custom_metadata from the secret.
@@ -58,53 +132,80 @@ class ExpirationMetadata:
 
         # Missing fields or malformed timestamps means we go back to the 70s, should be very obvious to the user
         try:
-            last_renewed_time = cls.__get_time_from_iso_utc(last_renewed_timestamp)
+            last_renewed_time, last_renewed_utc_suffix = parse_timestamp(last_renewed_timestamp)
         except TypeError:
             logging.error("Failed to get last_renewed_timestamp due to issues retrieving metadata for %s, setting to 1970.", last_renewed_timestamp_fieldname)
-            last_renewed_time = datetime.fromtimestamp(0, tz=timezone.utc)
+            last_renewed_time, last_renewed_utc_suffix = 0.0, False
         except ValueError:
             logging.error("Failed to parse last_renewed_timestamp for %s, setting to 1970.", last_renewed_timestamp_fieldname)
-            last_renewed_time = datetime.fromtimestamp(0, tz=timezone.utc)
+            last_renewed_time, last_renewed_utc_suffix = 0.0, False
 
         try:
-            expiration_time = cls.__get_time_from_iso_utc(expiration_timestamp)
+            expiration_time, expiration_utc_suffix = parse_timestamp(expiration_timestamp)
         except TypeError:
             logging.error("Failed to get expiration_timestamp due to issues retrieving metadata for %s, setting to 1970.", expiration_timestamp_fieldname)
-            expiration_time = datetime.fromtimestamp(0, tz=timezone.utc)
+            expiration_time, expiration_utc_suffix = 0.0, False
         except ValueError:
             logging.error("Failed to parse expiration_timestamp_field for %s, setting to 1970.", expiration_timestamp_fieldname)
-            expiration_time = datetime.fromtimestamp(0, tz=timezone.utc)
+            expiration_time, expiration_utc_suffix = 0.0, False
+
+        return cls(last_renewed_time, expiration_time, last_renewed_timestamp_fieldname, expiration_timestamp_fieldname, UTC_SUFFIX_PAIRS[last_renewed_utc_suffix, expiration_utc_suffix])
 
-        return cls(last_renewed_time, expiration_time, last_renewed_timestamp_fieldname, expiration_timestamp_fieldname)
+    @classmethod
+    def from_metadata_batch(
+        cls: Type[ExpirationMetadataType],
+        metadata_list: Iterable[Optional[dict]],
+        last_renewed_timestamp_fieldname: str = "last_renewed_timestamp",
+        expiration_timestamp_fieldname: str = "expiration_timestamp",
+    ) -> List[ExpirationMetadataType]:
+        """
+        Creates an instance of ExpirationMetadata for each custom_metadata in metadata_list, e.g. for the secrets read during a refresh.
+        """
+        from_metadata = cls.from_metadata
+        return [from_metadata(metadata, last_renewed_timestamp_fieldname, expiration_timestamp_fieldname) for metadata in metadata_list]
 
     @staticmethod
-    def __get_serialized_time_utc(time_object: datetime) -> str:
+    def __get_serialized_time_utc(timestamp: float, utc_suffix: bool) -> str:
         """
         Returns iso formatted time with timezone included, assumes all times are in UTC.
         """
+        time_object = datetime.fromtimestamp(timestamp, tz=timezone.utc)
+        if utc_suffix:
+            # Keep timestamps read as e.g. 2022-08-08T09:49:41.415869Z in the same format
+            time_object = time_object.replace(tzinfo=None)
         return time_object.isoformat() + "Z"
 
-    @staticmethod
-    def __get_time_from_iso_utc(timestamp: str) -> datetime:
-        return datetime.fromisoformat(timestamp[:-1])
-
     def get_serialized_expiration_metadata(self) -> Dict[str, str]:
         """
         Returns a dictionary with expiration metadata provided
         """
         return {
-            self.last_renewed_timestamp_fieldname: self.__get_serialized_time_utc(self.last_renewed_time),
-            self.expiration_timestamp_fieldname: self.__get_serialized_time_utc(self.expiration_time),
+            self.last_renewed_timestamp_fieldname: self.__get_serialized_time_utc(self.last_renewed_timestamp, self.utc_suffixes[0]),
+            self.expiration_timestamp_fieldname: self.__get_serialized_time_utc(self.expiration_timestamp, self.utc_suffixes[1]),
         }
 
+    @property
+    def last_renewed_time(self) -> datetime:
+        """
+        Time at which the secret was last renewed.
+        """
+        return datetime.fromtimestamp(self.last_renewed_timestamp, tz=timezone.utc)
+
+    @property
+    def expiration_time(self) -> datetime:
+        """
+        Time at which the secret expires.
+        """
+        return datetime.fromtimestamp(self.expiration_timestamp, tz=timezone.utc)
+
     def get_last_renewal_timestamp(self) -> float:
         """
         Gets the timestamp for the last_renewed_timestamp field
         """
-        return self.last_renewed_time.timestamp()
+        return self.last_renewed_timestamp
 
     def get_expiration_timestamp(self) -> float:
         """
         Gets the timestamp for the expiration timestamp field
         """
-        return self.expiration_time.timestamp()
+        return self.expiration_timestamp
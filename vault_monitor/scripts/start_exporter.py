@@ -4,27 +4,46 @@ Launches Vault Assessment Prometheus Exporter
 import sys
 import logging
 import argparse
-from time import sleep
+from copy import deepcopy
 from io import FileIO
-from typing import Dict, List, Any, Sequence
+from typing import Callable, Dict, List, Any, Optional, Tuple
 
 import yaml
-from prometheus_client import start_http_server
+from prometheus_client import REGISTRY, start_http_server
 from cerberus import Validator
 
-from vault_monitor.common.vault_authenticate import get_authenticated_client
+from vault_monitor.common.update_engine import UpdateEngine
+from vault_monitor.common.exporter_metrics import (
+    CONNECTIONS_OPENED_GAUGE,
+    CONNECTIONS_REUSED_GAUGE,
+    CYCLE_DURATION_HISTOGRAM,
+    EXPORTER_READY_GAUGE,
+    ActiveMonitorsCollector,
+)
+from vault_monitor.common.discovery import DiscoverFunction, PeriodicDiscovery
+from vault_monitor.common.scrape_collector import RefreshOnScrapeCollector
+from vault_monitor.common.scheduler import FixedRateScheduler, OVERRUN_POLICIES
+from vault_monitor.common.sharding import ShardSelector
+from vault_monitor.common.token_renewal import TokenRenewer, renew_tokens
+from vault_monitor.common.vault_target import VaultTarget
 
 import vault_monitor.expiration_monitor.create_monitors as expiration
+from vault_monitor.expiration_monitor.adaptive_polling import AdaptivePoller
+from vault_monitor.expiration_monitor.event_listener import SecretEventListener, DEFAULT_EVENT_TYPE
+from vault_monitor.expiration_monitor.summary_collector import ExpirationSummaryCollector
+from vault_monitor.expiration_monitor.snapshot import DEFAULT_SNAPSHOT_INTERVAL, ExpirationSnapshot, SnapshotWriter
 
 EXPORTER_MODULES = [expiration]
 
 # Disable certain things for scripts only, as over-doing the DRY-ness of them can cause them to be less useful as samples
-# pylint: disable=duplicate-code,too-many-arguments,too-many-locals
+# pylint: disable=duplicate-code,too-many-arguments,too-many-locals,too-many-statements
 
 
-def configure_and_launch(config_file: FileIO, log_level: str = "INFO") -> None:
+def configure_and_launch(config_file: FileIO, log_level: str = "INFO", shard_index: Optional[int] = None, shard_count: Optional[int] = None) -> None:
     """
     Read configuration file, load the specified monitors, configure exporter and enter main loop.
+
+    shard_index and shard_count override the values from the configuration file when set.
     """
     config = yaml.safe_load(config_file)
     logging.basicConfig(level=log_level)
@@ -36,32 +55,181 @@ def configure_and_launch(config_file: FileIO, log_level: str = "INFO") -> None:
     if not config_validator.validate(config):
         raise ValueError(config_validator.errors)
 
-    # Get the hvac client, we will have to use requests some with the token it manages
-    vault_config = config.get("vault", {})
-    vault_client = get_authenticated_client(auth_config=vault_config.get("authentication"), address=vault_config.get("address", None), namespace=vault_config.get("namespace", None))
+    max_concurrency = config.get("max_concurrency", 1)
+    # Every target has its own client, connection pool (with its own rate limits, retries and circuit breakers) and monitors, authenticated by its discovery
+    targets = [(VaultTarget(vault_config, name, max_concurrency=max_concurrency), monitoring_config) for name, vault_config, monitoring_config in get_vault_targets(config)]
+
+    # Each replica only monitors its own slice, so replicas expose non-overlapping series
+    shard = ShardSelector(
+        shard_index=shard_index if shard_index is not None else config.get("shard_index", 0),
+        shard_count=shard_count if shard_count is not None else config.get("shard_count", 1),
+    )
 
-    monitors: Sequence[Any]
-    monitors = []
+    def get_monitors() -> List[Any]:
+        return [monitor for target, _ in targets for monitor in target.registry.get_monitors()]
 
-    expiration_monitoring_config = config.get("expiration_monitoring", {})
-    monitors += expiration.create_monitors(expiration_monitoring_config, vault_client)
+    REGISTRY.register(ActiveMonitorsCollector(lambda: {target.name or "": target.registry.get_monitors() for target, _ in targets}))
+    # Only reports on monitors with aggregate set, computed from their last known expiration information
+    series_limiters = [expiration.create_series_limiter(monitoring_config, vault_target=target.name or "") for target, monitoring_config in targets]
+    REGISTRY.register(ExpirationSummaryCollector(get_monitors, buckets=targets[0][1].get("summary_buckets"), target_label="vault_target" if "vault_targets" in config else None))
 
     refresh_interval = config.get("refresh_interval", 30)
     port = config.get("port", 9937)
-
-    start_http_server(port)
+    collection_mode = config.get("collection_mode", "push")
+    # The worker threads are shared by all targets
+    update_engine = UpdateEngine(max_concurrency=max_concurrency)
+
+    adaptive_polling_config = config.get("adaptive_polling")
+    # Monitors are only unique within a target, so each target is scheduled by its own poller
+    adaptive_pollers: List[Optional[AdaptivePoller]] = [None for _ in targets]
+    if adaptive_polling_config is not None:
+        adaptive_pollers = [
+            AdaptivePoller(
+                min_interval=adaptive_polling_config.get("min_interval", refresh_interval),
+                max_interval=adaptive_polling_config.get("max_interval", 3600),
+                expiry_fraction=adaptive_polling_config.get("expiry_fraction", 0.01),
+            )
+            for _ in targets
+        ]
+
+    @CYCLE_DURATION_HISTOGRAM.time()
+    def refresh() -> None:
+        target_monitors = []
+        for (target, _), series_limiter, adaptive_poller in zip(targets, series_limiters, adaptive_pollers):
+            monitors = target.registry.get_monitors()
+            if series_limiter.enabled:
+                # Decide which monitors expose series before updating them, based on the values from the previous refresh
+                series_limiter.apply(monitors)
+            if adaptive_poller is not None:
+                # Only refresh the monitors which are due, based on how close they are to expiring
+                monitors = adaptive_poller.get_due_monitors(monitors)
+            target_monitors.append(monitors)
+        # Update the monitors of all targets in one cycle, so a slow target doesn't leave the worker threads idle
+        all_monitors = [monitor for monitors in target_monitors for monitor in monitors]
+        failures = update_engine.run_cycle(all_monitors)
+        for adaptive_poller, monitors in zip(adaptive_pollers, target_monitors):
+            if adaptive_poller is not None:
+                adaptive_poller.reschedule(monitors)
+        if failures:
+            logging.warning("Failed to update %d of %d monitors this cycle", failures, len(all_monitors))
+
+        for target, _ in targets:
+            connections_opened, connections_reused = target.get_cycle_stats()
+            CONNECTIONS_OPENED_GAUGE.labels(vault_target=target.name or "").set(connections_opened)
+            CONNECTIONS_REUSED_GAUGE.labels(vault_target=target.name or "").set(connections_reused)
+
+    vault_events_config = config.get("vault_events")
+    # Create the discoveries of all targets before serving metrics, so vault_exporter_ready can't report 1 before every target has been discovered
+    discoveries = [
+        PeriodicDiscovery(
+            get_discover_function(monitoring_config, target, shard),
+            target.registry,
+            monitoring_config.get("discovery_interval") or 0,
+            retry_interval=refresh_interval,
+            # In push mode, update monitors as they are discovered rather than leaving them empty until the next refresh, without holding up the discovery
+            on_added=update_engine.submit if collection_mode == "push" else None,
+            vault_target=target.name or "",
+            # Authenticate in the background, so a target which is unavailable at startup is retried without holding back the others
+            setup=get_setup_function(monitoring_config, target, shard, update_engine, vault_events_config),
+        )
+        for target, monitoring_config in targets
+    ]
+    # Serve metrics before discovering the monitors, which can take minutes for large recursive secret paths, vault_exporter_ready reports when it is done
+    EXPORTER_READY_GAUGE.set_function(lambda: float(all(discovery.ready.is_set() for discovery in discoveries)))
+    if collection_mode == "scrape":
+        # Only talk to Vault when a scrape arrives and the cached values are older than the TTL
+        start_http_server(port, registry=RefreshOnScrapeCollector(refresh, ttl=config.get("scrape_cache_ttl", refresh_interval)))
+    else:
+        start_http_server(port)
     print(f"Running on http://localhost:{port}")
 
-    while True:
-        for monitor in monitors:
-            monitor.update_metrics()
+    for discovery in discoveries:
+        discovery.start()
+
+    # Default to 30 seconds, configurable
+    cycle_interval = refresh_interval
+    if vault_events_config is not None:
+        # Changed secrets are refreshed as their events arrive, so a full refresh is only needed as a safety net
+        cycle_interval = vault_events_config.get("sweep_interval", 3600)
+        # Tokens still need renewing every refresh_interval, their TTL is often shorter than the sweep interval
+        TokenRenewer([target for target, _ in targets], refresh_interval).start()
 
-        # Default to 30 seconds, configurable
-        sleep(refresh_interval)
+    def cycle() -> None:
+        if collection_mode == "push":
+            refresh()
+        if vault_events_config is None:
+            renew_tokens([target for target, _ in targets], int(cycle_interval * 1.5))
 
-        if vault_config.get("token_autorenew", False):
-            logging.info("Refreshing token for %s seconds", int(refresh_interval * 1.5))
-            vault_client.auth.token.renew_self(f"{int(refresh_interval * 1.5)}s")
+    scheduler = FixedRateScheduler(cycle_interval, jitter=config.get("refresh_jitter", 0), overrun_policy=config.get("overrun_policy", "immediate"))
+    scheduler.run(cycle)
+
+
+def get_discover_function(monitoring_config: Dict, target: VaultTarget, shard: ShardSelector) -> DiscoverFunction:
+    """
+    Returns the function discovering the monitors of a target, reusing the existing monitors passed to it.
+    """
+    return lambda existing: expiration.iter_monitors(monitoring_config, target.authenticate(), existing, shard=shard)
+
+
+def get_setup_function(monitoring_config: Dict, target: VaultTarget, shard: ShardSelector, update_engine: UpdateEngine, vault_events_config: Optional[Dict]) -> Callable[[], None]:
+    """
+    Returns the function run before the initial discovery of a target, which authenticates and then restores the snapshot and starts the background threads of the target.
+    """
+    snapshot_config = monitoring_config.get("snapshot")
+
+    def setup() -> None:
+        vault_client = target.authenticate()
+        snapshot = ExpirationSnapshot.load(snapshot_config["path"]) if snapshot_config else None
+        if snapshot is not None:
+            # Serve the monitors and values from the snapshot right away, rather than waiting for every recursive path to be listed again
+            monitors = expiration.create_monitors(monitoring_config, vault_client, shard=shard, cached_secret_paths=snapshot.get_secret_paths())
+            restored = snapshot.restore(monitors)
+            target.registry.sync(monitors)
+            logging.info("Restored %d of %d monitors from the snapshot for %s, discovering in the background", restored, len(monitors), target)
+        if snapshot_config:
+            SnapshotWriter(snapshot_config["path"], target.registry.get_monitors, snapshot_config.get("interval") or DEFAULT_SNAPSHOT_INTERVAL).start()
+        if vault_events_config is not None:
+            # When monitoring namespaces, the events of every namespace below the one of the client are needed
+            namespaces = ["*"] if monitoring_config.get("namespaces") is not None else None
+            SecretEventListener(vault_client, target.registry, update_engine, event_type=vault_events_config.get("event_type", DEFAULT_EVENT_TYPE), namespaces=namespaces).start()
+
+    return setup
+
+
+def get_vault_targets(config: Dict) -> List[Tuple[Optional[str], Dict, Dict]]:
+    """
+    Returns the name, vault section and expiration_monitoring section of every Vault target to monitor.
+
+    Without vault_targets, the single target comes from the top level of the configuration and has no name.
+    With vault_targets, every series of a target's monitors carries a vault_target label with its name.
+    """
+    if "vault_targets" not in config:
+        return [(None, config.get("vault", {}), config.get("expiration_monitoring") or {})]
+
+    targets = []
+    for target_config in config["vault_targets"]:
+        name = target_config["name"]
+        monitoring_config = dict(target_config.get("expiration_monitoring") or {})
+        prometheus_labels = monitoring_config.get("prometheus_labels") or {}
+        if "vault_target" in prometheus_labels:
+            raise ValueError(f"vault_targets {name} configures the vault_target prometheus label, which is set to the name of the target!")
+        monitoring_config["prometheus_labels"] = {"vault_target": name, **prometheus_labels}
+        targets.append((name, target_config["vault"], monitoring_config))
+
+    names = [name for name, _, _ in targets]
+    if len(set(names)) != len(names):
+        raise ValueError("vault_targets must have unique names!")
+    # The series of all targets share the same metrics, so they must have the same labels (in the same order)
+    label_keys = {tuple(monitoring_config["prometheus_labels"]) for _, _, monitoring_config in targets}
+    if len(label_keys) > 1:
+        raise ValueError("vault_targets must all configure the same prometheus_labels keys, in the same order!")
+    # With namespaces, the series carry a namespace label as well
+    if len({monitoring_config.get("namespaces") is not None for _, _, monitoring_config in targets}) > 1:
+        raise ValueError("vault_targets must either all or none configure namespaces!")
+    summary_buckets = {tuple(monitoring_config.get("summary_buckets") or []) for _, _, monitoring_config in targets}
+    if len(summary_buckets) > 1:
+        raise ValueError("vault_targets must all configure the same summary_buckets!")
+    return targets
 
 
 def main() -> None:
@@ -69,7 +237,7 @@ def main() -> None:
     Get user arguments and launch the exporter
     """
     args = handle_args()
-    configure_and_launch(args.config_file, args.logging)
+    configure_and_launch(args.config_file, args.logging, shard_index=args.shard_index, shard_count=args.shard_count)
 
 
 def handle_args() -> argparse.Namespace:
@@ -91,6 +259,10 @@ def handle_args() -> argparse.Namespace:
 
     parser.add_argument("--show_schema", action=PrintSchema, help="Set to print config schema and exit.")
 
+    sharding_group = parser.add_argument_group(title="Sharding", description="Split the monitors between several replicas of the exporter (overrides the configuration file).")
+    sharding_group.add_argument("--shard_index", type=int, default=None, help="Index of this replica, from 0 to shard_count - 1.")
+    sharding_group.add_argument("--shard_count", type=int, default=None, help="Total number of replicas.")
+
     return parser.parse_args()
 
 
@@ -163,6 +335,89 @@ def get_config_schema(modules: List) -> Dict[str, Dict]:
                     "nullable": True,
                     "meta": {"description": "Automatically renew HashiCorp Vault token with every metric update", "link": "https://www.vaultproject.io/api-docs/auth/token#renew-a-token"},
                 },
+                "connection_pool": {
+                    "type": "dict",
+                    "nullable": True,
+                    "schema": {
+                        "pool_size": {"type": "integer", "nullable": True, "min": 1, "meta": {"description": "Maximum number of connections to keep open to Vault."}},
+                        "keep_alive": {"type": "boolean", "nullable": True, "meta": {"description": "Reuse connections to Vault between requests."}},
+                    },
+                    "meta": {"description": "Configuration of the pool of HTTP connections shared by all requests to Vault."},
+                },
+                "timeouts": {
+                    "type": "dict",
+                    "nullable": True,
+                    "schema": {
+                        "connect": {"type": "number", "nullable": True, "min": 0.001, "meta": {"description": "Seconds to wait for a connection to Vault to be established, by default 10."}},
+                        "read": {"type": "number", "nullable": True, "min": 0.001, "meta": {"description": "Seconds to wait for Vault to send a response, by default 60."}},
+                    },
+                    "meta": {"description": "Timeouts for requests to Vault."},
+                },
+                "retries": {
+                    "type": "dict",
+                    "nullable": True,
+                    "schema": {
+                        "max_retries": {
+                            "type": "integer",
+                            "nullable": True,
+                            "min": 0,
+                            "meta": {"description": "Number of times a request is retried after a timeout, connection error or 5xx response, by default 3."},
+                        },
+                        "backoff_factor": {
+                            "type": "number",
+                            "nullable": True,
+                            "min": 0,
+                            "meta": {"description": "Maximum wait in seconds before the first retry, doubling with every retry, by default 0.5."},
+                        },
+                        "backoff_max": {"type": "number", "nullable": True, "min": 0, "meta": {"description": "Maximum wait in seconds before any retry, by default 30."}},
+                    },
+                    "meta": {"description": "Retrying of requests to Vault which failed for transient reasons, with exponential backoff and jitter."},
+                },
+                "circuit_breaker": {
+                    "type": "dict",
+                    "nullable": True,
+                    "schema": {
+                        "failure_threshold": {
+                            "type": "integer",
+                            "nullable": True,
+                            "min": 1,
+                            "meta": {"description": "Number of failed requests in a row after which requests to a mount point are stopped, by default 5."},
+                        },
+                        "reset_timeout": {"type": "number", "nullable": True, "min": 0, "meta": {"description": "Seconds to wait before trying a stopped mount point again, by default 60."}},
+                    },
+                    "meta": {"description": "Stops sending requests to a mount point whose backend keeps failing."},
+                },
+                "rate_limit": {
+                    "type": "dict",
+                    "nullable": True,
+                    "schema": {
+                        "requests_per_second": {"type": "number", "nullable": True, "min": 0.001, "meta": {"description": "Maximum average number of requests per second sent to Vault."}},
+                        "burst": {"type": "number", "nullable": True, "min": 1, "meta": {"description": "Maximum number of requests sent at once, by default requests_per_second."}},
+                        "max_retries": {"type": "integer", "nullable": True, "min": 0, "meta": {"description": "Number of times a request rejected by Vault with 429 is retried, by default 3."}},
+                        "mounts": {
+                            "type": "dict",
+                            "nullable": True,
+                            "keysrules": {"type": "string"},
+                            "valuesrules": {
+                                "type": "dict",
+                                "schema": {
+                                    "requests_per_second": {
+                                        "type": "number",
+                                        "required": True,
+                                        "min": 0.001,
+                                        "meta": {"description": "Maximum average number of requests per second sent to the mount point."},
+                                    },
+                                    "burst": {"type": "number", "nullable": True, "min": 1, "meta": {"description": "Maximum number of requests sent to the mount point at once."}},
+                                },
+                            },
+                            "meta": {"description": "Additional limits per mount point (e.g. secret, or team-a/secret in a single namespace), applied on top of the global limit."},
+                        },
+                    },
+                    "meta": {
+                        "description": "Client side rate limiting of requests to Vault, to stay under its rate limit quotas.",
+                        "link": "https://developer.hashicorp.com/vault/docs/concepts/resource-quotas",
+                    },
+                },
                 "authentication": {
                     "type": "dict",
                     "nullable": False,
@@ -196,14 +451,116 @@ def get_config_schema(modules: List) -> Dict[str, Dict]:
             },
         },
         "refresh_interval": {"type": "integer", "nullable": True, "meta": {"description": "Frequency in seconds with which the exporter should connect to Vault and read the metadata information."}},
+        "refresh_jitter": {
+            "type": "number",
+            "nullable": True,
+            "min": 0,
+            "meta": {"description": "Maximum random delay in seconds added to the start of each refresh, to spread the load of several replicas on Vault."},
+        },
+        "overrun_policy": {
+            "type": "string",
+            "nullable": True,
+            "allowed": OVERRUN_POLICIES,
+            "meta": {"description": "What to do when a refresh takes longer than refresh_interval: immediate starts the next one right away, skip waits for the next scheduled start."},
+        },
+        "adaptive_polling": {
+            "type": "dict",
+            "nullable": True,
+            "schema": {
+                "min_interval": {"type": "number", "nullable": True, "min": 0, "meta": {"description": "Shortest interval in seconds between refreshes of a monitor, defaults to refresh_interval."}},
+                "max_interval": {"type": "number", "nullable": True, "min": 0, "meta": {"description": "Longest interval in seconds between refreshes of a monitor, defaults to 3600."}},
+                "expiry_fraction": {
+                    "type": "number",
+                    "nullable": True,
+                    "min": 0,
+                    "meta": {"description": "Fraction of the time until expiry to wait before refreshing a monitor again, defaults to 0.01."},
+                },
+            },
+            "meta": {"description": "Refresh each monitor at its own interval based on the time until it expires, rather than refreshing all monitors every refresh_interval."},
+        },
+        "vault_events": {
+            "type": "dict",
+            "nullable": True,
+            "schema": {
+                "sweep_interval": {
+                    "type": "integer",
+                    "nullable": True,
+                    "min": 1,
+                    "meta": {"description": "Frequency in seconds of the full refresh of all monitors, as a safety net for missed events. Replaces refresh_interval, defaults to 3600."},
+                },
+                "event_type": {"type": "string", "nullable": True, "meta": {"description": "Event type to subscribe to, defaults to kv-v2/*."}},
+            },
+            "meta": {
+                "description": "Subscribe to Vault event notifications and only refresh the secrets which changed (requires Vault 1.13 or newer).",
+                "link": "https://developer.hashicorp.com/vault/docs/concepts/events",
+            },
+        },
+        "shard_index": {"type": "integer", "nullable": True, "min": 0, "meta": {"description": "Index of this replica when sharding monitors between replicas, from 0 to shard_count - 1."}},
+        "shard_count": {"type": "integer", "nullable": True, "min": 1, "meta": {"description": "Total number of replicas when sharding monitors between replicas."}},
         "port": {"type": "integer", "nullable": True, "min": 1, "max": 65535, "meta": {"description": "Port number to run exporter on."}},
+        "collection_mode": {
+            "type": "string",
+            "nullable": True,
+            "allowed": ["push", "scrape"],
+            "meta": {"description": "push refreshes the metrics from Vault every refresh_interval, scrape only refreshes them when scraped and older than scrape_cache_ttl."},
+        },
+        "scrape_cache_ttl": {
+            "type": "number",
+            "nullable": True,
+            "min": 0,
+            "meta": {"description": "Maximum age in seconds of the cached values in scrape collection mode before a scrape refreshes them, defaults to refresh_interval."},
+        },
+        "max_concurrency": {
+            "type": "integer",
+            "nullable": True,
+            "min": 1,
+            "meta": {"description": "Maximum number of monitors to update in parallel during each refresh, 1 updates them one at a time."},
+        },
     }
 
     schema["vault"]["schema"]["authentication"]["oneof_schema"][2]["approle"]["oneof_schema"] = get_approle_valid_combinations()
 
+    # Each Vault target has its own vault section and module configuration, which replace those at the top level
+    target_schema: Dict[str, Dict] = {
+        "name": {"type": "string", "required": True, "empty": False, "meta": {"description": "Name of the target, set as the vault_target label of its series."}},
+        "vault": deepcopy(schema["vault"]),
+    }
     for module in modules:
-        schema.update(module.get_configuration_schema())
+        module_schema = module.get_configuration_schema()
+        target_schema.update(remove_root_dependencies(deepcopy(module_schema)))
+        for rules in module_schema.values():
+            rules["excludes"] = "vault_targets"
+        schema.update(module_schema)
+
+    schema["vault"]["excludes"] = "vault_targets"
+    schema["vault_targets"] = {
+        "type": "list",
+        "required": True,
+        "excludes": [key for key in target_schema if key != "name"],
+        "minlength": 1,
+        "schema": {"type": "dict", "schema": target_schema},
+        "meta": {"description": "Vault clusters to monitor from this exporter, each with a name, vault section and module configuration, instead of the top level vault section."},
+    }
+
+    return schema
 
+
+def remove_root_dependencies(schema: Dict) -> Dict:
+    """
+    Removes the dependencies anchored at the root of the document (starting with ^) from a schema, in place, as they can't be met by the schema nested in a Vault target.
+
+    Within a target, the same checks are made when creating the monitors (e.g. check_prometheus_labels).
+    """
+    for rules in schema.values():
+        if not isinstance(rules, dict):
+            continue
+        if str(rules.get("dependencies", "")).startswith("^"):
+            del rules["dependencies"]
+        for key in ["schema", "keysrules", "valuesrules"]:
+            nested = rules.get(key)
+            if isinstance(nested, dict):
+                # A list's schema holds the rules of its items, a dict's schema those of its fields
+                remove_root_dependencies(nested if "type" not in nested else {key: nested})
     return schema
 
 